@@ -0,0 +1,102 @@
+"""Measure the time to the first normalized record and the memory used
+by each worker process, with and without pre-warming.
+
+    PYTHONPATH=. python benchmarks/prewarm.py --workers 4 --records records.jsonl
+
+Each configuration is run in a new interpreter, so that the modules
+imported by one run don't affect the next. The memory of the workers is
+read from /proc/<pid>/smaps_rollup (Linux only):
+- RSS counts all the pages mapped by a worker, including shared ones
+- PSS divides the shared pages between the processes which share them
+- USS only counts the pages which are private to a worker
+"""
+import argparse
+import json
+import multiprocessing
+import subprocess
+import sys
+import time
+
+
+def worker_memory(pid):
+    """Returns the RSS, PSS and USS of a process in MiB"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding='utf-8') as smaps:
+        for line in smaps:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        'rss': values.get('Rss', 0.),
+        'pss': values.get('Pss', 0.),
+        'uss': values.get('Private_Clean', 0.) + values.get('Private_Dirty', 0.),
+    }
+
+
+def run(start_method, prewarm_workers, workers, records_path, count):
+    """Run one configuration and print its measurements as JSON"""
+    start = time.perf_counter()
+    # pylint: disable=import-outside-toplevel
+    import metanorm.parallel as parallel
+
+    if records_path:
+        from thread_scaling import read_records
+        import metanorm.normalizers as normalizers
+        records = read_records(records_path)[:count]
+        base_class = normalizers.geospaas.GeoSPaaSMetadataNormalizer
+    else:
+        from thread_scaling import BenchmarkBaseNormalizer, synthetic_records
+        records = list(synthetic_records(count))
+        base_class = BenchmarkBaseNormalizer
+
+    results = parallel.normalize_parallel(
+        records, base_class, workers=workers, mp_context=start_method,
+        prewarm_workers=prewarm_workers)
+    next(results)
+    first_record = time.perf_counter() - start
+    memory = [worker_memory(process.pid) for process in multiprocessing.active_children()
+              if process.name.startswith(('ForkPoolWorker', 'SpawnPoolWorker',
+                                          'ForkServerPoolWorker'))]
+    for _ in results:
+        pass
+    print(json.dumps({
+        'first_record': first_record,
+        'total': time.perf_counter() - start,
+        'memory': memory,
+    }))
+
+
+def main():
+    """Run all the configurations in separate interpreters and print
+    the results
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--records', help='JSONL file containing raw metadata')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--run', nargs=2, metavar=('START_METHOD', 'PREWARM'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(args.run[0], args.run[1] == 'True', args.workers, args.records, args.count)
+        return
+
+    print(f"{'start method':>12} {'prewarm':>8} {'first record (s)':>17} "
+          f"{'RSS (MiB)':>10} {'PSS (MiB)':>10} {'USS (MiB)':>10}")
+    for start_method in ('fork', 'forkserver', 'spawn'):
+        for prewarm_workers in (False, True):
+            command = [sys.executable, __file__, '--workers', str(args.workers),
+                       '--count', str(args.count), '--run', start_method, str(prewarm_workers)]
+            if args.records:
+                command.extend(('--records', args.records))
+            output = subprocess.run(command, capture_output=True, check=True, text=True).stdout
+            result = json.loads(output.splitlines()[-1])
+            memory = result['memory'] or [{'rss': 0., 'pss': 0., 'uss': 0.}]
+            averages = {key: sum(m[key] for m in memory) / len(memory) for key in memory[0]}
+            print(f"{start_method:>12} {str(prewarm_workers):>8} {result['first_record']:17.3f} "
+                  f"{averages['rss']:10.1f} {averages['pss']:10.1f} {averages['uss']:10.1f}")
+
+
+if __name__ == '__main__':
+    main()
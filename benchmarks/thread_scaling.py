@@ -0,0 +1,121 @@
+"""Measure how normalization throughput scales with the number of
+threads and processes.
+
+Run it on a regular build and on a free-threaded build of CPython
+(python3.13t) to compare:
+
+    PYTHONPATH=. python benchmarks/thread_scaling.py --records records.jsonl --workers 1 2 4 8
+
+`records.jsonl` contains one raw metadata dictionary per line. Without
+`--records`, synthetic records are normalized by a normalizer which
+only uses shapely and dateutil, so the benchmark also works without
+the pythesint vocabularies.
+"""
+import argparse
+import json
+import sys
+import time
+
+import dateutil.parser
+import shapely.wkt
+
+import metanorm.handlers as handlers
+import metanorm.normalizers as normalizers
+import metanorm.parallel as parallel
+
+
+class BenchmarkBaseNormalizer(normalizers.MetadataNormalizer):
+    """Base class of the synthetic normalizer"""
+
+    abstract = True
+
+
+class SyntheticNormalizer(BenchmarkBaseNormalizer):
+    """CPU-bound normalizer which does not need pythesint"""
+
+    url_prefixes = ('https://synthetic/',)
+
+    def check(self, raw_metadata):
+        return raw_metadata.get('url', '').startswith(self.url_prefixes)
+
+    def normalize(self, raw_metadata):
+        geometry = shapely.wkt.loads(raw_metadata['geometry'])
+        return {
+            'entry_id': raw_metadata['url'].rsplit('/', 1)[1],
+            'time_coverage_start': dateutil.parser.parse(raw_metadata['start']),
+            'location_geometry': geometry.buffer(0.1).simplify(0.01).wkt,
+        }
+
+
+def synthetic_records(count):
+    """Generate `count` records for the synthetic normalizer"""
+    for i in range(count):
+        lon, lat = i % 360 - 180, i % 170 - 85
+        yield {
+            'url': f"https://synthetic/data/{i}.nc",
+            'start': f"2023-01-{i % 28 + 1:02d}T{i % 24:02d}:00:00Z",
+            'geometry': (f"POLYGON(({lon} {lat},{lon + 1} {lat},{lon + 1} {lat + 1},"
+                         f"{lon} {lat + 1},{lon} {lat}))"),
+        }
+
+
+def read_records(path):
+    """Read one raw metadata dictionary per line of a JSONL file"""
+    with open(path, encoding='utf-8') as records_file:
+        return [json.loads(line) for line in records_file if line.strip()]
+
+
+def measure(function, records):
+    """Returns the number of records per second processed by
+    `function`
+    """
+    start = time.perf_counter()
+    for _ in function(records):
+        pass
+    return len(records) / (time.perf_counter() - start)
+
+
+def main():
+    """Run the benchmark and print the results"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    parser.add_argument('--records', help='JSONL file containing raw metadata')
+    parser.add_argument('--count', type=int, default=20000,
+                        help='number of synthetic records (without --records)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--no-processes', action='store_true',
+                        help='do not measure the process pool')
+    args = parser.parse_args()
+
+    if args.records:
+        records = read_records(args.records)
+        base_class = None
+    else:
+        records = list(synthetic_records(args.count))
+        base_class = BenchmarkBaseNormalizer
+
+    gil_enabled = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if gil_enabled else 'disabled'}, "
+          f"{len(records)} records")
+
+    handler = handlers.MetadataHandler(base_class)
+    baseline = measure(
+        lambda records: (handler.get_parameters_or_error(r) for r in records), records)
+    print(f"{'sequential':>12}: {baseline:10.0f} records/s")
+
+    for workers in args.workers:
+        threaded = measure(
+            lambda records, workers=workers: parallel.normalize_threaded(
+                records, workers=workers, handler=handler, ordered=False),
+            records)
+        print(f"{workers:3d} threads  : {threaded:10.0f} records/s ({threaded / baseline:.2f}x)")
+        if not args.no_processes:
+            processes = measure(
+                lambda records, workers=workers: parallel.normalize_parallel(
+                    records, base_class, workers=workers, chunksize=100, ordered=False),
+                records)
+            print(f"{workers:3d} processes: {processes:10.0f} records/s "
+                  f"({processes / baseline:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
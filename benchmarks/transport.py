@@ -0,0 +1,55 @@
+"""Compare the throughput of the process pool and of the shared memory
+transport.
+
+    PYTHONPATH=. python benchmarks/transport.py --count 1000000 --workers 4
+
+Synthetic records are normalized by the normalizer of
+thread_scaling.py. `--padding` adds a field of the given size to each
+record, to simulate large documents of which only a part is read by the
+normalizer.
+"""
+import argparse
+import time
+
+import metanorm.parallel as parallel
+from thread_scaling import BenchmarkBaseNormalizer, synthetic_records
+
+
+def measure(results, count):
+    """Returns the number of records per second yielded by `results`"""
+    start = time.perf_counter()
+    for _ in results:
+        pass
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    """Run the benchmark and print the results"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    parser.add_argument('--count', type=int, default=1000000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--padding', type=int, default=0)
+    args = parser.parse_args()
+
+    def records():
+        for record in synthetic_records(args.count):
+            if args.padding:
+                record['padding'] = 'x' * args.padding
+            yield record
+
+    print(f"{args.count} records, {args.workers} workers, {args.padding} bytes of padding")
+    pool = measure(
+        parallel.normalize_parallel(records(), BenchmarkBaseNormalizer, workers=args.workers,
+                                    chunksize=args.batch_size),
+        args.count)
+    print(f"{'process pool':>14}: {pool:10.0f} records/s")
+    shared = measure(
+        parallel.normalize_shared_memory(records(), BenchmarkBaseNormalizer,
+                                         workers=args.workers, batch_size=args.batch_size),
+        args.count)
+    print(f"{'shared memory':>14}: {shared:10.0f} records/s ({shared / pool:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,388 @@
+"""Batch runner which normalizes large JSONL files on several machines
+sharing a file system, without any other coordination service.
+
+The work directory contains:
+- shards/: the input split into JSONL shards, and the list of shards in
+  shards.json
+- locks/: one lock file per shard being processed, created atomically
+- checkpoints/: the number of records of a shard which were committed,
+  the partial output file they were written to and its size at that
+  point
+- output/: the normalized records of each shard, one JSON document per
+  line. Each runner writes a shard in its own partial file, which is
+  renamed to the shard's output file when the shard is complete
+- done/: completion markers of the shards which were fully processed
+"""
+import datetime
+import json
+import collections
+import glob
+import logging
+import os
+import os.path
+import socket
+import time
+import uuid
+
+import metanorm.errors as errors
+import metanorm.handlers as handlers
+import metanorm.parallel as parallel
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value):
+    """Serializes the values returned by normalizers which are not
+    supported by the json module
+    """
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"{value!r} is not JSON serializable")
+
+
+def _write_atomically(path, text):
+    """Write `text` to a temporary file and rename it to `path`"""
+    temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temporary_path, 'w', encoding='utf-8') as temporary_file:
+        temporary_file.write(text)
+        temporary_file.flush()
+        os.fsync(temporary_file.fileno())
+    os.replace(temporary_path, path)
+
+
+class LockLost(RuntimeError):
+    """Raised when the lock of a shard being processed was taken over
+    by another runner
+    """
+
+
+class ShardedBatchRunner():
+    """Normalizes a JSONL file split in shards. Several runners, on the
+    same or on different machines, can work in the same directory: each
+    shard is claimed by creating its lock file, which is refreshed at
+    each checkpoint. The lock of a runner which did not checkpoint for
+    `stale_after` seconds can be taken over by another runner, which
+    resumes the shard from its last checkpoint.
+    """
+
+    SHARDS_LIST = 'shards.json'
+
+    def __init__(self, work_dir, base_class=None, records_per_shard=10000, workers=None,
+                 checkpoint_interval=1000, stale_after=600., handler_kwargs=None,
+                 time_budget=None):
+        """`workers` is the number of worker processes used to
+        normalize each shard. If it is 0, the records are normalized in
+        the current process. `stale_after` must be larger than the time
+        needed to normalize `checkpoint_interval` records.
+        If `time_budget` is given, the records whose normalization
+        takes more than that many seconds are interrupted and reported
+        as timeouts.
+        """
+        self.work_dir = work_dir
+        self.base_class = base_class
+        self.records_per_shard = records_per_shard
+        self.workers = workers
+        self.checkpoint_interval = checkpoint_interval
+        self.stale_after = stale_after
+        self.handler_kwargs = handler_kwargs or {}
+        self.time_budget = time_budget
+        # written in the lock files to identify this runner
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        for directory in ('shards', 'locks', 'checkpoints', 'output', 'done'):
+            os.makedirs(os.path.join(work_dir, directory), exist_ok=True)
+
+    def _path(self, directory, shard, extension):
+        return os.path.join(self.work_dir, directory, f"{shard}.{extension}")
+
+    def _acquire(self, lock_path):
+        """Try to create the lock file at `lock_path`. Stale locks are
+        taken over. Returns True if the lock was acquired
+        """
+        try:
+            file_descriptor = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                age = time.time() - os.stat(lock_path).st_mtime
+            except FileNotFoundError:
+                return self._acquire(lock_path)
+            if age < self.stale_after:
+                return False
+            # only one runner can rename the stale lock
+            stale_path = f"{lock_path}.{uuid.uuid4().hex}.stale"
+            try:
+                os.rename(lock_path, stale_path)
+            except FileNotFoundError:
+                return False
+            # another runner may have taken over the stale lock and
+            # created a fresh one between the check and the rename
+            if time.time() - os.stat(stale_path).st_mtime < self.stale_after:
+                try:
+                    # unlike rename(), link() does not replace a lock
+                    # created in the meantime
+                    os.link(stale_path, lock_path)
+                except FileExistsError:
+                    pass
+                os.remove(stale_path)
+                return False
+            os.remove(stale_path)
+            logger.info("Taking over the stale lock %s", lock_path)
+            return self._acquire(lock_path)
+        with os.fdopen(file_descriptor, 'w') as lock_file:
+            lock_file.write(self.token)
+        return True
+
+    def _owns(self, lock_path):
+        """Returns True if the lock file was created by this runner"""
+        try:
+            with open(lock_path, encoding='utf-8') as lock_file:
+                return lock_file.read() == self.token
+        except FileNotFoundError:
+            return False
+
+    def _release(self, lock_path):
+        if self._owns(lock_path):
+            os.remove(lock_path)
+
+    def shards(self):
+        """Returns the names of the shards, or None if the input was not
+        split yet
+        """
+        try:
+            with open(os.path.join(self.work_dir, 'shards', self.SHARDS_LIST),
+                      encoding='utf-8') as shards_file:
+                return json.load(shards_file)
+        except FileNotFoundError:
+            return None
+
+    def split(self, input_path, poll_interval=1.):
+        """Split the JSONL file at `input_path` in shards of
+        `records_per_shard` lines. Only one runner does the split,
+        the others wait for it to finish. Returns the shard names.
+        """
+        lock_path = os.path.join(self.work_dir, 'locks', 'split.lock')
+        while self.shards() is None:
+            if not self._acquire(lock_path):
+                time.sleep(poll_interval)
+                continue
+            try:
+                if self.shards() is None:
+                    self._split(input_path)
+            finally:
+                self._release(lock_path)
+        return self.shards()
+
+    def _split(self, input_path):
+        shard_names = []
+        shard_lines = []
+
+        def write_shard():
+            name = f"shard-{len(shard_names):06d}"
+            _write_atomically(self._path('shards', name, 'jsonl'), ''.join(shard_lines))
+            shard_names.append(name)
+            shard_lines.clear()
+
+        with open(input_path, encoding='utf-8') as input_file:
+            for line in input_file:
+                if not line.strip():
+                    continue
+                shard_lines.append(line if line.endswith('\n') else line + '\n')
+                if len(shard_lines) >= self.records_per_shard:
+                    write_shard()
+        if shard_lines:
+            write_shard()
+        # written last: its presence means the split is complete
+        _write_atomically(os.path.join(self.work_dir, 'shards', self.SHARDS_LIST),
+                          json.dumps(shard_names))
+        logger.info("Split %s in %d shards", input_path, len(shard_names))
+
+    def is_done(self, shard):
+        """Returns True if the shard was fully processed"""
+        return os.path.exists(self._path('done', shard, 'done'))
+
+    def claim(self):
+        """Claim the first shard which is neither done nor locked by a
+        live runner. Returns its name, or None if there is none
+        """
+        for shard in self.shards() or ():
+            if not self.is_done(shard) and self._acquire(self._path('locks', shard, 'lock')):
+                if self.is_done(shard):
+                    # finished by another runner after the first check
+                    self._release(self._path('locks', shard, 'lock'))
+                    continue
+                return shard
+        return None
+
+    def _read_checkpoint(self, shard):
+        try:
+            with open(self._path('checkpoints', shard, 'json'), encoding='utf-8') as checkpoint:
+                return json.load(checkpoint)
+        except FileNotFoundError:
+            return {'offset': 0, 'output': None, 'output_size': 0}
+
+    def _write_checkpoint(self, shard, offset, output_file, lock_path):
+        """Make the output written so far durable, then record the
+        offset and the partial output file and refresh the lock
+        """
+        if not self._owns(lock_path):
+            raise LockLost(f"The lock of {shard} was taken over by another runner")
+        output_file.flush()
+        os.fsync(output_file.fileno())
+        _write_atomically(self._path('checkpoints', shard, 'json'), json.dumps({
+            'offset': offset,
+            'output': os.path.basename(output_file.name),
+            'output_size': output_file.tell(),
+        }))
+        os.utime(lock_path)
+
+    def _records(self, shard, offset):
+        """Generator over the records of a shard, starting at `offset`.
+        Lines which are not valid JSON are yielded as the
+        JSONDecodeError raised when parsing them
+        """
+        with open(self._path('shards', shard, 'jsonl'), encoding='utf-8') as shard_file:
+            for index, line in enumerate(shard_file):
+                if index >= offset:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as error:
+                        yield error
+
+    def _normalize(self, records):
+        """Yields the (index, result) tuples of the normalization of
+        `records`, in order. The result of the records which could not
+        be parsed is their parsing error
+        """
+        if self.workers == 0:
+            handler = handlers.MetadataHandler(self.base_class, **self.handler_kwargs)
+            for index, raw_metadata in enumerate(records):
+                if isinstance(raw_metadata, json.JSONDecodeError):
+                    yield (index, raw_metadata)
+                else:
+                    yield (index, handler.get_parameters_or_error(
+                        raw_metadata, time_budget=self.time_budget))
+            return
+
+        # the parsing errors are kept aside, and put back between the
+        # results of the workers according to their index. The records
+        # are read by the pool in another thread, deques are thread-safe
+        valid_indexes = collections.deque()
+        parsing_errors = collections.deque()
+
+        def valid_records():
+            for index, raw_metadata in enumerate(records):
+                if isinstance(raw_metadata, json.JSONDecodeError):
+                    parsing_errors.append((index, raw_metadata))
+                else:
+                    valid_indexes.append(index)
+                    yield raw_metadata
+
+        for _, result in parallel.normalize_parallel(
+                valid_records(), self.base_class, workers=self.workers, chunksize=100,
+                handler_kwargs=self.handler_kwargs, time_budget=self.time_budget):
+            index = valid_indexes.popleft()
+            while parsing_errors and parsing_errors[0][0] < index:
+                yield parsing_errors.popleft()
+            yield (index, result)
+        yield from parsing_errors
+
+    @staticmethod
+    def _serialize(index, result):
+        if isinstance(result, Exception):
+            document = {'index': index,
+                        'error': {'type': result.__class__.__name__, 'message': str(result)}}
+            if isinstance(result, errors.NormalizationTimeout):
+                document['error'].update(normalizer=result.normalizer, field=result.field)
+        else:
+            document = {'index': index, 'result': result}
+        return json.dumps(document, default=_json_default) + '\n'
+
+    def _copy_committed_output(self, checkpoint, partial_path):
+        """Create the partial file at `partial_path` with the output
+        committed by the last checkpoint. Returns False if that output
+        is missing
+        """
+        remaining = checkpoint['output_size']
+        with open(partial_path, 'wb') as partial_file:
+            try:
+                if remaining:
+                    with open(os.path.join(self.work_dir, 'output', checkpoint['output']),
+                              'rb') as committed_file:
+                        data = committed_file.read(min(remaining, 1 << 20))
+                        while data and remaining:
+                            partial_file.write(data)
+                            remaining -= len(data)
+                            data = committed_file.read(min(remaining, 1 << 20))
+            except FileNotFoundError:
+                pass
+            if remaining:
+                partial_file.seek(0)
+                partial_file.truncate()
+                return False
+        return True
+
+    def process(self, shard):
+        """Normalize a claimed shard, resuming from its last checkpoint,
+        then write its completion marker and release its lock.
+        The output is written to a partial file which belongs to this
+        call, so that a runner whose lock was taken over can't write in
+        the output of the new owner. LockLost is raised in that case.
+        """
+        lock_path = self._path('locks', shard, 'lock')
+        checkpoint = self._read_checkpoint(shard)
+        output_path = self._path('output', shard, 'jsonl')
+        partial_path = self._path('output', shard, f"{uuid.uuid4().hex}.part")
+        try:
+            # the output written after the last checkpoint is not copied
+            if not self._copy_committed_output(checkpoint, partial_path):
+                logger.warning("The output of %s is missing, restarting it", shard)
+                checkpoint = {'offset': 0}
+            offset = checkpoint['offset']
+            if offset:
+                logger.info("Resuming %s from record %d", shard, offset)
+            with open(partial_path, 'a', encoding='utf-8') as output_file:
+                position = offset
+                for index, result in self._normalize(self._records(shard, offset)):
+                    output_file.write(self._serialize(offset + index, result))
+                    position = offset + index + 1
+                    if (index + 1) % self.checkpoint_interval == 0:
+                        self._write_checkpoint(shard, position, output_file, lock_path)
+                self._write_checkpoint(shard, position, output_file, lock_path)
+            os.replace(partial_path, output_path)
+            _write_atomically(self._path('done', shard, 'done'), self.token)
+            # partial files left by the runners which were interrupted
+            for leftover_path in glob.glob(self._path('output', shard, '*.part')):
+                try:
+                    os.remove(leftover_path)
+                except FileNotFoundError:
+                    pass
+        except LockLost:
+            try:
+                os.remove(partial_path)
+            except FileNotFoundError:
+                pass
+            raise
+        finally:
+            self._release(lock_path)
+
+    def run(self, input_path, poll_interval=1.):
+        """Split the input if necessary, then process shards until all
+        of them are done. While the remaining shards are locked by other
+        runners, their locks are polled every `poll_interval` seconds,
+        so that the shards of the runners which died are taken over.
+        Returns the names of the shards processed by this runner
+        """
+        shards = self.split(input_path)
+        processed = []
+        while True:
+            shard = self.claim()
+            if shard is None:
+                if all(self.is_done(name) for name in shards):
+                    return processed
+                time.sleep(poll_interval)
+                continue
+            try:
+                self.process(shard)
+            except LockLost as error:
+                logger.warning("%s, moving on to the next shard", error)
+                continue
+            processed.append(shard)
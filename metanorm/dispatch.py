@@ -0,0 +1,485 @@
+"""Data structures used by handlers to find the normalizers which are
+able to deal with some metadata without calling every normalizer's
+`check()` method.
+Lookups are thread-safe. Insertions must not be done concurrently with
+lookups, except in LRUCache and CircuitBreaker which are protected by a
+lock.
+"""
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+
+class PrefixTrie():
+    """Character trie associating string prefixes with values.
+    Looking up a string returns the values of all the prefixes of that
+    string in one walk over its characters.
+    """
+
+    # key under which the values are stored in a node.
+    # None can't be mistaken for a character
+    _VALUES = None
+
+    def __init__(self):
+        self._root = {}
+
+    def insert(self, prefix, value):
+        """Associate `value` with `prefix`"""
+        node = self._root
+        for character in prefix:
+            node = node.setdefault(character, {})
+        node.setdefault(self._VALUES, []).append(value)
+
+    def lookup(self, string):
+        """Returns the values associated with the prefixes of `string`.
+        Values associated with longer prefixes come first.
+        """
+        matches = []
+        node = self._root
+        if self._VALUES in node:
+            matches.append(node[self._VALUES])
+        for character in string:
+            node = node.get(character)
+            if node is None:
+                break
+            if self._VALUES in node:
+                matches.append(node[self._VALUES])
+        return [value for values in reversed(matches) for value in values]
+
+    def __bool__(self):
+        return bool(self._root)
+
+
+class KeySignatureIndex():
+    """Index associating sets of required keys with values.
+    Each key is represented by a bit, so that the keys present in a
+    dictionary can be summarized in a signature computed in one pass
+    over its keys. A value matches if the signature contains all the
+    bits of its required keys.
+    """
+
+    def __init__(self):
+        self._key_bits = {}
+        self._entries = []
+
+    def insert(self, keys, value):
+        """Associate `value` with the set of required `keys`"""
+        mask = 0
+        for key in keys:
+            mask |= self._key_bits.setdefault(key, 1 << len(self._key_bits))
+        self._entries.append((mask, value))
+
+    def signature(self, keys):
+        """Returns the bit signature of `keys`"""
+        signature = 0
+        key_bits = self._key_bits
+        for key in keys:
+            signature |= key_bits.get(key, 0)
+        return signature
+
+    def lookup(self, keys):
+        """Returns the values whose required keys are all in `keys`,
+        in insertion order
+        """
+        signature = self.signature(keys)
+        return [value for mask, value in self._entries if signature & mask == mask]
+
+    def __bool__(self):
+        return bool(self._entries)
+
+
+class SubstringAutomaton():
+    """Aho-Corasick automaton associating substrings with values.
+    Looking up a string returns the values of all the substrings it
+    contains in one scan of its characters, whatever the number of
+    substrings.
+    """
+
+    def __init__(self):
+        # each state is represented by an index in these lists
+        self._transitions = [{}]
+        self._fail = [0]
+        self._outputs = [[]]
+        self._built = True
+        self._build_lock = threading.Lock()
+
+    def insert(self, substring, value):
+        """Associate `value` with `substring`"""
+        if not substring:
+            raise ValueError("Empty substrings can't be inserted")
+        state = 0
+        for character in substring:
+            next_state = self._transitions[state].get(character)
+            if next_state is None:
+                next_state = len(self._transitions)
+                self._transitions.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+                self._transitions[state][character] = next_state
+            state = next_state
+        self._outputs[state].append(value)
+        self._built = False
+
+    def _build(self):
+        """Compute the failure links with a breadth-first traversal of
+        the states. The outputs of a state are completed with those of
+        the state its failure link points to.
+        """
+        queue = deque()
+        for state in self._transitions[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for character, next_state in self._transitions[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and character not in self._transitions[fail]:
+                    fail = self._fail[fail]
+                fail = self._transitions[fail].get(character, 0)
+                self._fail[next_state] = fail if fail != next_state else 0
+                self._outputs[next_state] = (self._outputs[next_state] +
+                                             self._outputs[self._fail[next_state]])
+        self._built = True
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_build_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_lock = threading.Lock()
+
+    def build(self):
+        """Compute the failure links if substrings were inserted since
+        the last build. Called by lookup() if necessary
+        """
+        if not self._built:
+            with self._build_lock:
+                if not self._built:
+                    self._build()
+
+    def lookup(self, string):
+        """Returns the values associated with the substrings contained
+        in `string`, in order of first occurrence and without
+        duplicates
+        """
+        self.build()
+        transitions = self._transitions
+        fail = self._fail
+        outputs = self._outputs
+        matches = []
+        state = 0
+        for character in string:
+            while state and character not in transitions[state]:
+                state = fail[state]
+            state = transitions[state].get(character, 0)
+            for value in outputs[state]:
+                if value not in matches:
+                    matches.append(value)
+        return matches
+
+    def __bool__(self):
+        return bool(self._transitions[0])
+
+
+class TokenIndex():
+    """Inverted index of the alphanumeric tokens contained in a list of
+    texts. Finds the texts which contain a substring without scanning
+    all of them: the tokens of the substring which are delimited on
+    both sides are looked up in the index, and only the texts which
+    contain all of them are checked. The last `cache_size` results are
+    kept, so texts must not be modified after the index is built.
+    The search is case-sensitive: lower-case the texts and the
+    substrings for a case-insensitive search.
+    """
+
+    _TOKEN_REGEX = re.compile(r'\w+')
+
+    def __init__(self, texts, cache_size=1024):
+        self.texts = list(texts)
+        self._positions = {}
+        for position, text in enumerate(self.texts):
+            for token in self._TOKEN_REGEX.findall(text):
+                self._positions.setdefault(token, set()).add(position)
+        self._matches = LRUCache(cache_size)
+
+    def _candidates(self, substring):
+        """Returns the positions of the texts which may contain
+        `substring`
+        """
+        exact_tokens = []
+        partial_tokens = []
+        for match in self._TOKEN_REGEX.finditer(substring):
+            # the tokens at the edges of the substring may be parts of
+            # longer tokens in the texts
+            if match.start() == 0 or match.end() == len(substring):
+                partial_tokens.append(match)
+            else:
+                exact_tokens.append(match.group())
+        if exact_tokens:
+            token_positions = sorted(
+                (self._positions.get(token, frozenset()) for token in exact_tokens), key=len)
+            return token_positions[0].intersection(*token_positions[1:])
+        if partial_tokens:
+            match = max(partial_tokens, key=lambda match: len(match.group()))
+            at_start = match.start() == 0
+            at_end = match.end() == len(substring)
+            candidates = set()
+            for token, positions in self._positions.items():
+                if self._contains_part(token, match.group(), at_start, at_end):
+                    candidates.update(positions)
+            return candidates
+        return range(len(self.texts))
+
+    @staticmethod
+    def _contains_part(token, part, at_start, at_end):
+        """Returns True if `part`, a token found at the start and/or at
+        the end of a substring, can be part of `token`
+        """
+        if at_start and at_end:
+            return part in token
+        if at_start:
+            return token.endswith(part)
+        return token.startswith(part)
+
+    def find(self, substring):
+        """Returns the frozenset of the positions of the texts which
+        contain `substring`
+        """
+        matches = self._matches.get(substring)
+        if matches is None:
+            matches = frozenset(position for position in self._candidates(substring)
+                                if substring in self.texts[position])
+            self._matches.put(substring, matches)
+        return matches
+
+
+class LRUCache():
+    """Bounded mapping which discards the least recently used entries
+    first. Keeps count of hits and misses. All operations are protected
+    by a lock, so a cache can be shared between threads.
+    """
+
+    # marks missing entries, None being a valid value
+    _MISSING = object()
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        with self._lock:
+            state = self.__dict__.copy()
+            state['_entries'] = state['_entries'].copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None, validate=None):
+        """Returns the value associated with `key` and marks it as
+        recently used, or returns `default`. Counts a hit or a miss.
+        If `validate` is provided, it is called with the value and
+        entries for which it returns False are discarded and counted
+        as misses.
+        """
+        with self._lock:
+            value = self._entries.get(key, self._MISSING)
+        # the validation can be slow, so it is done without the lock
+        if value is not self._MISSING and validate is not None and not validate(value):
+            with self._lock:
+                if self._entries.get(key) is value:
+                    del self._entries[key]
+            value = self._MISSING
+        with self._lock:
+            if value is self._MISSING:
+                self.misses += 1
+                return default
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Associate `value` with `key`, discarding the least recently
+        used entry if the cache is full
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        """Remove `key` from the cache if it is present"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove all entries and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def items(self):
+        """Returns a list of the (key, value) couples in the cache, from
+        the least to the most recently used
+        """
+        with self._lock:
+            return list(self._entries.items())
+
+    def update(self, items):
+        """Put the (key, value) couples from `items` in the cache"""
+        for key, value in items:
+            self.put(key, value)
+
+    def stats(self):
+        """Returns a dictionary containing the cache statistics"""
+        with self._lock:
+            hits, misses, size = self.hits, self.misses, len(self._entries)
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.,
+            'size': size,
+            'maxsize': self.maxsize,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+
+class CircuitBreaker():
+    """Keeps track of the outcome of the last `window` calls for each
+    key. When the proportion of failures among them reaches
+    `failure_rate`, the circuit of the key is opened: allow() returns
+    False for `cooldown` seconds. After that, one trial call is allowed.
+    If it succeeds the circuit is closed, otherwise it is opened again.
+    All operations are protected by a lock.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_rate, window=100, cooldown=60.):
+        if not 0 < failure_rate <= 1:
+            raise ValueError("failure_rate must be in ]0, 1]")
+        self.failure_rate = failure_rate
+        self.window = window
+        self.cooldown = cooldown
+        self._reset()
+
+    def _reset(self):
+        # outcomes of the last calls: True for a success
+        self._outcomes = {}
+        # monotonic time at which the open circuits were opened
+        self._opened_at = {}
+        # keys whose trial call is running
+        self._trials = set()
+        # number of calls refused since the circuit was opened
+        self.rejected = Counter()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # the state of the circuits is not kept: monotonic times are
+        # meaningless in another process
+        return {name: value for name, value in self.__dict__.items()
+                if name in ('failure_rate', 'window', 'cooldown')}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+
+    def _state(self, key):
+        opened_at = self._opened_at.get(key)
+        if opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - opened_at < self.cooldown or key in self._trials:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self, key):
+        """Returns True if a call can be made for `key`. Counts the
+        refused calls
+        """
+        with self._lock:
+            state = self._state(key)
+            if state == self.HALF_OPEN:
+                self._trials.add(key)
+                return True
+            if state == self.OPEN:
+                self.rejected[key] += 1
+                return False
+            return True
+
+    def record(self, key, success):
+        """Record the outcome of a call made for `key`. Returns the new
+        state of the circuit if it changed, None otherwise
+        """
+        with self._lock:
+            if key in self._trials:
+                self._trials.discard(key)
+                if success:
+                    del self._opened_at[key]
+                    self._outcomes.pop(key, None)
+                    return self.CLOSED
+                self._opened_at[key] = time.monotonic()
+                return self.OPEN
+            if key in self._opened_at:
+                # call allowed before the circuit was opened
+                return None
+            outcomes = self._outcomes.setdefault(key, deque(maxlen=self.window))
+            outcomes.append(success)
+            if (len(outcomes) == self.window and
+                    outcomes.count(False) >= self.failure_rate * self.window):
+                self._opened_at[key] = time.monotonic()
+                self.rejected[key] = 0
+                return self.OPEN
+            return None
+
+    def is_trial(self, key):
+        """Returns True if the call allowed for `key` is the trial call
+        of a half-open circuit
+        """
+        with self._lock:
+            return key in self._trials
+
+    def release(self, key):
+        """End the trial call of `key` without recording its outcome,
+        for example when it was interrupted. The next call after that
+        is a new trial
+        """
+        with self._lock:
+            self._trials.discard(key)
+
+    def status(self):
+        """Returns a dictionary giving, for each key, the state of its
+        circuit, the number of failures among the recorded calls and
+        the number of refused calls since it was opened
+        """
+        with self._lock:
+            return {
+                key: {
+                    'state': self._state(key),
+                    'failures': self._outcomes.get(key, ()).count(False),
+                    'calls': len(self._outcomes.get(key, ())),
+                    'rejected': self.rejected[key],
+                }
+                for key in set(self._outcomes).union(self._opened_at)
+            }
@@ -6,7 +6,39 @@ class MetadataNormalizationError(Exception):
     """
 
 
+class NormalizationTimeout(MetadataNormalizationError):
+    """Exception returned by handlers when the normalization of some
+    metadata exceeded its time budget. `normalizer` and `field` are the
+    names of the normalizer and of the field which was being processed
+    when the time ran out, if they could be determined
+    """
+
+    def __init__(self, message, normalizer=None, field=None):
+        super().__init__(message)
+        self.normalizer = normalizer
+        self.field = field
+
+    def __reduce__(self):
+        # keep the attributes when the exception is sent back by a
+        # worker process
+        return (self.__class__, (self.args[0], self.normalizer, self.field))
+
+
+class NormalizerDisabled(MetadataNormalizationError):
+    """Exception returned by handlers instead of normalizing some
+    metadata when the normalizer it was routed to has been disabled by
+    the circuit breaker after repeated failures
+    """
+
+
 class NoNormalizerFound(Exception):
     """Exception raised by a handler when it was not able to find a
     normalizer suited to normalize some metadata
     """
+
+
+class SnapshotError(Exception):
+    """Exception raised when a handler snapshot can't be loaded, for
+    example because it was made with other versions of metanorm or of
+    the vocabularies
+    """
@@ -1,38 +1,833 @@
 """This module contains handler classes which control how normalizers
 are used
 """
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import inspect
+import itertools
 import logging
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
 
+import metanorm.dispatch as dispatch
 import metanorm.normalizers as normalizers
 import metanorm.utils as utils
-from .errors import NoNormalizerFound
+from .errors import (MetadataNormalizationError, NormalizationTimeout, NormalizerDisabled,
+                     NoNormalizerFound, SnapshotError)
 
 logger = logging.getLogger(__name__)
 
 
+class _RoutingTable():
+    """Routing structures for normalizers which have the same check
+    priority
+    """
+
+    def __init__(self, priority):
+        self.priority = priority
+        self.url_prefix_trie = dispatch.PrefixTrie()
+        self.url_marker_automaton = dispatch.SubstringAutomaton()
+        self.required_keys_index = dispatch.KeySignatureIndex()
+        self.unindexed_normalizers = []
+
+    def add(self, normalizer):
+        """Add a normalizer to the routing structures.
+        Normalizers which declare URL prefixes or markers are found
+        using a prefix trie and a substring automaton, those which
+        declare required keys are filtered using the keys signature of
+        the metadata, the others are checked one by one
+        """
+        if normalizer.url_prefixes or normalizer.url_markers:
+            for prefix in normalizer.url_prefixes:
+                self.url_prefix_trie.insert(prefix, normalizer)
+            for marker in normalizer.url_markers:
+                self.url_marker_automaton.insert(marker, normalizer)
+            if not normalizer.url_routing_is_exhaustive:
+                self.unindexed_normalizers.append(normalizer)
+        elif normalizer.required_keys:
+            self.required_keys_index.insert(normalizer.required_keys, normalizer)
+        else:
+            self.unindexed_normalizers.append(normalizer)
+
+    def candidates(self, raw_metadata):
+        """Generator which yields the normalizers which might be able
+        to deal with `raw_metadata`, most likely first. Each normalizer
+        is yielded once, even if it is found by several structures
+        """
+        url_candidates = ()
+        url = raw_metadata.get('url')
+        if isinstance(url, str):
+            url_candidates = []
+            if self.url_prefix_trie:
+                url_candidates.extend(self.url_prefix_trie.lookup(url))
+            if self.url_marker_automaton:
+                url_candidates.extend(self.url_marker_automaton.lookup(url))
+            yield from dict.fromkeys(url_candidates)
+        if self.required_keys_index:
+            yield from self.required_keys_index.lookup(raw_metadata.keys())
+        # normalizers whose URL routing is not exhaustive are indexed
+        # and unindexed
+        for normalizer in self.unindexed_normalizers:
+            if normalizer not in url_candidates:
+                yield normalizer
+
+
+async def _aiterate(iterable):
+    """Asynchronous generator over the elements of an asynchronous or
+    regular iterable
+    """
+    if hasattr(iterable, '__aiter__'):
+        async for element in iterable:
+            yield element
+    else:
+        for element in iterable:
+            yield element
+
+
+def url_directory(raw_metadata):
+    """Default routing key: the 'url' attribute of the metadata
+    without its basename. Returns None if there is no URL.
+    """
+    url = raw_metadata.get('url')
+    if isinstance(url, str) and '/' in url:
+        return url.rsplit('/', 1)[0]
+    return None
+
+
+def snapshot_fingerprint():
+    """Returns a dictionary which identifies the versions of metanorm,
+    Python and of the pythesint vocabularies. Snapshots made with a
+    different fingerprint are rejected
+    """
+    return {
+        'metanorm': utils.get_metanorm_version(),
+        'python': tuple(sys.version_info[:2]),
+        'vocabularies': tuple(utils.get_vocabulary_fingerprint(name)
+                              for name in utils.PYTHESINT_VOCABULARIES),
+    }
+
+
+def _timeout_error(error):
+    """Build a NormalizationTimeout from a TimeBudgetExceeded
+    exception. The normalizer and the field which were being processed
+    are taken from the innermost frames of the traceback which belong
+    to a normalizer's method
+    """
+    normalizer_name = field = None
+    traceback = error.__traceback__
+    while traceback is not None:
+        frame = traceback.tb_frame
+        instance = frame.f_locals.get('self')
+        if isinstance(instance, normalizers.MetadataNormalizer):
+            normalizer_name = instance.__class__.__name__
+            if frame.f_code.co_name.startswith('get_'):
+                field = frame.f_code.co_name[len('get_'):]
+        traceback = traceback.tb_next
+    timeout = NormalizationTimeout(
+        f"The normalization exceeded its time budget of {error.args[0]}s "
+        f"(normalizer: {normalizer_name}, field: {field})",
+        normalizer=normalizer_name, field=field)
+    timeout.__cause__ = error
+    return timeout
+
+
+def _describe_arguments(arguments):
+    """Returns a picklable description of a handler's arguments which
+    can be compared between processes
+    """
+    description = []
+    for name, value in sorted(arguments.items()):
+        if hasattr(value, '__qualname__'):
+            value = f"{value.__module__}.{value.__qualname__}"
+        else:
+            value = repr(value)
+        description.append((name, value))
+    return tuple(description)
+
+
 class MetadataHandler():
     """Handler which builds a list of of subclasses of a base
-    normalizer class
+    normalizer class.
+    A handler can be shared between threads: the routing structures
+    are only read during lookups, the counters and the routing cache
+    are protected by locks, and reordering replaces the normalizers
+    list and routing tables instead of modifying them.
     """
 
-    def __init__(self, base_class=None):
+    HINT_VERIFICATION_POLICIES = ('always', 'sample', 'never')
+
+    # maximum number of elements given at once to normalize_many() by
+    # get_parameters_many() when the circuit breaker is enabled, so
+    # that a failing normalizer is disabled within a group
+    CIRCUIT_BREAKER_CHUNK_SIZE = 16
+
+    def __init__(self, base_class=None, adaptive_ordering=False, reordering_interval=1000,
+                 routing_cache_size=0, routing_key=url_directory,
+                 hint_verification='always', hint_sampling_interval=100,
+                 circuit_breaker_failure_rate=None, circuit_breaker_window=100,
+                 circuit_breaker_cooldown=60., warm_up=False):
         """Builds a list of normalizers, instantiating one per subclass
-        of `base_class`
+        of `base_class`.
+        Normalizers are checked by decreasing `check_priority`, then
+        by name. If `adaptive_ordering` is True, the normalizers which
+        have the same priority are reordered by decreasing number of
+        matches every `reordering_interval` lookups.
+        If `routing_cache_size` is greater than 0, the normalizer
+        found for some metadata is cached using the key returned by
+        `routing_key(raw_metadata)`, and is tried first for metadata
+        which has the same key. `routing_key` can return None to
+        prevent caching.
+        `hint_verification` defines whether the check() method of a
+        normalizer designated by a routing hint is called 'always',
+        on one 'sample' out of `hint_sampling_interval`, or 'never'.
+        If `circuit_breaker_failure_rate` is set, a normalizer which
+        failed to normalize at least that proportion of its last
+        `circuit_breaker_window` elements is disabled for
+        `circuit_breaker_cooldown` seconds: the elements routed to it
+        are rejected with a NormalizerDisabled error without calling
+        it.
+        If `warm_up` is True, warm_up() is called once the handler is
+        built.
         """
+        if hint_verification not in self.HINT_VERIFICATION_POLICIES:
+            raise ValueError(
+                f"hint_verification must be one of {self.HINT_VERIFICATION_POLICIES}")
         if base_class is None:
             base_class = normalizers.MetadataNormalizer
 
-        self.normalizers = [
-            normalizer_class()
-            for normalizer_class in utils.get_all_subclasses(base_class)
-        ]
+        # used to check that a snapshot matches the requested arguments
+        self._arguments = _describe_arguments({
+            name: value for name, value in locals().items()
+            if name in inspect.signature(MetadataHandler).parameters})
+
+        self.normalizers = sorted(
+            (normalizer_class()
+             for normalizer_class in utils.get_all_subclasses(base_class)
+             if not utils.is_abstract(normalizer_class)),
+            key=self._default_sort_key)
 
-    def get_parameters(self, raw_metadata):
-        """Loop through normalizers and uses the first one whose
-        `check()` method returns true to normalize the raw metadata
+        # the classes whose routing gate must pass
+        # before a normalizer is checked
+        self._gates = {}
+        for normalizer in self.normalizers:
+            gates = self._get_gates(normalizer.__class__)
+            if gates:
+                self._gates[normalizer] = gates
+
+        self.adaptive_ordering = adaptive_ordering
+        self.reordering_interval = reordering_interval
+        self.match_counts = collections.Counter()
+        self.lookups_count = 0
+        # list of (lookups_count, ordering) tuples
+        self.ordering_history = [(0, self.ordering)]
+
+        self.routing_cache = dispatch.LRUCache(routing_cache_size)
+        self.routing_key = routing_key
+
+        self.hint_verification = hint_verification
+        self.hint_sampling_interval = hint_sampling_interval
+        self._hints_count = 0
+        self._hints = self._build_hints_index()
+
+        self.circuit_breaker = None
+        if circuit_breaker_failure_rate:
+            self.circuit_breaker = dispatch.CircuitBreaker(
+                circuit_breaker_failure_rate, circuit_breaker_window, circuit_breaker_cooldown)
+
+        # protects the counters and the reordering
+        self._lock = threading.Lock()
+        self._routing_tables = self._build_routing_tables(self.normalizers)
+
+        # timings of the last warm-up
+        self.warm_up_timings = None
+        if warm_up:
+            self.warm_up()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def warm_up(self):
+        """Load the pythesint vocabularies used by the normalizers and
+        do the lookups which don't depend on the metadata, so that the
+        first normalization does not pay for it.
+        Returns a dictionary containing the time spent, in seconds,
+        loading each vocabulary ('vocabularies'), doing the lookups of
+        each normalizer ('lookups') and in total ('total'). The same
+        dictionary is kept in `warm_up_timings`.
+        """
+        timings = {'vocabularies': {}, 'lookups': {}}
+        start = time.perf_counter()
+
+        vocabulary_names = sorted(set(itertools.chain.from_iterable(
+            normalizer.vocabularies for normalizer in self.normalizers)))
+        for vocabulary_name in vocabulary_names:
+            vocabulary_start = time.perf_counter()
+            try:
+                utils.load_vocabulary(vocabulary_name)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning("Could not load the %s vocabulary: %s", vocabulary_name, error)
+            timings['vocabularies'][vocabulary_name] = time.perf_counter() - vocabulary_start
+
+        for normalizer in self.normalizers:
+            lookups_start = time.perf_counter()
+            try:
+                normalizer.warm_up()
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning("Could not warm up %s: %s", normalizer.__class__.__name__, error)
+            timings['lookups'][normalizer.__class__.__name__] = (
+                time.perf_counter() - lookups_start)
+
+        timings['total'] = time.perf_counter() - start
+        logger.info("Warmed up in %.3fs: vocabularies %.3fs, lookups %.3fs", timings['total'],
+                    sum(timings['vocabularies'].values()), sum(timings['lookups'].values()))
+        self.warm_up_timings = timings
+        return timings
+
+    def save_snapshot(self, path):
+        """Write the handler, including its routing structures,
+        counters and routing cache, to the file at `path`, along with
+        the current snapshot fingerprint and the cached GCMD searches.
+        The file is replaced atomically.
+        The routing key must be picklable (not a lambda).
+        """
+        with self._lock:
+            data = pickle.dumps({'fingerprint': snapshot_fingerprint(), 'handler': self,
+                                 'gcmd_search_cache': utils.GCMD_SEARCH_CACHE.items()},
+                                protocol=pickle.HIGHEST_PROTOCOL)
+        directory = os.path.dirname(os.path.abspath(path))
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as snapshot_file:
+                snapshot_file.write(data)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    @classmethod
+    def load_snapshot(cls, path):
+        """Load a handler saved by save_snapshot(). Raises a
+        SnapshotError if the file can't be read or if it was made with
+        other versions of metanorm, Python or the vocabularies.
+        The GCMD searches cached in the snapshot are added to the
+        current cache.
+        Snapshots are pickle files: only load trusted files.
+        """
+        try:
+            with open(path, 'rb') as snapshot_file:
+                snapshot = pickle.load(snapshot_file)
+            fingerprint = snapshot['fingerprint']
+            handler = snapshot['handler']
+        except Exception as error:  # pylint: disable=broad-except
+            raise SnapshotError(f"Could not read the snapshot {path}") from error
+        if not isinstance(handler, cls):
+            raise SnapshotError(f"{path} does not contain a {cls.__name__}")
+        if fingerprint != snapshot_fingerprint():
+            raise SnapshotError(f"The snapshot {path} is stale")
+        utils.GCMD_SEARCH_CACHE.update(snapshot.get('gcmd_search_cache', ()))
+        return handler
+
+    @classmethod
+    def from_snapshot(cls, path, base_class=None, **kwargs):
+        """Load the handler saved at `path` if the snapshot is valid
+        and was made with the same arguments. Otherwise, build a new
+        handler using `base_class` and `kwargs` and save it at `path`.
         """
+        arguments = inspect.signature(cls).bind(base_class, **kwargs)
+        arguments.apply_defaults()
+        if arguments.arguments['base_class'] is None:
+            arguments.arguments['base_class'] = normalizers.MetadataNormalizer
+        try:
+            handler = cls.load_snapshot(path)
+        except SnapshotError as error:
+            logger.debug("Building a new handler: %s", error)
+        else:
+            if handler._arguments == _describe_arguments(arguments.arguments):
+                return handler
+            logger.debug("Building a new handler: %s was made with other arguments", path)
+        handler = cls(base_class, **kwargs)
+        handler.save_snapshot(path)
+        return handler
+
+    @staticmethod
+    def _default_sort_key(normalizer):
+        normalizer_class = normalizer.__class__
+        return (-normalizer.check_priority,
+                f"{normalizer_class.__module__}.{normalizer_class.__qualname__}")
+
+    def _build_hints_index(self):
+        """Returns a dictionary mapping the possible routing hints to
+        the normalizers they designate: each normalizer can be
+        designated by its class or one of its ancestors, by their names
+        or by one of its routing tags
+        """
+        hints = collections.defaultdict(list)
         for normalizer in self.normalizers:
+            keys = list(normalizer.routing_tags)
+            for cls in normalizer.__class__.__mro__:
+                if cls is normalizers.MetadataNormalizer:
+                    break
+                keys.extend((cls, cls.__name__))
+            for key in keys:
+                if normalizer not in hints[key]:
+                    hints[key].append(normalizer)
+        return dict(hints)
+
+    @staticmethod
+    def _get_gates(normalizer_class):
+        """Returns the ancestors of `normalizer_class` which define
+        their own routing gate, from the root of the class tree
+        """
+        gates = []
+        for ancestor in normalizer_class.__mro__[1:]:
+            if ancestor is normalizers.MetadataNormalizer:
+                break
+            if 'routing_gate' in vars(ancestor):
+                gates.append(ancestor)
+        return tuple(reversed(gates))
+
+    def _passes_gates(self, normalizer, raw_metadata, gate_results):
+        """Returns True if the routing gates of the normalizer's
+        ancestors pass. The result of each gate is stored in
+        `gate_results` so that a failed gate prunes the whole subtree
+        for the current metadata
+        """
+        for gate_class in self._gates.get(normalizer, ()):
+            try:
+                passed = gate_results[gate_class]
+            except KeyError:
+                passed = gate_results[gate_class] = gate_class.routing_gate(raw_metadata)
+            if not passed:
+                return False
+        return True
+
+    @property
+    def ordering(self):
+        """Names of the normalizers' classes in the order in which
+        they are checked
+        """
+        return tuple(normalizer.__class__.__name__ for normalizer in self.normalizers)
+
+    @staticmethod
+    def _build_routing_tables(normalizers_list):
+        """Returns a list of routing tables, one per priority, following
+        the order of `normalizers_list`
+        """
+        routing_tables = []
+        for priority, group in itertools.groupby(normalizers_list, lambda n: n.check_priority):
+            routing_table = _RoutingTable(priority)
+            for normalizer in group:
+                routing_table.add(normalizer)
+            routing_table.url_marker_automaton.build()
+            routing_tables.append(routing_table)
+        return routing_tables
+
+    def reorder_normalizers(self):
+        """Sort normalizers by decreasing number of matches, without
+        changing the priority order.
+        The normalizers list and the routing tables are replaced rather
+        than modified, so that concurrent lookups are not disturbed.
+        """
+        with self._lock:
+            match_counts = self.match_counts.copy()
+            lookups_count = self.lookups_count
+        sorted_normalizers = sorted(self.normalizers, key=lambda normalizer: (
+            -normalizer.check_priority,
+            -match_counts[normalizer.__class__]))
+        routing_tables = self._build_routing_tables(sorted_normalizers)
+        with self._lock:
+            self.normalizers = sorted_normalizers
+            self._routing_tables = routing_tables
+            ordering = self.ordering
+            if ordering != self.ordering_history[-1][1]:
+                self.ordering_history.append((lookups_count, ordering))
+                logger.debug("Normalizers reordered: %s", ordering)
+
+    @property
+    def routing_cache_stats(self):
+        """Statistics of the routing cache"""
+        return self.routing_cache.stats()
+
+    def _candidates(self, raw_metadata):
+        """Generator which yields the normalizers which might be able
+        to deal with `raw_metadata`, by decreasing priority
+        """
+        for routing_table in self._routing_tables:
+            yield from routing_table.candidates(raw_metadata)
+
+    def _find_hinted_normalizer(self, raw_metadata, hint):
+        """Returns the normalizer designated by `hint` which is able to
+        deal with the raw metadata, or None.
+        If the hint designates a single normalizer, its check() method
+        is called according to the hint verification policy.
+        """
+        try:
+            candidates = self._hints[hint]
+        except (KeyError, TypeError) as error:
+            raise ValueError(f"Unknown routing hint {hint}") from error
+
+        if len(candidates) == 1:
+            with self._lock:
+                self._hints_count += 1
+                hints_count = self._hints_count
+            if (self.hint_verification == 'never' or
+                    (self.hint_verification == 'sample' and
+                     hints_count % self.hint_sampling_interval != 0)):
+                return candidates[0]
+
+        for normalizer in candidates:
             if normalizer.check(raw_metadata):
-                logger.debug("%s will be used", normalizer.__class__.__name__)
-                return normalizer.normalize(raw_metadata)
-        raise NoNormalizerFound(f"No matching normalizer was found in {self.normalizers}")
+                return normalizer
+        logger.debug("No normalizer designated by %s matched the metadata", hint)
+        return None
+
+    def _find_normalizer(self, raw_metadata, hint=None):
+        """Returns the first normalizer whose `check()` method returns
+        True for `raw_metadata`, or None.
+        If a hint is given, the normalizers it designates are tried
+        first.
+        """
+        result = None
+        routing_key = None
+
+        if hint is not None:
+            result = self._find_hinted_normalizer(raw_metadata, hint)
+
+        if result is None and self.routing_cache.maxsize > 0:
+            routing_key = self.routing_key(raw_metadata)
+            if routing_key is not None:
+                result = self.routing_cache.get(
+                    routing_key,
+                    validate=lambda normalizer: normalizer.check(raw_metadata))
+
+        if result is None:
+            gate_results = {}
+            for normalizer in self._candidates(raw_metadata):
+                if (self._passes_gates(normalizer, raw_metadata, gate_results)
+                        and normalizer.check(raw_metadata)):
+                    result = normalizer
+                    break
+            if routing_key is not None and result is not None:
+                self.routing_cache.put(routing_key, result)
+
+        if self.adaptive_ordering:
+            with self._lock:
+                self.lookups_count += 1
+                if result is not None:
+                    self.match_counts[result.__class__] += 1
+                reorder = self.lookups_count % self.reordering_interval == 0
+            if reorder:
+                self.reorder_normalizers()
+
+        return result
+
+    def route(self, raw_metadata, hint=None):
+        """Returns the class of the normalizer able to deal with the
+        raw metadata, or None if there is none. The metadata is not
+        normalized.
+        """
+        normalizer = self._find_normalizer(raw_metadata, hint=hint)
+        return None if normalizer is None else normalizer.__class__
+
+    def route_many(self, raw_metadata_iterable, hint=None, aggregate=False):
+        """Route each element of `raw_metadata_iterable`.
+        Returns an iterator over the normalizer classes, which yields
+        None for the metadata no normalizer can deal with. If
+        `aggregate` is True, returns a Counter of the number of
+        elements routed to each class (None for the unmatched ones)
+        instead.
+        """
+        routes = (self.route(raw_metadata, hint=hint) for raw_metadata in raw_metadata_iterable)
+        if aggregate:
+            return collections.Counter(routes)
+        return routes
+
+    def get_parameters(self, raw_metadata, hint=None):
+        """Find the normalizer able to deal with the raw metadata and
+        use it to normalize the raw metadata.
+        Callers which know where the metadata comes from can give a
+        `hint`: a normalizer class, a class name or a routing tag.
+        The designated normalizer is used directly, depending on the
+        hint verification policy. If it turns out it can't deal with
+        the metadata, the other normalizers are tried.
+        """
+        normalizer = self._find_normalizer(raw_metadata, hint=hint)
+        if normalizer is None:
+            raise NoNormalizerFound(f"No matching normalizer was found in {self.normalizers}")
+        logger.debug("%s will be used", normalizer.__class__.__name__)
+        if self.circuit_breaker is None:
+            return normalizer.normalize(raw_metadata)
+
+        self._check_circuit(normalizer)
+        success = None
+        try:
+            result = normalizer.normalize(raw_metadata)
+            success = True
+        except (Exception, utils.TimeBudgetExceeded):
+            success = False
+            raise
+        finally:
+            # the trial call of a half-open circuit must end even if
+            # the normalization is interrupted, by a KeyboardInterrupt
+            # for example
+            if success is None:
+                self.circuit_breaker.release(normalizer.__class__.__name__)
+            else:
+                self._record_outcome(normalizer, success)
+        return result
+
+    def _check_circuit(self, normalizer):
+        """Raise a NormalizerDisabled error if the circuit breaker
+        does not allow to call `normalizer`
+        """
+        name = normalizer.__class__.__name__
+        if not self.circuit_breaker.allow(name):
+            raise NormalizerDisabled(f"{name} is disabled after repeated failures")
+
+    def _record_outcome(self, normalizer, success):
+        """Record the outcome of a normalization in the circuit
+        breaker. The opening and closing of circuits are logged once
+        instead of logging each rejected element
+        """
+        name = normalizer.__class__.__name__
+        state = self.circuit_breaker.record(name, success)
+        if state == dispatch.CircuitBreaker.OPEN:
+            status = self.circuit_breaker.status()[name]
+            logger.error(
+                "%s failed to normalize %d of its last %d elements, it is disabled for %ss",
+                name, status['failures'], status['calls'], self.circuit_breaker.cooldown)
+        elif state == dispatch.CircuitBreaker.CLOSED:
+            logger.warning("%s is enabled again, %d elements were rejected while it was disabled",
+                           name, self.circuit_breaker.rejected[name])
+
+    def get_parameters_or_error(self, raw_metadata, hint=None, time_budget=None):
+        """Same as get_parameters(), but returns the exception which
+        prevented the normalization instead of raising it:
+        NoNormalizerFound if no normalizer matched,
+        MetadataNormalizationError otherwise.
+        If `time_budget` is given, the normalization is interrupted
+        after that many seconds and a NormalizationTimeout is returned.
+        This is only possible in the main thread, on Unix systems: a
+        RuntimeError is raised otherwise.
+        """
+        utils.check_time_budget(time_budget)
+        try:
+            with utils.time_budget(time_budget):
+                return self.get_parameters(raw_metadata, hint=hint)
+        except utils.TimeBudgetExceeded as error:
+            timeout = _timeout_error(error)
+            logger.warning("%s", timeout)
+            return timeout
+        except (MetadataNormalizationError, NoNormalizerFound) as error:
+            return error
+        except Exception as error:  # pylint: disable=broad-except
+            normalization_error = MetadataNormalizationError(
+                f"Unexpected error while normalizing the following metadata: {raw_metadata}: "
+                f"{error!r}")
+            normalization_error.__cause__ = error
+            return normalization_error
+
+    def get_parameters_many(self, raw_metadata_iterable, hint=None, time_budget=None):
+        """Normalize a batch of raw metadata dictionaries.
+        All the elements are routed first, then each normalizer
+        receives the group of elements it can deal with through its
+        `normalize_many()` method.
+        Returns a list containing, in the input order, either the
+        normalized dictionary or the exception which prevented the
+        normalization of each element: NoNormalizerFound if no
+        normalizer matched, MetadataNormalizationError otherwise.
+        If the circuit breaker is enabled, the groups are normalized
+        by chunks of at most CIRCUIT_BREAKER_CHUNK_SIZE elements, and
+        the circuit is checked before each element: once a normalizer
+        is disabled, the rest of its group is rejected. The trial call
+        of a half-open circuit is made with a single element.
+        If `time_budget` is given, the elements are given to
+        `normalize_many()` one by one, each with that many seconds, and
+        the ones which exceed it get a NormalizationTimeout. The same
+        restrictions as in get_parameters_or_error() apply.
+        """
+        utils.check_time_budget(time_budget)
+        raw_metadata_list = list(raw_metadata_iterable)
+        results = [None] * len(raw_metadata_list)
+
+        groups = collections.defaultdict(list)
+        for index, raw_metadata in enumerate(raw_metadata_list):
+            normalizer = self._find_normalizer(raw_metadata, hint=hint)
+            if normalizer is None:
+                results[index] = NoNormalizerFound(
+                    f"No matching normalizer was found in {self.normalizers}")
+            else:
+                groups[normalizer].append(index)
+
+        for normalizer, indices in groups.items():
+            logger.debug("%s will be used for %d elements",
+                         normalizer.__class__.__name__, len(indices))
+            self._normalize_group(normalizer, indices, raw_metadata_list, results, time_budget)
+
+        return results
+
+    def _normalize_group(self, normalizer, indices, raw_metadata_list, results, time_budget):
+        """Normalize the elements of `raw_metadata_list` at `indices`
+        with `normalizer`, and write their results in `results`
+        """
+        name = normalizer.__class__.__name__
+        if time_budget:
+            chunk_size = 1
+        elif self.circuit_breaker is not None:
+            chunk_size = self.CIRCUIT_BREAKER_CHUNK_SIZE
+        else:
+            chunk_size = len(indices)
+
+        position = 0
+        while position < len(indices):
+            size = chunk_size
+            if self.circuit_breaker is not None:
+                try:
+                    self._check_circuit(normalizer)
+                except NormalizerDisabled as error:
+                    results[indices[position]] = error
+                    position += 1
+                    continue
+                if self.circuit_breaker.is_trial(name):
+                    size = 1
+            chunk = indices[position:position + size]
+            try:
+                chunk_results = self._normalize_chunk(
+                    normalizer, [raw_metadata_list[index] for index in chunk], time_budget)
+            except BaseException:
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.release(name)
+                raise
+            for index, result in zip(chunk, chunk_results):
+                results[index] = result
+                if self.circuit_breaker is not None:
+                    self._record_outcome(normalizer, not isinstance(result, Exception))
+            position += len(chunk)
+
+    @staticmethod
+    def _normalize_chunk(normalizer, raw_metadata_list, time_budget=None):
+        """Normalize a list of elements with the normalize_many()
+        method of `normalizer`, within `time_budget` seconds. Returns
+        the list of results
+        """
+        try:
+            with utils.time_budget(time_budget):
+                chunk_results = normalizer.normalize_many(raw_metadata_list)
+            if len(chunk_results) != len(raw_metadata_list):
+                raise ValueError(
+                    f"normalize_many() returned {len(chunk_results)} results "
+                    f"for {len(raw_metadata_list)} elements")
+        except utils.TimeBudgetExceeded as error:
+            timeout = _timeout_error(error)
+            logger.warning("%s", timeout)
+            chunk_results = [timeout]
+        except Exception as error:  # pylint: disable=broad-except
+            chunk_results = []
+            for _ in raw_metadata_list:
+                normalization_error = MetadataNormalizationError(
+                    f"{normalizer.__class__.__name__} failed to normalize a batch")
+                normalization_error.__cause__ = error
+                chunk_results.append(normalization_error)
+        return chunk_results
+
+    def normalize_stream(self, raw_metadata_iterable, hint=None, on_error=None,
+                         max_consecutive_errors=None):
+        """Generator which lazily normalizes the elements of
+        `raw_metadata_iterable` and yields (index, normalized_metadata)
+        tuples for the elements which were successfully normalized.
+        Failures are not yielded: `on_error(index, raw_metadata, error)`
+        is called for each of them, or they are logged if `on_error` is
+        None.
+        If `max_consecutive_errors` is set, a MetadataNormalizationError
+        is raised when that many consecutive elements fail.
+        """
+        consecutive_errors = 0
+        for index, raw_metadata in enumerate(raw_metadata_iterable):
+            result = self.get_parameters_or_error(raw_metadata, hint=hint)
+            if isinstance(result, Exception):
+                consecutive_errors += 1
+                if on_error is None:
+                    logger.warning("Element %d could not be normalized: %s", index, result)
+                else:
+                    on_error(index, raw_metadata, result)
+                if (max_consecutive_errors is not None and
+                        consecutive_errors >= max_consecutive_errors):
+                    raise MetadataNormalizationError(
+                        f"Stopping after {consecutive_errors} consecutive errors") from result
+            else:
+                consecutive_errors = 0
+                yield (index, result)
+
+    def _executor_call(self, executor, method_name, raw_metadata, hint):
+        """Returns a callable which runs a normalization method in
+        `executor`. Process executors must be built by
+        parallel.process_executor(): their workers use their own handler
+        instead of receiving this one with each element
+        """
+        if isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+            call_worker_handler = getattr(executor, 'call_worker_handler', None)
+            if call_worker_handler is None:
+                raise ValueError(
+                    "Process executors must be created with parallel.process_executor()")
+            return functools.partial(call_worker_handler, method_name, raw_metadata, hint)
+        return functools.partial(getattr(self, method_name), raw_metadata, hint=hint)
+
+    async def aget_parameters(self, raw_metadata, hint=None, executor=None):
+        """Asynchronous version of get_parameters(). The normalization
+        is run in `executor`, or in the event loop's default executor,
+        so that the event loop is not blocked. Process executors must
+        be created with parallel.process_executor(), and use the
+        handlers of their workers
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, self._executor_call(executor, 'get_parameters', raw_metadata, hint))
+
+    async def anormalize_stream(self, raw_metadata_iterable, hint=None, executor=None,
+                                max_concurrency=8):
+        """Asynchronous generator which normalizes the elements of an
+        asynchronous or regular iterable in `executor`, or in the event
+        loop's default executor.
+        At most `max_concurrency` elements are normalized at the same
+        time. The next element is only taken from the input when a
+        result has been consumed, so a slow consumer slows down the
+        input instead of filling a queue.
+        Yields (index, result) tuples in input order, where `result`
+        is either the normalized dictionary or the exception which
+        prevented the normalization.
+        Process executors must be created with
+        parallel.process_executor(), and use the handlers of their
+        workers.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        loop = asyncio.get_running_loop()
+        pending = collections.deque()
+        try:
+            index = 0
+            async for raw_metadata in _aiterate(raw_metadata_iterable):
+                if len(pending) >= max_concurrency:
+                    done_index, future = pending.popleft()
+                    yield (done_index, await future)
+                pending.append((index, loop.run_in_executor(
+                    executor,
+                    self._executor_call(executor, 'get_parameters_or_error', raw_metadata, hint))))
+                index += 1
+            while pending:
+                done_index, future = pending.popleft()
+                yield (done_index, await future)
+        finally:
+            for _, future in pending:
+                future.cancel()
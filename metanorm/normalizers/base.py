@@ -1,10 +1,75 @@
 """Base normalizer. Other normalizers should inherit from
 MetadataNormalizer
 """
+import metanorm.utils as utils
+from metanorm.errors import MetadataNormalizationError
+
 
 class MetadataNormalizer():
     """Base class for all metadata normalizers"""
 
+    # Abstract normalizers are never instantiated nor checked by
+    # handlers. This is not inherited: it must be set in the body of
+    # each abstract class, and is set to False in the other subclasses
+    # by __init_subclass__()
+    abstract = True
+
+    # Prefixes of the 'url' attribute of the metadata this normalizer
+    # is able to deal with. Handlers use them to route metadata
+    # without calling every normalizer's check() method.
+    # check() must return False for metadata whose URL does not start
+    # with one of the declared prefixes.
+    url_prefixes = ()
+
+    # Substrings of the 'url' attribute of the metadata this
+    # normalizer is able to deal with. Handlers look for all the
+    # declared substrings in one scan of the URL.
+    # check() must return False for metadata whose URL does not
+    # contain one of them.
+    url_markers = ()
+
+    # Set to False if check() can return True for metadata whose URL
+    # does not match the declared prefixes or markers. Handlers then
+    # check the normalizer even when the URL does not match.
+    url_routing_is_exhaustive = True
+
+    # Keys which must be present in the metadata this normalizer is
+    # able to deal with. Handlers use them to rule out normalizers
+    # without calling their check() method.
+    # check() must return False for metadata which lacks one of them.
+    required_keys = frozenset()
+
+    # Names which callers can give to handlers as routing hints to
+    # designate this normalizer, in addition to its class name
+    routing_tags = ()
+
+    # Paths of the values of the metadata read by check() and
+    # normalize(), as keys separated by dots (for example
+    # 'umm.TemporalExtent'). Used to send only the useful part of the
+    # metadata to worker processes. Empty means the whole metadata is
+    # needed.
+    input_fields = ()
+
+    # Names of the pythesint vocabularies used by this normalizer, which
+    # are loaded when a handler is warmed up
+    vocabularies = ()
+
+    # Normalizers with a higher priority are checked first. Only useful
+    # when several normalizers can deal with the same metadata.
+    check_priority = 0
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.abstract = vars(cls).get('abstract', False)
+
+    @classmethod
+    def routing_gate(cls, raw_metadata):
+        """Cheap test which must pass for any subclass of `cls` to be
+        able to deal with the raw metadata. Handlers only check the
+        subclasses of a class which defines a gate if it returns True.
+        """
+        return True
+
     def check(self, raw_metadata):
         """Returns a boolean indicating whether the normalizer is
         capable of handling the raw metadata.
@@ -15,3 +80,41 @@ class MetadataNormalizer():
     def normalize(self, raw_metadata):
         """Normalizes the raw metadata. Should return a dictionary"""
         raise NotImplementedError
+
+    def warm_up(self):
+        """Do the lookups which don't depend on the metadata, so that
+        their results are cached before the first normalization. Does
+        nothing by default
+        """
+
+    @classmethod
+    def project(cls, raw_metadata):
+        """Returns the part of the raw metadata declared in
+        `input_fields`, or the whole raw metadata if no field is
+        declared
+        """
+        if cls.input_fields:
+            return utils.project_metadata(raw_metadata, cls.input_fields)
+        return raw_metadata
+
+    def normalize_many(self, raw_metadata_list):
+        """Normalizes a list of raw metadata dictionaries which this
+        normalizer is able to deal with. Returns a list containing, in
+        the same order, either the normalized dictionary or the
+        exception which was raised for each element. Exceptions other
+        than MetadataNormalizationError are wrapped in one.
+        Can be overridden to share work between the elements.
+        """
+        results = []
+        for raw_metadata in raw_metadata_list:
+            try:
+                results.append(self.normalize(raw_metadata))
+            except MetadataNormalizationError as error:
+                results.append(error)
+            except Exception as error:  # pylint: disable=broad-except
+                normalization_error = MetadataNormalizationError(
+                    f"{self.__class__.__name__} was unable to normalize the following "
+                    f"metadata: {raw_metadata}")
+                normalization_error.__cause__ = error
+                results.append(normalization_error)
+        return results
@@ -26,6 +26,8 @@ class AMSR2ASIMetadataNormalizer(GeoSPaaSMetadataNormalizer):
         ),
     )
 
+    required_keys = frozenset(('url',))
+
     def check(self, raw_metadata):
         """Check that the dataset's id matches an ASI-AMSR2 file"""
         try:
@@ -34,6 +36,7 @@ class AMSR2ASIMetadataNormalizer(GeoSPaaSMetadataNormalizer):
             return False
         return bool(entry_id) # return True if the entry_id is not empty
 
+    @utils.record_independent
     def get_entry_title(self, raw_metadata):
         return 'ASI sea ice concentration from AMSR2'
 
@@ -44,6 +47,7 @@ class AMSR2ASIMetadataNormalizer(GeoSPaaSMetadataNormalizer):
             raw_metadata['url']
         ).group(1)
 
+    @utils.record_independent
     def get_summary(self, raw_metadata):
         """Get the dataset's summary if it is available in the
         metadata, otherwise use a default
@@ -64,9 +68,11 @@ class AMSR2ASIMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     def get_time_coverage_end(self, raw_metadata):
         return utils.find_time_coverage(self.time_patterns, raw_metadata['url'])[1]
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('GCOM-W1')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('AMSR2')
 
@@ -82,5 +88,6 @@ class AMSR2ASIMetadataNormalizer(GeoSPaaSMetadataNormalizer):
             location = utils.wkt_polygon_from_wgs84_limits('-90', '-40', '180', '-180')
         return location
 
+    @utils.record_independent
     def get_provider(self, raw_metadata):
         return utils.get_gcmd_provider(['U-BREMEN/IUP'])
@@ -12,6 +12,10 @@ class AVISOAltimetryMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     attributes
     """
 
+    url_markers = ('aviso.altimetry.fr',)
+    # AVISO metadata can also be identified by its creator
+    url_routing_is_exhaustive = False
+
     def check(self, raw_metadata):
         return (('aviso.altimetry.fr' in raw_metadata.get('creator_url', '') and
                     raw_metadata.get('creator_email', '') == 'aviso@altimetry.fr')
@@ -83,5 +87,6 @@ class AVISOAltimetryMetadataNormalizer(GeoSPaaSMetadataNormalizer):
             return ''
 
 
+    @utils.record_independent
     def get_provider(self, raw_metadata):
         return utils.get_gcmd_provider(['AVISO'])
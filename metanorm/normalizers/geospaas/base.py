@@ -1,5 +1,7 @@
 """Module containing the base class for GeoSPaaS normalizers"""
+import copy
 import logging
+from collections import OrderedDict
 
 import pythesint as pti
 
@@ -15,6 +17,74 @@ class GeoSPaaSMetadataNormalizer(MetadataNormalizer):
     """Base class for GeoSPaaS normalizers. Defaults are defined here.
     """
 
+    abstract = True
+
+    vocabularies = utils.PYTHESINT_VOCABULARIES
+
+    # Fields of the normalized metadata, each one returned by the
+    # get_<field>() method
+    FIELDS = (
+        'entry_title',
+        'entry_id',
+        'summary',
+        'time_coverage_start',
+        'time_coverage_end',
+        'platform',
+        'instrument',
+        'location_geometry',
+        'provider',
+        'iso_topic_category',
+        'gcmd_location',
+        'dataset_parameters',
+    )
+
+    def __init__(self):
+        # values of the fields whose getter is record-independent
+        self._constant_fields = {}
+
+    def warm_up(self):
+        """Compute the fields whose getter is record-independent. The
+        other getters are not called. Errors are logged
+        """
+        for field in self.FIELDS:
+            if utils.is_record_independent(getattr(self, f"get_{field}")):
+                try:
+                    self._get_field(field, {})
+                except Exception as error:  # pylint: disable=broad-except
+                    logger.warning("%s could not compute the %s field: %s",
+                                   self.__class__.__name__, field, error)
+
+    @classmethod
+    def _copy_containers(cls, value):
+        """Returns a copy of the dictionaries and lists contained in
+        `value`. The other values (strings, numbers, dates, geometries)
+        are immutable and returned as is
+        """
+        if isinstance(value, dict):
+            # dict.copy() would turn subclasses other than OrderedDict
+            # into plain dictionaries
+            value = value.copy() if type(value) in (dict, OrderedDict) else copy.copy(value)
+            for key, item in value.items():
+                if isinstance(item, (dict, list)):
+                    value[key] = cls._copy_containers(item)
+        elif isinstance(value, list):
+            value = [cls._copy_containers(item) for item in value]
+        return value
+
+    def _get_field(self, field, raw_metadata):
+        """Get the value of a field from the raw metadata. The value
+        returned by record-independent getters is computed once, and a
+        copy of its dictionaries and lists is returned
+        """
+        getter = getattr(self, f"get_{field}")
+        if not utils.is_record_independent(getter):
+            return getter(raw_metadata)
+        try:
+            value = self._constant_fields[field]
+        except KeyError:
+            value = self._constant_fields[field] = getter(raw_metadata)
+        return self._copy_containers(value)
+
     def get_entry_title(self, raw_metadata):
         """Get the entry title from the raw metadata"""
         raise NotImplementedError
@@ -23,6 +93,7 @@ class GeoSPaaSMetadataNormalizer(MetadataNormalizer):
         """Get the entry ID from the raw metadata"""
         raise NotImplementedError
 
+    @utils.record_independent
     def get_summary(self, raw_metadata):
         """Get the summary from the raw metadata"""
         return utils.UNKNOWN
@@ -53,11 +124,13 @@ class GeoSPaaSMetadataNormalizer(MetadataNormalizer):
         """Get the provider from the raw metadata"""
         raise NotImplementedError
 
+    @utils.record_independent
     @utils.raises(IndexError)
     def get_iso_topic_category(self, raw_metadata):
         """Get the ISO topic category from the raw metadata"""
         return pti.get_iso19115_topic_category('Oceans')
 
+    @utils.record_independent
     @utils.raises(IndexError)
     def get_gcmd_location(self, raw_metadata):
         """Get the GCMD location from the raw metadata"""
@@ -80,17 +153,4 @@ class GeoSPaaSMetadataNormalizer(MetadataNormalizer):
         return normalized_dataset_parameters
 
     def normalize(self, raw_metadata):
-        return {
-            'entry_title': self.get_entry_title(raw_metadata),
-            'entry_id': self.get_entry_id(raw_metadata),
-            'summary': self.get_summary(raw_metadata),
-            'time_coverage_start': self.get_time_coverage_start(raw_metadata),
-            'time_coverage_end': self.get_time_coverage_end(raw_metadata),
-            'platform': self.get_platform(raw_metadata),
-            'instrument': self.get_instrument(raw_metadata),
-            'location_geometry': self.get_location_geometry(raw_metadata),
-            'provider': self.get_provider(raw_metadata),
-            'iso_topic_category': self.get_iso_topic_category(raw_metadata),
-            'gcmd_location': self.get_gcmd_location(raw_metadata),
-            'dataset_parameters': self.get_dataset_parameters(raw_metadata)
-        }
+        return {field: self._get_field(field, raw_metadata) for field in self.FIELDS}
@@ -12,9 +12,23 @@ from .base import GeoSPaaSMetadataNormalizer
 class CMEMSMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     """Base class for CMEMS normalizers"""
 
+    abstract = True
+    routing_tags = ('cmems',)
     time_patterns = ()
     url_prefix = None
 
+    @classmethod
+    def routing_gate(cls, raw_metadata):
+        """CMEMS products are hosted on cmems-du.eu, except the TOPAZ 5
+        products which are identified by their file name
+        """
+        url = raw_metadata.get('url', '')
+        return 'cmems-du.eu' in url or '-metno-MODEL-topaz5' in url
+
+    @property
+    def url_prefixes(self):
+        return (self.url_prefix,) if self.url_prefix is not None else ()
+
     def check(self, raw_metadata):
         return (self.url_prefix is not None
                 and raw_metadata.get('url', '').startswith(self.url_prefix))
@@ -23,6 +37,7 @@ class CMEMSMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     def get_entry_id(self, raw_metadata):
         return utils.NC_H5_FILENAME_MATCHER.search(raw_metadata['url']).group(1)
 
+    @utils.record_independent
     def get_provider(self, raw_metadata):
         return utils.get_gcmd_provider(['CMEMS'])
 
@@ -49,9 +64,11 @@ class CMEMS008046MetadataNormalizer(CMEMSMetadataNormalizer):
         ),
     )
 
+    @utils.record_independent
     def get_entry_title(self, raw_metadata):
         return 'GLOBAL OCEAN GRIDDED L4 SEA SURFACE HEIGHTS AND DERIVED VARIABLES NRT'
 
+    @utils.record_independent
     def get_summary(self, raw_metadata):
         return utils.dict_to_string({
             utils.SUMMARY_FIELDS['description']:
@@ -61,15 +78,19 @@ class CMEMS008046MetadataNormalizer(CMEMSMetadataNormalizer):
             utils.SUMMARY_FIELDS['product']: 'SEALEVEL_GLO_PHY_L4_NRT_OBSERVATIONS_008_046'
         })
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('Earth Observation satellites')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('altimeters')
 
+    @utils.record_independent
     def get_location_geometry(self, raw_metadata):
         return utils.WORLD_WIDE_COVERAGE_WKT
 
+    @utils.record_independent
     def get_dataset_parameters(self, raw_metadata):
         # based on "http://nrt.cmems-du.eu/motu-web/Motu?action=describeProduct
         #           &service=SEALEVEL_GLO_PHY_L4_NRT_OBSERVATIONS_008_046-TDS"
@@ -101,10 +122,12 @@ class CMEMS015003MetadataNormalizer(CMEMSMetadataNormalizer):
         )
     )
 
+    @utils.record_independent
     def get_entry_title(self, raw_metadata):
         return ('GLOBAL TOTAL SURFACE AND 15M CURRENT FROM ALTIMETRIC '
                 'GEOSTROPHIC CURRENT AND MODELED EKMAN CURRENT PROCESSING')
 
+    @utils.record_independent
     def get_summary(self, raw_metadata):
         return utils.dict_to_string({
             utils.SUMMARY_FIELDS['description']:
@@ -113,15 +136,19 @@ class CMEMS015003MetadataNormalizer(CMEMSMetadataNormalizer):
             utils.SUMMARY_FIELDS['product']: 'MULTIOBS_GLO_PHY_NRT_015_003'
         })
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('Earth Observation satellites')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('altimeters')
 
+    @utils.record_independent
     def get_location_geometry(self, raw_metadata):
         return utils.WORLD_WIDE_COVERAGE_WKT
 
+    @utils.record_independent
     def get_dataset_parameters(self, raw_metadata):
         # based on "http://nrt.cmems-du.eu/motu-web/Motu?
         #           action=describeProduct&service=MULTIOBS_GLO_PHY_NRT_015_003-TDS"
@@ -160,9 +187,11 @@ class CMEMS001024MetadataNormalizer(CMEMSMetadataNormalizer):
         )
     )
 
+    @utils.record_independent
     def get_entry_title(self, raw_metadata):
         return 'GLOBAL OCEAN 1_12 PHYSICS ANALYSIS AND FORECAST UPDATED DAILY'
 
+    @utils.record_independent
     def get_summary(self, raw_metadata):
         return utils.dict_to_string({
             utils.SUMMARY_FIELDS['description']:
@@ -172,15 +201,19 @@ class CMEMS001024MetadataNormalizer(CMEMSMetadataNormalizer):
             utils.SUMMARY_FIELDS['product']: 'GLOBAL_ANALYSIS_FORECAST_PHY_001_024'
         })
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('OPERATIONAL MODELS')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('Computer')
 
+    @utils.record_independent
     def get_location_geometry(self, raw_metadata):
         return utils.WORLD_WIDE_COVERAGE_WKT
 
+    @utils.record_independent
     def get_dataset_parameters(self, raw_metadata):
         # based on "http://nrt.cmems-du.eu/motu-web/Motu?
         #           action=describeProduct&service=GLOBAL_ANALYSIS_FORECAST_PHY_001_024-TDS"
@@ -217,9 +250,11 @@ class CMEMS006013MetadataNormalizer(CMEMSMetadataNormalizer):
         )
     )
 
+    @utils.record_independent
     def get_entry_title(self, raw_metadata):
         return 'Mediterranean Forecasting System (hydrodynamic-wave model)'
 
+    @utils.record_independent
     def get_summary(self, raw_metadata):
         return utils.dict_to_string({
             utils.SUMMARY_FIELDS['description']:
@@ -230,12 +265,15 @@ class CMEMS006013MetadataNormalizer(CMEMSMetadataNormalizer):
             utils.SUMMARY_FIELDS['product']: 'MEDSEA_ANALYSISFORECAST_PHY_006_013'
         })
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('OPERATIONAL MODELS')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('Computer')
 
+    @utils.record_independent
     def get_location_geometry(self, raw_metadata):
         return 'POLYGON((-17.29 45.98, -17.29 30.18, 36.30 30.18, 36.30 45.98, -17.29 45.98))'
 
@@ -293,9 +331,11 @@ class CMEMS005001MetadataNormalizer(CMEMSMetadataNormalizer):
         )
     )
 
+    @utils.record_independent
     def get_entry_title(self, raw_metadata):
         return 'Atlantic-Iberian Biscay Irish-Ocean Physics Analysis and Forecast'
 
+    @utils.record_independent
     def get_summary(self, raw_metadata):
         return utils.dict_to_string({
             utils.SUMMARY_FIELDS['description']:
@@ -307,12 +347,15 @@ class CMEMS005001MetadataNormalizer(CMEMSMetadataNormalizer):
             utils.SUMMARY_FIELDS['product']: 'IBI_ANALYSISFORECAST_PHY_005_001'
         })
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('OPERATIONAL MODELS')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('Computer')
 
+    @utils.record_independent
     def get_location_geometry(self, raw_metadata):
         return 'POLYGON((-19 56, 5 56, 5 26, -19 26, -19 56))'
 
@@ -389,9 +432,11 @@ class CMEMS002003MetadataNormalizer(CMEMSMetadataNormalizer):
         ),
     )
 
+    @utils.record_independent
     def get_entry_title(self, raw_metadata):
         return 'Arctic Ocean Physics Reanalysis'
 
+    @utils.record_independent
     def get_summary(self, raw_metadata):
         return utils.dict_to_string({
             utils.SUMMARY_FIELDS['description']:
@@ -405,15 +450,19 @@ class CMEMS002003MetadataNormalizer(CMEMSMetadataNormalizer):
             utils.SUMMARY_FIELDS['product']: 'ARCTIC_MULTIYEAR_PHY_002_003'
         })
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('OPERATIONAL MODELS')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('Computer')
 
+    @utils.record_independent
     def get_location_geometry(self, raw_metadata):
         return 'POLYGON((-180 53, -180 90, 180 90, 180 53, -180 53))'
 
+    @utils.record_independent
     def get_dataset_parameters(self, raw_metadata):
         return utils.create_parameter_list([
             'latitude',
@@ -447,9 +496,11 @@ class CMEMS002001aMetadataNormalizer(CMEMSMetadataNormalizer):
         ),
     )
 
+    @utils.record_independent
     def get_entry_title(self, raw_metadata):
         return 'Arctic Ocean Physics Analysis and Forecast'
 
+    @utils.record_independent
     def get_summary(self, raw_metadata):
         return utils.dict_to_string({
             utils.SUMMARY_FIELDS['description']:
@@ -463,12 +514,15 @@ class CMEMS002001aMetadataNormalizer(CMEMSMetadataNormalizer):
             utils.SUMMARY_FIELDS['product']: 'ARCTIC_ANALYSIS_FORECAST_PHYS_002_001_a'
         })
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('OPERATIONAL MODELS')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('Computer')
 
+    @utils.record_independent
     def get_location_geometry(self, raw_metadata):
         return 'POLYGON((-180 62, -180 90, 180 90, 180 62, -180 62))'
 
@@ -532,15 +586,20 @@ class CMEMS002001MetadataNormalizer(CMEMSMetadataNormalizer):
         ),
     )
 
+    url_markers = ('-metno-MODEL-topaz5-ARC-',)
+
     def check(self, raw_metadata):
         return '-metno-MODEL-topaz5-ARC-' in raw_metadata.get('url', '')
 
+    @utils.record_independent
     def get_provider(self, raw_metadata):
         return utils.get_gcmd_provider(['NO/MET'])
 
+    @utils.record_independent
     def get_entry_title(self, raw_metadata):
         return 'Arctic Ocean Physics Analysis and Forecast, 6.25 km'
 
+    @utils.record_independent
     def get_summary(self, raw_metadata):
         return utils.dict_to_string({
             utils.SUMMARY_FIELDS['description']: 'TOPAZ 5 physical model',
@@ -548,12 +607,15 @@ class CMEMS002001MetadataNormalizer(CMEMSMetadataNormalizer):
             utils.SUMMARY_FIELDS['product']: 'ARCTIC_ANALYSISFORECAST_PHY_002_001'
         })
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('OPERATIONAL MODELS')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('Computer')
 
+    @utils.record_independent
     def get_location_geometry(self, raw_metadata):
         return 'POLYGON((-180 50, -180 90, 180 90, 180 50, -180 50))'
 
@@ -621,6 +683,8 @@ class CMEMS002004MetadataNormalizer(CMEMSMetadataNormalizer):
         ),
     )
 
+    url_markers = ('-metno-MODEL-topaz5_ecosmo-ARC-',)
+
     def check(self, raw_metadata):
         return '-metno-MODEL-topaz5_ecosmo-ARC-' in raw_metadata.get('url', '')
 
@@ -632,9 +696,11 @@ class CMEMS002004MetadataNormalizer(CMEMSMetadataNormalizer):
         else:
             return None
 
+    @utils.record_independent
     def get_entry_title(self, raw_metadata):
         return 'Arctic Ocean Biogeochemistry Analysis and Forecast, 6.25 km'
 
+    @utils.record_independent
     def get_summary(self, raw_metadata):
         return utils.dict_to_string({
             utils.SUMMARY_FIELDS['description']: 'TOPAZ 5 biochemistry model',
@@ -642,12 +708,15 @@ class CMEMS002004MetadataNormalizer(CMEMSMetadataNormalizer):
             utils.SUMMARY_FIELDS['product']: 'ARCTIC_ANALYSISFORECAST_BGC_002_004'
         })
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('OPERATIONAL MODELS')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('Computer')
 
+    @utils.record_independent
     def get_location_geometry(self, raw_metadata):
         return 'POLYGON((-180 50, -180 90, 180 90, 180 50, -180 50))'
 
@@ -714,9 +783,11 @@ class CMEMS001027MetadataNormalizer(CMEMSMetadataNormalizer):
         ),
     )
 
+    @utils.record_independent
     def get_entry_title(self, raw_metadata):
         return 'Global Ocean Waves Analysis and Forecast'
 
+    @utils.record_independent
     def get_summary(self, raw_metadata):
         return utils.dict_to_string({
             utils.SUMMARY_FIELDS['description']:
@@ -730,15 +801,19 @@ class CMEMS001027MetadataNormalizer(CMEMSMetadataNormalizer):
             utils.SUMMARY_FIELDS['product']: 'GLOBAL_ANALYSISFORECAST_WAV_001_027'
         })
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('OPERATIONAL MODELS')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('Computer')
 
+    @utils.record_independent
     def get_location_geometry(self, raw_metadata):
         return utils.WORLD_WIDE_COVERAGE_WKT
 
+    @utils.record_independent
     def get_dataset_parameters(self, raw_metadata):
         return utils.create_parameter_list((
             'sea_surface_wave_significant_height',
@@ -779,9 +854,11 @@ class CMEMS001028MetadataNormalizer(CMEMSMetadataNormalizer):
         ),
     )
 
+    @utils.record_independent
     def get_entry_title(self, raw_metadata):
         return 'Global Ocean Biogeochemistry Analysis and Forecast'
 
+    @utils.record_independent
     def get_summary(self, raw_metadata):
         return utils.dict_to_string({
             utils.SUMMARY_FIELDS['description']:
@@ -793,15 +870,19 @@ class CMEMS001028MetadataNormalizer(CMEMSMetadataNormalizer):
             utils.SUMMARY_FIELDS['product']: 'GLOBAL_ANALYSIS_FORECAST_BIO_001_028'
         })
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('OPERATIONAL MODELS')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('Computer')
 
+    @utils.record_independent
     def get_location_geometry(self, raw_metadata):
         return utils.WORLD_WIDE_COVERAGE_WKT
 
+    @utils.record_independent
     def get_dataset_parameters(self, raw_metadata):
         return utils.create_parameter_list((
             'sea_water_alkalinity_expressed_as_mole_equivalent',
@@ -15,6 +15,8 @@ class CMEMSInSituTACMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     CMEMS In Situ TAC attributes
     """
 
+    required_keys = frozenset(('id',))
+
     def check(self, raw_metadata):
         """Check that the dataset's id matches CMEMS in situ TAC data"""
         identifier = raw_metadata.get('id', '')
@@ -79,9 +81,11 @@ class CMEMSInSituTACMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     def get_time_coverage_end(self, raw_metadata):
         return dateutil.parser.parse(raw_metadata['time_coverage_end'])
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('In Situ Ocean-based Platforms')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('In Situ/Laboratory Instruments')
 
@@ -89,5 +93,6 @@ class CMEMSInSituTACMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     def get_location_geometry(self, raw_metadata):
         return raw_metadata.get('geometry', '')
 
+    @utils.record_independent
     def get_provider(self, raw_metadata):
         return utils.get_gcmd_provider(['cmems'])
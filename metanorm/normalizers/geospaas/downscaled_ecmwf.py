@@ -17,6 +17,8 @@ class DownscaledECMWFMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     ECMWF seasonal forecast netcdf file
     """
 
+    required_keys = frozenset(('url',))
+
     def check(self, raw_metadata):
         """Check that the dataset's id matches the pattern"""
         try:
@@ -25,6 +27,7 @@ class DownscaledECMWFMetadataNormalizer(GeoSPaaSMetadataNormalizer):
             return False
         return bool(entry_id) # return True if the entry_id is not empty
 
+    @utils.record_independent
     def get_entry_title(self, raw_metadata):
         return 'Downscaled ECMWF seasonal forecast'
 
@@ -35,6 +38,7 @@ class DownscaledECMWFMetadataNormalizer(GeoSPaaSMetadataNormalizer):
             raw_metadata['url']
         ).group(1)
 
+    @utils.record_independent
     def get_summary(self, raw_metadata):
         """Get the dataset's summary if it is available in the
         metadata, otherwise use a default
@@ -51,14 +55,18 @@ class DownscaledECMWFMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     def get_time_coverage_end(self, raw_metadata):
         return self.get_time_coverage_start(raw_metadata) + relativedelta(months=6)
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('OPERATIONAL MODELS')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('Computer')
 
+    @utils.record_independent
     def get_location_geometry(self, raw_metadata):
         return ''
 
+    @utils.record_independent
     def get_provider(self, raw_metadata):
         return utils.get_gcmd_provider(['NERSC'])
@@ -17,8 +17,21 @@ class EarthdataCMRMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     Earthdata CMR attributes
     """
 
+    required_keys = frozenset(('umm', 'meta'))
+    routing_tags = ('earthdata_cmr',)
+    input_fields = (
+        'umm.CollectionReference',
+        'umm.DataGranule',
+        'umm.GranuleUR',
+        'umm.Platforms',
+        'umm.SpatialExtent',
+        'umm.TemporalExtent',
+        'meta.provider-id',
+        'raw_dataset_parameters',
+    )
+
     def check(self, raw_metadata):
-        return set(('umm', 'meta')).issubset(raw_metadata.keys())
+        return self.required_keys.issubset(raw_metadata.keys())
 
     def get_entry_title(self, raw_metadata):
         return self.get_entry_id(raw_metadata)
@@ -12,11 +12,13 @@ class GPortalGCOMWAMSR2MetadataNormalizer(GeoSPaaSMetadataNormalizer):
     dataset
     """
 
+    url_prefixes = ('ftp://ftp.gportal.jaxa.jp/standard/GCOM-W/GCOM-W.AMSR2/',)
+
     def check(self, raw_metadata):
         """Checks that the URL starts with the right prefix"""
-        return raw_metadata.get('url', '').startswith(
-            'ftp://ftp.gportal.jaxa.jp/standard/GCOM-W/GCOM-W.AMSR2/')
+        return raw_metadata.get('url', '').startswith(self.url_prefixes)
 
+    @utils.record_independent
     def get_entry_title(self, raw_metadata):
         return 'GCOM-W AMSR2'
 
@@ -61,14 +63,18 @@ class GPortalGCOMWAMSR2MetadataNormalizer(GeoSPaaSMetadataNormalizer):
     def get_time_coverage_end(self, raw_metadata):
         return utils.find_time_coverage(self.time_patterns, raw_metadata['url'])[1]
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('GCOM-W1')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('AMSR2')
 
+    @utils.record_independent
     def get_location_geometry(self, raw_metadata):
         return utils.WORLD_WIDE_COVERAGE_WKT
 
+    @utils.record_independent
     def get_provider(self, raw_metadata):
         return utils.get_gcmd_provider(['JP/JAXA/EOC'])
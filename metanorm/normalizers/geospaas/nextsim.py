@@ -16,6 +16,8 @@ class NextsimMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     """Generate the properties of a NextSIM GeoSPaaS Dataset
     """
 
+    required_keys = frozenset(('url',))
+
     def check(self, raw_metadata):
         """Check that the dataset's id matches a NextSIM file"""
         try:
@@ -35,6 +37,7 @@ class NextsimMetadataNormalizer(GeoSPaaSMetadataNormalizer):
             raw_metadata['url']
         ).group(1)
 
+    @utils.record_independent
     def get_summary(self, raw_metadata):
         """Get the dataset's summary if it is available in the
         metadata, otherwise use a default
@@ -59,14 +62,18 @@ class NextsimMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     def get_time_coverage_end(self, raw_metadata):
         return self.get_time_coverage_start(raw_metadata) + timedelta(days=1)
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('OPERATIONAL MODELS')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('Computer')
 
+    @utils.record_independent
     def get_location_geometry(self, raw_metadata):
         return utils.wkt_polygon_from_wgs84_limits('90', '62', '180', '-180')
 
+    @utils.record_independent
     def get_provider(self, raw_metadata):
         return utils.get_gcmd_provider(['NERSC'])
@@ -14,11 +14,13 @@ class NOAAHYCOMMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     """
 
     url_prefix = 'ftp://ftp.opc.ncep.noaa.gov/grids/operational/GLOBALHYCOM/Navy'
+    url_prefixes = (url_prefix,)
 
     def check(self, raw_metadata):
         """Checks that the URL starts with the right prefix"""
-        return raw_metadata.get('url', '').startswith(self.url_prefix)
+        return raw_metadata.get('url', '').startswith(self.url_prefixes)
 
+    @utils.record_independent
     def get_entry_title(self, raw_metadata):
         return 'Global Hybrid Coordinate Ocean Model (HYCOM)'
 
@@ -26,6 +28,7 @@ class NOAAHYCOMMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     def get_entry_id(self, raw_metadata):
         return utils.NC_H5_FILENAME_MATCHER.search(raw_metadata['url']).group(1)
 
+    @utils.record_independent
     def get_summary(self, raw_metadata):
         return utils.dict_to_string({
             utils.SUMMARY_FIELDS['description']:
@@ -58,9 +61,11 @@ class NOAAHYCOMMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     def get_time_coverage_end(self, raw_metadata):
         return utils.find_time_coverage(self.time_patterns, raw_metadata['url'])[1]
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('OPERATIONAL MODELS')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('Computer')
 
@@ -82,9 +87,11 @@ class NOAAHYCOMMetadataNormalizer(GeoSPaaSMetadataNormalizer):
                 return location
         raise MetadataNormalizationError(f"Could not find a location gemetry for {raw_metadata}")
 
+    @utils.record_independent
     def get_provider(self, raw_metadata):
         return utils.get_gcmd_provider(['DOC/NOAA/NWS/NCEP'])
 
+    @utils.record_independent
     def get_dataset_parameters(self, raw_metadata):
         return utils.create_parameter_list((
             'sea_water_salinity',
@@ -12,11 +12,13 @@ class NOAARTOFSMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     dataset
     """
 
+    url_prefixes = ('ftp://ftpprd.ncep.noaa.gov/pub/data/nccf/com/rtofs/prod',)
+
     def check(self, raw_metadata):
         """Checks that the URL starts with the right prefix"""
-        return raw_metadata.get('url', '').startswith(
-            'ftp://ftpprd.ncep.noaa.gov/pub/data/nccf/com/rtofs/prod')
+        return raw_metadata.get('url', '').startswith(self.url_prefixes)
 
+    @utils.record_independent
     def get_entry_title(self, raw_metadata):
         return 'Global operational Real-Time Ocean Forecast System'
 
@@ -24,6 +26,7 @@ class NOAARTOFSMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     def get_entry_id(self, raw_metadata):
         return re.search(r'(\d{8}/[^/]+)\.(nc|h5)(\.gz)?$', raw_metadata['url']).group(1)
 
+    @utils.record_independent
     def get_summary(self, raw_metadata):
         return utils.dict_to_string({
             utils.SUMMARY_FIELDS['description']:
@@ -74,9 +77,11 @@ class NOAARTOFSMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     def get_time_coverage_end(self, raw_metadata):
         return utils.find_time_coverage(self.time_patterns, raw_metadata['url'])[1]
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('OPERATIONAL MODELS')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('Computer')
 
@@ -106,6 +111,7 @@ class NOAARTOFSMetadataNormalizer(GeoSPaaSMetadataNormalizer):
         else:
             return utils.WORLD_WIDE_COVERAGE_WKT
 
+    @utils.record_independent
     def get_provider(self, raw_metadata):
         return utils.get_gcmd_provider(['DOC/NOAA/NWS/NCEP'])
 
@@ -12,9 +12,11 @@ from .base import GeoSPaaSMetadataNormalizer
 class OSISAFMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     """ Normalizer for the attributes of datasets provided by OSISAF """
 
-    def __init__(self):
-        super().__init__()
-        self.filename_matcher = re.compile(r"([^/]+)\.nc(\.dods)?$")
+    required_keys = frozenset(('project_name',))
+
+    # compiled once for all instances. Compiled patterns are immutable,
+    # so they can be shared between threads
+    filename_matcher = re.compile(r"([^/]+)\.nc(\.dods)?$")
 
     def check(self, raw_metadata):
         return raw_metadata.get('project_name', '') == 'EUMETSAT OSI SAF'
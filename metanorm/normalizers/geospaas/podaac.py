@@ -13,8 +13,10 @@ class PODAACMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     attributes
     """
 
+    url_prefixes = ('https://opendap.jpl.nasa.gov/opendap/',)
+
     def check(self, raw_metadata):
-        return raw_metadata.get('url', '').startswith('https://opendap.jpl.nasa.gov/opendap/')
+        return raw_metadata.get('url', '').startswith(self.url_prefixes)
 
     @utils.raises(KeyError)
     def get_entry_title(self, raw_metadata):
@@ -95,6 +97,7 @@ class PODAACMetadataNormalizer(GeoSPaaSMetadataNormalizer):
 
         return srid + result_wkt
 
+    @utils.record_independent
     def get_provider(self, raw_metadata):
         """Get the provider from the raw metadata"""
         return utils.get_gcmd_provider(['NASA/JPL/PODAAC'])
@@ -14,9 +14,10 @@ class Radarsat2CSVMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     facility
     """
 
+    required_keys = frozenset(('Satellite', 'Date', 'Order Key', 'Footprint'))
+
     def check(self, raw_metadata):
-        keys = set(['Satellite', 'Date', 'Order Key', 'Footprint'])
-        return (keys.issubset(set(raw_metadata.keys()))
+        return (self.required_keys.issubset(raw_metadata.keys())
             and raw_metadata['Satellite'] == 'RADARSAT-2')
 
     @utils.raises(KeyError)
@@ -35,9 +36,11 @@ class Radarsat2CSVMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     def get_time_coverage_end(self, raw_metadata):
         return self.get_time_coverage_start(raw_metadata) + timedelta(minutes=5)
 
+    @utils.record_independent
     def get_platform(self, raw_metadata):
         return utils.get_gcmd_platform('RADARSAT-2')
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('C-SAR')
 
@@ -49,8 +52,10 @@ class Radarsat2CSVMetadataNormalizer(GeoSPaaSMetadataNormalizer):
                 f"{footprint[4]} {footprint[5]}, {footprint[6]} {footprint[7]}, "
                 f"{footprint[8]} {footprint[9]}))")
 
+    @utils.record_independent
     def get_provider(self, raw_metadata):
         return utils.get_gcmd_provider(['CSA'])
 
+    @utils.record_independent
     def get_dataset_parameters(self, raw_metadata):
         return utils.create_parameter_list('surface_backwards_scattering_coefficient_of_radar_wave')
@@ -16,6 +16,11 @@ class RestoAPIMetadataNormalizer(GeoSPaaSMetadataNormalizer):
     attributes
     """
 
+    required_keys = frozenset((
+        'collection', 'status', 'license', 'productIdentifier', 'parentIdentifier', 'title',
+        'description', 'productType', 'sensorMode', 'resolution', 'services', 'links'))
+    routing_tags = ('resto',)
+
     @utils.raises(KeyError)
     def check(self, raw_metadata):
         """Looks for a URL in `raw_metadata['url']`
@@ -23,10 +28,7 @@ class RestoAPIMetadataNormalizer(GeoSPaaSMetadataNormalizer):
         `raw_metadata['services']['download']['url']`
         (original location)
         """
-        attributes = set((
-            'collection', 'status', 'license', 'productIdentifier', 'parentIdentifier', 'title',
-            'description', 'productType', 'sensorMode', 'resolution', 'services', 'links'))
-        return attributes.issubset(set(raw_metadata.keys()))
+        return self.required_keys.issubset(raw_metadata.keys())
 
     @utils.raises(KeyError)
     def get_entry_title(self, raw_metadata):
@@ -32,13 +32,22 @@ class ScihubODataMetadataNormalizer(GeoSPaaSMetadataNormalizer):
         r'(?P<product_id>[A-Z0-9]{4}|_{4})',
     ]))
 
+    url_prefixes = (
+        'https://apihub.copernicus.eu/apihub/odata/v1',
+        'https://scihub.copernicus.eu/apihub/odata/v1',
+        'https://apihub.copernicus.eu/dhus/odata/v1',
+        'https://scihub.copernicus.eu/dhus/odata/v1',
+        'https://colhub.met.no/odata/v1',
+    )
+    routing_tags = ('scihub_odata',)
+    input_fields = (
+        'url', 'Identifier', 'Date', 'Instrument name', 'Mode', 'Satellite', 'Size',
+        'Timeliness Category', 'Processing level', 'Product level', 'Sensing start',
+        'Sensing stop', 'Satellite name', 'Satellite number', 'Instrument', 'JTS footprint',
+    )
+
     def check(self, raw_metadata):
-        url = raw_metadata.get('url', '')
-        return (url.startswith('https://apihub.copernicus.eu/apihub/odata/v1')
-                or url.startswith('https://scihub.copernicus.eu/apihub/odata/v1')
-                or url.startswith('https://apihub.copernicus.eu/dhus/odata/v1')
-                or url.startswith('https://scihub.copernicus.eu/dhus/odata/v1')
-                or url.startswith('https://colhub.met.no/odata/v1'))
+        return raw_metadata.get('url', '').startswith(self.url_prefixes)
 
     @utils.raises(KeyError)
     def get_entry_title(self, raw_metadata):
@@ -103,6 +112,7 @@ class ScihubODataMetadataNormalizer(GeoSPaaSMetadataNormalizer):
         """Returns a WKT string corresponding to the location of the dataset"""
         return raw_metadata['JTS footprint']
 
+    @utils.record_independent
     def get_provider(self, raw_metadata):
         """Returns a GCMD-like provider data structure"""
         return utils.get_gcmd_provider(['ESA/EO'])
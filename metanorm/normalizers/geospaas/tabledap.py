@@ -24,6 +24,8 @@ class TableDAPMetadataNormalizer(GeoSPaaSMetadataNormalizer):
                 return row[4]
         raise MetadataNormalizationError(f'Could not find product attribute {attribute}')
 
+    url_markers = ('tabledap',)
+
     @utils.raises(KeyError)
     def check(self, raw_metadata):
         return 'tabledap' in raw_metadata.get('url', '')
@@ -62,6 +64,7 @@ class TableDAPMetadataNormalizer(GeoSPaaSMetadataNormalizer):
               ('Long_Name', '')])
         return platform
 
+    @utils.record_independent
     def get_instrument(self, raw_metadata):
         return utils.get_gcmd_instrument('Unknown')
 
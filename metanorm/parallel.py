@@ -0,0 +1,771 @@
+"""Functions which normalize metadata using several processes or
+threads
+"""
+import collections
+import concurrent.futures
+import itertools
+import json
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import pickle
+import queue
+import struct
+import time
+
+import metanorm.errors as errors
+import metanorm.handlers as handlers
+import metanorm.utils as utils
+
+logger = logging.getLogger(__name__)
+
+# handler used by the current worker process
+_worker_handler = None
+# time budget of each record in the current worker process
+_worker_time_budget = None
+
+# modules imported by the forkserver process before it forks the
+# workers, when pre-warming is enabled
+PRELOAD_MODULES = (
+    'metanorm.handlers',
+    'metanorm.normalizers',
+    'pythesint',
+    'shapely.geometry',
+    'shapely.wkt',
+    'dateutil.parser',
+)
+
+
+def prewarm(base_class=None, handler_kwargs=None):
+    """Do the initialization work in the current process, so that the
+    worker processes forked from it share the resulting memory pages
+    copy-on-write instead of doing it again: import the normalizer
+    modules (which compiles their regular expressions), build a handler
+    and its routing structures, warm it up and read the other pythesint
+    vocabularies.
+    Returns the handler.
+    """
+    start = time.perf_counter()
+    # pylint: disable=import-outside-toplevel,unused-import
+    import metanorm.normalizers
+    imported = time.perf_counter()
+    handler = handlers.MetadataHandler(base_class, **(handler_kwargs or {}))
+    built = time.perf_counter()
+    timings = handler.warm_up()
+    for vocabulary_name in utils.PYTHESINT_VOCABULARIES:
+        if vocabulary_name not in timings['vocabularies']:
+            try:
+                utils.load_vocabulary(vocabulary_name)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning("Could not load the %s vocabulary: %s", vocabulary_name, error)
+    logger.debug(
+        "Pre-warmed in %.3fs: imports %.3fs, handler %.3fs, vocabularies and lookups %.3fs",
+        time.perf_counter() - start, imported - start, built - imported,
+        time.perf_counter() - built)
+    return handler
+
+
+def _init_worker(base_class, handler_kwargs, handler=None, time_budget=None):
+    """Pool initializer: build the handler used by the worker once, or
+    use the one inherited from the parent process
+    """
+    global _worker_handler, _worker_time_budget  # pylint: disable=global-statement
+    if handler is None:
+        handler = handlers.MetadataHandler(base_class, **handler_kwargs)
+    _worker_handler = handler
+    _worker_time_budget = time_budget
+
+
+def _normalize_in_worker(task):
+    """Normalize one (index, raw_metadata, hint) task in a worker
+    process. Returns an (index, result) tuple
+    """
+    index, raw_metadata, hint = task
+    return (index, _worker_handler.get_parameters_or_error(
+        raw_metadata, hint=hint, time_budget=_worker_time_budget))
+
+
+def _call_worker_handler(method_name, raw_metadata, hint):
+    """Call a method of the handler of the current worker process"""
+    return getattr(_worker_handler, method_name)(raw_metadata, hint=hint)
+
+
+class _HandlerProcessPoolExecutor(concurrent.futures.ProcessPoolExecutor):
+    """Process pool executor whose workers each build a handler once,
+    used by the asynchronous methods of the handlers
+    """
+
+    def __init__(self, workers, base_class, handler_kwargs, mp_context):
+        super().__init__(
+            workers, mp_context=multiprocessing.get_context(mp_context),
+            initializer=_init_worker, initargs=(base_class, handler_kwargs or {}))
+        self.call_worker_handler = _call_worker_handler
+
+
+def process_executor(workers=None, base_class=None, handler_kwargs=None, mp_context=None):
+    """Returns a process pool executor which can be given to
+    MetadataHandler.aget_parameters() and anormalize_stream(). Each of
+    its `workers` processes builds a handler from `base_class` and
+    `handler_kwargs` when it starts, so that only the metadata is sent
+    to the workers, instead of the whole handler for each element.
+    `mp_context` is the name of the multiprocessing start method.
+    """
+    return _HandlerProcessPoolExecutor(workers, base_class, handler_kwargs, mp_context)
+
+
+# time given to a worker after its time budget before it is killed,
+# for the budget to interrupt the normalizer and report the field
+WATCHDOG_GRACE = 1.
+
+
+def _kill_timeout(time_budget, hint=None):
+    """Returns the NormalizationTimeout reported for a record whose
+    worker was killed. The normalizer is only known if the record was
+    routed in the current process
+    """
+    normalizer_name = hint.__name__ if isinstance(hint, type) else None
+    return errors.NormalizationTimeout(
+        f"The normalization exceeded its time budget of {time_budget}s, "
+        f"the worker process was killed (normalizer: {normalizer_name}, field: None)",
+        normalizer=normalizer_name, field=None)
+
+
+def _stop_process(process, timeout):
+    """Wait for `process` to stop for `timeout` seconds, then kill it"""
+    process.join(timeout)
+    if process.is_alive():
+        process.kill()
+        process.join()
+
+
+def _watchdog_worker(connection, base_class, handler_kwargs, handler, time_budget):
+    """Worker process of _WatchdogPool. Receives chunks of tasks and
+    sends the result of each task as soon as it is available
+    """
+    _init_worker(base_class, handler_kwargs, handler, time_budget)
+    for tasks in iter(connection.recv, None):
+        for task in tasks:
+            index, result = _normalize_in_worker(task)
+            try:
+                connection.send((index, result))
+            except Exception as error:  # pylint: disable=broad-except
+                connection.send((index, errors.MetadataNormalizationError(
+                    f"Could not send the result of element {index}: {error!r}")))
+
+
+class _WatchdogPool():
+    """Pool of worker processes which kills and replaces the workers
+    which exceed the time budget of a record by more than
+    WATCHDOG_GRACE seconds, for example in an operation which can't be
+    interrupted by a signal. The record gets a NormalizationTimeout and
+    the other records of its chunk are sent to another worker.
+    """
+
+    def __init__(self, context, workers, initargs, time_budget):
+        self.context = context
+        self.workers = workers or os.cpu_count() or 1
+        self.initargs = initargs
+        self.time_budget = time_budget
+        # the following lists are indexed by worker
+        self.processes = [None] * self.workers
+        self.connections = [None] * self.workers
+        # tasks sent to each worker whose result was not received yet
+        self.tasks = [collections.deque() for _ in range(self.workers)]
+        # time before which each worker must send its next result
+        self.deadlines = [None] * self.workers
+
+    def _start_worker(self, worker_id):
+        parent_connection, child_connection = self.context.Pipe()
+        process = self.context.Process(target=_watchdog_worker,
+                                       args=(child_connection, *self.initargs), daemon=True)
+        process.start()
+        child_connection.close()
+        self.processes[worker_id] = process
+        self.connections[worker_id] = parent_connection
+        self.tasks[worker_id].clear()
+        self.deadlines[worker_id] = None
+
+    def _replace_worker(self, worker_id):
+        """Kill a worker and start another one. Returns the tasks which
+        were sent to it and did not get a result
+        """
+        process = self.processes[worker_id]
+        process.kill()
+        process.join()
+        self.connections[worker_id].close()
+        tasks = list(self.tasks[worker_id])
+        self._start_worker(worker_id)
+        return tasks
+
+    def _send(self, worker_id, tasks):
+        self.connections[worker_id].send(tasks)
+        self.tasks[worker_id].extend(tasks)
+        self.deadlines[worker_id] = time.monotonic() + self.time_budget + WATCHDOG_GRACE
+
+    def run(self, tasks, chunksize):
+        """Generator which normalizes the (index, raw_metadata, hint)
+        tasks and yields (index, result) tuples as soon as they are
+        available
+        """
+        tasks = iter(tasks)
+        # tasks of killed workers, which are sent before the others
+        retries = collections.deque()
+        exhausted = False
+        for worker_id in range(self.workers):
+            self._start_worker(worker_id)
+        try:
+            while True:
+                for worker_id in range(self.workers):
+                    if self.tasks[worker_id]:
+                        continue
+                    if retries:
+                        chunk = [retries.popleft() for _ in range(min(chunksize, len(retries)))]
+                    elif not exhausted:
+                        chunk = list(itertools.islice(tasks, chunksize))
+                        exhausted = len(chunk) < chunksize
+                    else:
+                        chunk = None
+                    if chunk:
+                        self._send(worker_id, chunk)
+                busy = [worker_id for worker_id in range(self.workers) if self.tasks[worker_id]]
+                if not busy:
+                    return
+                timeout = max(0., min(self.deadlines[worker_id] for worker_id in busy)
+                              - time.monotonic())
+                ready = multiprocessing.connection.wait(
+                    [self.connections[worker_id] for worker_id in busy], timeout)
+                for worker_id in busy:
+                    if self.connections[worker_id] not in ready:
+                        continue
+                    try:
+                        index, result = self.connections[worker_id].recv()
+                    except EOFError:
+                        raise RuntimeError("A worker process died unexpectedly") from None
+                    self.tasks[worker_id].popleft()
+                    self.deadlines[worker_id] = (
+                        time.monotonic() + self.time_budget + WATCHDOG_GRACE)
+                    yield (index, result)
+                now = time.monotonic()
+                for worker_id in busy:
+                    if self.tasks[worker_id] and self.deadlines[worker_id] <= now:
+                        (index, _, hint), *remaining = self._replace_worker(worker_id)
+                        logger.warning("Killed a worker which exceeded the time budget of "
+                                       "element %d", index)
+                        retries.extendleft(reversed(remaining))
+                        yield (index, _kill_timeout(self.time_budget, hint))
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Stop the workers, killing the ones which don't stop within
+        WATCHDOG_GRACE seconds
+        """
+        for worker_id, process in enumerate(self.processes):
+            if process is None:
+                continue
+            try:
+                self.connections[worker_id].send(None)
+            except OSError:
+                pass
+            _stop_process(process, WATCHDOG_GRACE)
+            self.connections[worker_id].close()
+            self.processes[worker_id] = None
+
+
+def _in_order(results):
+    """Generator which yields the (index, result) tuples of `results`
+    in index order
+    """
+    buffered = {}
+    next_index = 0
+    for index, result in results:
+        buffered[index] = result
+        while next_index in buffered:
+            yield (next_index, buffered.pop(next_index))
+            next_index += 1
+
+
+def _projected_tasks(raw_metadata_iterable, router, hint):
+    """Generator which routes the elements of `raw_metadata_iterable`
+    using the `router` handler and yields (index, raw_metadata, hint)
+    tasks in which the metadata is reduced to the input fields of the
+    normalizer it was routed to, and the hint designates that
+    normalizer. Elements which could not be routed are left whole.
+    """
+    for index, raw_metadata in enumerate(raw_metadata_iterable):
+        normalizer_class = router.route(raw_metadata, hint=hint)
+        if normalizer_class is None:
+            yield (index, raw_metadata, hint)
+        else:
+            yield (index, normalizer_class.project(raw_metadata), normalizer_class)
+
+
+def normalize_parallel(raw_metadata_iterable, base_class=None, workers=None, chunksize=1,
+                       ordered=True, hint=None, handler_kwargs=None, mp_context=None,
+                       project=False, prewarm_workers=False, time_budget=None):
+    """Generator which normalizes the elements of
+    `raw_metadata_iterable` in a pool of `workers` processes (by
+    default, one per CPU).
+    Each worker builds its own MetadataHandler once, using
+    `base_class` and `handler_kwargs`. Elements are sent to the
+    workers by chunks of `chunksize`.
+    Yields (index, result) tuples, where `index` is the position of
+    the element in the input and `result` is either the normalized
+    dictionary or the exception which prevented the normalization.
+    If `ordered` is False, results are yielded as soon as they are
+    available instead of in input order.
+    `mp_context` is the name of the multiprocessing start method to
+    use ('fork', 'spawn' or 'forkserver').
+    If `project` is True, the elements are routed in the current
+    process, and only the input fields declared by the normalizer they
+    were routed to are sent to the workers.
+    If `prewarm_workers` is True, the initialization is done once
+    before starting the workers: with the 'fork' start method, the
+    workers inherit a handler built by prewarm() in the current
+    process. The workers started with the other methods don't share
+    the memory of the current process, so each one warms up its own
+    handler when it starts instead. With the 'forkserver' start
+    method, the server also preloads PRELOAD_MODULES (this only works
+    if the server was not started yet).
+    If `time_budget` is given, the normalization of each element is
+    interrupted after that many seconds, and the result is a
+    NormalizationTimeout which gives the normalizer and the field which
+    were being processed. The workers are then managed by a watchdog
+    instead of a multiprocessing pool: a worker which can't be
+    interrupted, for example in a long GEOS operation, is killed
+    WATCHDOG_GRACE seconds after the budget and replaced. The
+    NormalizationTimeout of its element then only gives the normalizer
+    if `project` is True.
+    """
+    handler_kwargs = handler_kwargs or {}
+    context = multiprocessing.get_context(mp_context)
+    start_method = context.get_start_method()
+
+    handler = None
+    worker_handler_kwargs = handler_kwargs
+    if prewarm_workers:
+        if start_method == 'fork':
+            handler = prewarm(base_class, handler_kwargs)
+        else:
+            if start_method == 'forkserver':
+                context.set_forkserver_preload(list(PRELOAD_MODULES))
+            logger.debug("The workers started with the '%s' method warm up their own handler",
+                         start_method)
+            worker_handler_kwargs = dict(handler_kwargs, warm_up=True)
+
+    if project:
+        router = handler or handlers.MetadataHandler(base_class, **handler_kwargs)
+        tasks = _projected_tasks(raw_metadata_iterable, router, hint)
+    else:
+        tasks = ((index, raw_metadata, hint)
+                 for index, raw_metadata in enumerate(raw_metadata_iterable))
+
+    # the handler can only be passed to the workers without being
+    # pickled when they are forked from the current process
+    initargs = (base_class, worker_handler_kwargs, handler, time_budget)
+    logger.debug("Normalizing with %s worker processes", workers or 'one per CPU')
+    if time_budget:
+        results = _WatchdogPool(context, workers, initargs, time_budget).run(tasks, chunksize)
+        yield from _in_order(results) if ordered else results
+        return
+    with context.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+        if ordered:
+            results = pool.imap(_normalize_in_worker, tasks, chunksize)
+        else:
+            results = pool.imap_unordered(_normalize_in_worker, tasks, chunksize)
+        yield from results
+
+
+def normalize_threaded(raw_metadata_iterable, base_class=None, workers=None, ordered=True,
+                       hint=None, handler_kwargs=None, handler=None, max_pending=None):
+    """Generator which normalizes the elements of
+    `raw_metadata_iterable` in a pool of `workers` threads, which all
+    use the same handler. The handler is built from `base_class` and
+    `handler_kwargs` unless one is given in `handler`.
+    This only improves throughput when the GIL is released during
+    normalization: on free-threaded builds of CPython, or for
+    normalizers which spend their time in geometry operations.
+    At most `max_pending` elements (by default four per worker) are
+    submitted at the same time.
+    Yields the same (index, result) tuples as normalize_parallel().
+    """
+    if handler is None:
+        handler = handlers.MetadataHandler(base_class, **(handler_kwargs or {}))
+    if max_pending is None:
+        max_pending = 4 * (workers or os.cpu_count() or 1)
+
+    # maps the submitted futures to the index of their element.
+    # Dictionaries keep the insertion order, which is used in ordered
+    # mode
+    pending = {}
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        try:
+            for index, raw_metadata in enumerate(raw_metadata_iterable):
+                if len(pending) >= max_pending:
+                    yield from _pop_done(pending, ordered)
+                future = executor.submit(handler.get_parameters_or_error, raw_metadata, hint=hint)
+                pending[future] = index
+            while pending:
+                yield from _pop_done(pending, ordered)
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _pop_done(pending, ordered):
+    """Remove finished futures from the `pending` dictionary and yield
+    their (index, result) tuples. If `ordered` is True, only the oldest
+    future is waited for, otherwise the first ones to finish are taken
+    """
+    if ordered:
+        done = (next(iter(pending)),)
+    else:
+        done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+    for future in done:
+        index = pending.pop(future)
+        yield (index, future.result())
+
+
+# format of the length prefix of the records written in shared memory
+_LENGTH_PREFIX = struct.Struct('<I')
+
+
+def _encode_records(raw_metadata_list):
+    """Returns the raw metadata dictionaries encoded as a sequence of
+    length-prefixed JSON documents
+    """
+    chunks = []
+    for raw_metadata in raw_metadata_list:
+        document = json.dumps(raw_metadata).encode()
+        chunks.append(_LENGTH_PREFIX.pack(len(document)))
+        chunks.append(document)
+    return b''.join(chunks)
+
+
+def _decode_records(buffer, count):
+    """Decode `count` length-prefixed JSON documents from `buffer`"""
+    records = []
+    offset = 0
+    for _ in range(count):
+        (length,) = _LENGTH_PREFIX.unpack_from(buffer, offset)
+        offset += _LENGTH_PREFIX.size
+        records.append(json.loads(bytes(buffer[offset:offset + length])))
+        offset += length
+    return records
+
+
+def _shared_memory_worker(worker_id, base_class, handler_kwargs, hint, time_budget,
+                          input_name, output_name, slot_size, tasks, results, progress):
+    """Worker process of normalize_shared_memory().
+    Receives (slot, start_index, count, size) tasks which designate a
+    batch of records in a slot of the input ring, and writes the
+    pickled results in the same slot of the output ring. Batches which
+    don't fit in a slot are passed through the pipes instead.
+    If `progress` is not None, the position in the batch of the record
+    being normalized and the time at which it started are written in
+    it, for the watchdog of the parent process. The position is -1
+    between batches.
+    """
+    from multiprocessing import shared_memory  # pylint: disable=import-outside-toplevel
+
+    handler = handlers.MetadataHandler(base_class, **handler_kwargs)
+    input_memory = shared_memory.SharedMemory(input_name)
+    output_memory = shared_memory.SharedMemory(output_name)
+    try:
+        for slot, start_index, count, payload in iter(tasks.get, None):
+            if isinstance(payload, int):
+                offset = slot * slot_size
+                raw_metadata_list = _decode_records(
+                    input_memory.buf[offset:offset + payload], count)
+            else:
+                raw_metadata_list = payload
+            normalized = []
+            for position, raw_metadata in enumerate(raw_metadata_list):
+                if progress is not None:
+                    progress[:] = [position, time.time()]
+                normalized.append(handler.get_parameters_or_error(
+                    raw_metadata, hint=hint, time_budget=time_budget))
+            if progress is not None:
+                progress[0] = -1
+            data = pickle.dumps(normalized, protocol=pickle.HIGHEST_PROTOCOL)
+            if len(data) <= slot_size:
+                offset = slot * slot_size
+                output_memory.buf[offset:offset + len(data)] = data
+                results.send((worker_id, slot, start_index, len(data)))
+            else:
+                results.send((worker_id, slot, start_index, normalized))
+    finally:
+        input_memory.close()
+        output_memory.close()
+
+
+def _batches(iterable, batch_size):
+    """Generator which yields (start_index, batch) tuples, where batch
+    is a list of up to `batch_size` consecutive elements of `iterable`
+    """
+    batch = []
+    start_index = 0
+    for index, element in enumerate(iterable):
+        if not batch:
+            start_index = index
+        batch.append(element)
+        if len(batch) >= batch_size:
+            yield (start_index, batch)
+            batch = []
+    if batch:
+        yield (start_index, batch)
+
+
+class _SharedMemoryWorkers():
+    """Worker processes which exchange data with the current process
+    through shared memory rings.
+    If a time budget is given, a worker which exceeds the budget of a
+    record by more than WATCHDOG_GRACE seconds is killed and replaced.
+    The record gets a NormalizationTimeout, and the other records of
+    the batches sent to the worker are sent again.
+    """
+
+    def __init__(self, context, workers, slots, slot_size, poll_interval):
+        self.context = context
+        self.workers = workers
+        self.slot_size = slot_size
+        self.poll_interval = poll_interval
+        self.worker_args = None
+        self.time_budget = None
+        self.input_memories = []
+        self.output_memories = []
+        # the following lists are indexed by worker
+        self.task_queues = [None] * workers
+        self.results = [None] * workers
+        self.progress = [None] * workers
+        self.processes = [None] * workers
+        # (start_index, batch) tuples sent to each worker, by slot
+        self.batches = [collections.OrderedDict() for _ in range(workers)]
+        # (worker_id, slot) couples which can receive a batch
+        self.free_slots = collections.deque(
+            (worker_id, slot) for slot in range(slots) for worker_id in range(workers))
+        self.in_flight = 0
+        # (start_index, batch) tuples of the killed workers, which
+        # must be sent again
+        self.retries = collections.deque()
+
+    def start(self, base_class, handler_kwargs, hint, time_budget=None):
+        """Create the shared memory rings and start the workers"""
+        from multiprocessing import shared_memory  # pylint: disable=import-outside-toplevel
+        ring_size = len(self.free_slots) // self.workers * self.slot_size
+        self.worker_args = (base_class, handler_kwargs, hint, time_budget)
+        self.time_budget = time_budget
+        for worker_id in range(self.workers):
+            self.input_memories.append(shared_memory.SharedMemory(create=True, size=ring_size))
+            self.output_memories.append(shared_memory.SharedMemory(create=True, size=ring_size))
+            self._start_worker(worker_id)
+
+    def _start_worker(self, worker_id):
+        self.task_queues[worker_id] = self.context.SimpleQueue()
+        reader, writer = self.context.Pipe(duplex=False)
+        if self.time_budget:
+            self.progress[worker_id] = self.context.Array('d', [-1., 0.])
+        process = self.context.Process(
+            target=_shared_memory_worker,
+            args=(worker_id, *self.worker_args,
+                  self.input_memories[worker_id].name, self.output_memories[worker_id].name,
+                  self.slot_size, self.task_queues[worker_id], writer, self.progress[worker_id]),
+            daemon=True)
+        process.start()
+        writer.close()
+        self.results[worker_id] = reader
+        self.processes[worker_id] = process
+
+    def send(self, start_index, batch):
+        """Write a batch of records in a free slot and send its position
+        to the worker which owns the slot
+        """
+        worker_id, slot = self.free_slots.popleft()
+        try:
+            data = _encode_records(batch)
+        except (TypeError, ValueError):
+            data = None
+        if data is not None and len(data) <= self.slot_size:
+            offset = slot * self.slot_size
+            self.input_memories[worker_id].buf[offset:offset + len(data)] = data
+            self.task_queues[worker_id].put((slot, start_index, len(batch), len(data)))
+        else:
+            self.task_queues[worker_id].put((slot, start_index, len(batch), batch))
+        self.batches[worker_id][slot] = (start_index, batch)
+        self.in_flight += 1
+
+    def _read_results(self, worker_id, message):
+        """Returns the (index, result) tuples of a message sent by a
+        worker, and frees the slot of the batch
+        """
+        _, slot, start_index, payload = message
+        if isinstance(payload, int):
+            offset = slot * self.slot_size
+            normalized = pickle.loads(
+                self.output_memories[worker_id].buf[offset:offset + payload])
+        else:
+            normalized = payload
+        del self.batches[worker_id][slot]
+        self.free_slots.append((worker_id, slot))
+        self.in_flight -= 1
+        return list(enumerate(normalized, start=start_index))
+
+    def _deadline(self, worker_id):
+        """Returns the time before which the record being normalized by
+        the worker must be finished, or None
+        """
+        progress = self.progress[worker_id]
+        if progress is None or not self.batches[worker_id]:
+            return None
+        position, started = progress[:]
+        if position < 0:
+            return None
+        return started + self.time_budget + WATCHDOG_GRACE
+
+    def _replace_worker(self, worker_id):
+        """Kill a worker which exceeded its time budget and start
+        another one. Returns the (index, result) tuples of the batches
+        it finished before being killed and the timeout of the record
+        it was normalizing
+        """
+        process = self.processes[worker_id]
+        process.kill()
+        process.join()
+        results = []
+        reader = self.results[worker_id]
+        try:
+            while reader.poll():
+                results.extend(self._read_results(worker_id, reader.recv()))
+        except (EOFError, OSError):
+            pass
+        reader.close()
+
+        # the lock of the array may have been held by the killed worker
+        position, started = self.progress[worker_id].get_obj()[:]
+        timed_out = position >= 0 and started + self.time_budget + WATCHDOG_GRACE <= time.time()
+        for batch_number, (slot, (start_index, batch)) in enumerate(
+                self.batches[worker_id].items()):
+            self.free_slots.append((worker_id, slot))
+            self.in_flight -= 1
+            if batch_number == 0 and timed_out:
+                position = int(position)
+                logger.warning("Killed a worker which exceeded the time budget of element %d",
+                               start_index + position)
+                results.append((start_index + position,
+                                _kill_timeout(self.time_budget, self.worker_args[2])))
+                for retry in ((start_index, batch[:position]),
+                              (start_index + position + 1, batch[position + 1:])):
+                    if retry[1]:
+                        self.retries.append(retry)
+            else:
+                self.retries.append((start_index, batch))
+        self.batches[worker_id].clear()
+        self._start_worker(worker_id)
+        return results
+
+    def receive(self):
+        """Wait for a batch of results and return its (index, result)
+        tuples. Workers which exceed their time budget are replaced
+        """
+        while True:
+            deadlines = [(self._deadline(worker_id), worker_id)
+                         for worker_id in range(self.workers)]
+            deadlines = [deadline for deadline in deadlines if deadline[0] is not None]
+            timeout = self.poll_interval
+            if deadlines:
+                timeout = max(0., min(timeout, min(deadlines)[0] - time.time()))
+            ready = multiprocessing.connection.wait(self.results, timeout)
+            if ready:
+                worker_id = self.results.index(ready[0])
+                try:
+                    message = ready[0].recv()
+                except EOFError:
+                    raise RuntimeError("A worker process died unexpectedly") from None
+                return self._read_results(worker_id, message)
+            if not all(process.is_alive() for process in self.processes):
+                raise RuntimeError("A worker process died unexpectedly")
+            now = time.time()
+            for _, worker_id in deadlines:
+                # the worker may have moved on to another record
+                deadline = self._deadline(worker_id)
+                if deadline is not None and deadline <= now:
+                    return self._replace_worker(worker_id)
+
+    def stop(self):
+        """Stop the workers and release the shared memory. Workers which
+        don't stop within `poll_interval` are terminated
+        """
+        for tasks in self.task_queues:
+            if tasks is not None:
+                tasks.put(None)
+        for process in self.processes:
+            if process is not None:
+                process.join(self.poll_interval)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+        for reader in self.results:
+            if reader is not None:
+                reader.close()
+        for memory in self.input_memories + self.output_memories:
+            memory.close()
+            memory.unlink()
+
+
+def normalize_shared_memory(raw_metadata_iterable, base_class=None, workers=None,
+                            batch_size=100, slots=2, slot_size=1 << 22, ordered=True, hint=None,
+                            handler_kwargs=None, mp_context=None, poll_interval=1.,
+                            time_budget=None):
+    """Experimental: generator which normalizes the elements of
+    `raw_metadata_iterable` in `workers` processes (by default, one
+    per CPU), passing the data through shared memory instead of pipes.
+    It is not faster than normalize_parallel() on the records measured
+    by benchmarks/transport.py, which should be preferred.
+    Each worker has an input and an output ring of `slots` slots of
+    `slot_size` bytes. Batches of up to `batch_size` records are
+    written in a free slot of the input ring as length-prefixed JSON
+    documents, and the worker writes the pickled results in the same
+    slot of the output ring. Only the position and size of the batches
+    go through the pipes. Batches or results which don't fit in a slot,
+    and records which can't be encoded in JSON, are passed through the
+    pipes.
+    Yields the same (index, result) tuples as normalize_parallel().
+    `time_budget` has the same meaning as in normalize_parallel(),
+    workers which exceed it are killed and replaced in the same way.
+    Requires Python 3.8 or later.
+    """
+    workers_pool = _SharedMemoryWorkers(
+        multiprocessing.get_context(mp_context), workers or os.cpu_count() or 1,
+        slots, slot_size, poll_interval)
+    # results waiting for the previous ones in ordered mode
+    buffered = {}
+    next_index = 0
+
+    def collect(batch_results):
+        """Yield the results, in input order if `ordered` is True"""
+        nonlocal next_index
+        if not ordered:
+            yield from batch_results
+            return
+        buffered.update(batch_results)
+        while next_index in buffered:
+            yield (next_index, buffered.pop(next_index))
+            next_index += 1
+
+    try:
+        workers_pool.start(base_class, handler_kwargs or {}, hint, time_budget)
+        for start_index, batch in _batches(raw_metadata_iterable, batch_size):
+            while workers_pool.retries or not workers_pool.free_slots:
+                if workers_pool.free_slots:
+                    workers_pool.send(*workers_pool.retries.popleft())
+                else:
+                    yield from collect(workers_pool.receive())
+            workers_pool.send(start_index, batch)
+        while workers_pool.in_flight or workers_pool.retries:
+            if workers_pool.retries and workers_pool.free_slots:
+                workers_pool.send(*workers_pool.retries.popleft())
+            else:
+                yield from collect(workers_pool.receive())
+    finally:
+        workers_pool.stop()
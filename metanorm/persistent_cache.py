@@ -0,0 +1,136 @@
+"""On-disk cache shared by the processes which normalize metadata, so
+that vocabulary lookups done by one process don't have to be done again
+by the others or by the next runs.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# connections opened by a parent process, which must not be closed
+_INHERITED_CONNECTIONS = []
+
+
+class PersistentCache():
+    """Cache stored in an SQLite database in WAL mode, which can be
+    read by many processes while one of them writes.
+    Each entry is stored with a fingerprint. An entry whose fingerprint
+    differs from the one given when reading it is considered missing,
+    and is replaced the next time it is written.
+    Keys and values must be JSON-serializable. Dictionaries are read
+    back as OrderedDicts.
+    Errors of the database are logged and treated as cache misses, so
+    that they don't prevent the normalization.
+    """
+
+    def __init__(self, path, timeout=10.):
+        self.path = path
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        # protects the counters, the cache can be shared between threads
+        self._lock = threading.Lock()
+        # connections can't be shared between threads or processes
+        self._local = threading.local()
+
+    def __getstate__(self):
+        return {'path': self.path, 'timeout': self.timeout}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['timeout'])
+
+    def _connection(self):
+        """Returns the connection of the current thread in the current
+        process, opening it if necessary
+        """
+        if getattr(self._local, 'pid', None) != os.getpid():
+            inherited_connection = getattr(self._local, 'connection', None)
+            if inherited_connection is not None:
+                # closing a connection inherited from the parent
+                # process, even by garbage collection, can disturb the
+                # parent's use of the database
+                _INHERITED_CONNECTIONS.append(inherited_connection)
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS entries '
+                '(key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, value TEXT NOT NULL)')
+            connection.commit()
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def _count(self, hit):
+        """Count a hit or a miss"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @staticmethod
+    def _serialize(key, fingerprint):
+        return json.dumps(key), json.dumps(fingerprint)
+
+    def get(self, key, fingerprint, default=None):
+        """Returns the value associated with `key` if it was stored with
+        `fingerprint`, `default` otherwise
+        """
+        try:
+            key, fingerprint = self._serialize(key, fingerprint)
+        except (TypeError, ValueError) as error:
+            logger.debug("Could not look up %r: %s", key, error)
+            self._count(hit=False)
+            return default
+        try:
+            row = self._connection().execute(
+                'SELECT value FROM entries WHERE key = ? AND fingerprint = ?',
+                (key, fingerprint)).fetchone()
+        except sqlite3.Error as error:
+            logger.warning("Could not read from the cache %s: %s", self.path, error)
+            row = None
+        if row is None:
+            self._count(hit=False)
+            return default
+        self._count(hit=True)
+        return json.loads(row[0], object_pairs_hook=OrderedDict)
+
+    def put(self, key, fingerprint, value):
+        """Associate `value` with `key` and `fingerprint`"""
+        try:
+            serialized_value = json.dumps(value)
+            key, fingerprint = self._serialize(key, fingerprint)
+        except (TypeError, ValueError) as error:
+            logger.debug("Could not cache %r for %r: %s", value, key, error)
+            return
+        try:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO entries (key, fingerprint, value) VALUES (?, ?, ?)',
+                    (key, fingerprint, serialized_value))
+        except sqlite3.Error as error:
+            logger.warning("Could not write to the cache %s: %s", self.path, error)
+
+    def clear(self):
+        """Remove all entries and reset the counters"""
+        connection = self._connection()
+        with connection:
+            connection.execute('DELETE FROM entries')
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def close(self):
+        """Close the connection of the current thread"""
+        if getattr(self._local, 'pid', None) == os.getpid():
+            self._local.connection.close()
+        self._local = threading.local()
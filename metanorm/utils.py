@@ -1,10 +1,19 @@
 """Utility functions for metadata normalizing"""
 
+import contextlib
+import copy
+import hashlib
 import importlib
 import functools
+import inspect
+import os
+import os.path
 import pkgutil
 import re
+import signal
 import sys
+import threading
+import time
 from collections import OrderedDict
 from datetime import datetime, timedelta
 
@@ -14,6 +23,13 @@ import shapely.ops
 import shapely.wkt
 from dateutil.tz import tzutc
 
+try:
+    import importlib.metadata as importlib_metadata
+except ImportError:  # Python < 3.8
+    importlib_metadata = None
+
+from . import dispatch
+from .persistent_cache import PersistentCache
 from .errors import MetadataNormalizationError
 
 
@@ -30,6 +46,14 @@ def get_all_subclasses(base_class):
     return subclasses
 
 
+def is_abstract(cls):
+    """Returns True if `cls` is declared as abstract. The declaration
+    is a class attribute which is not inherited: it is only taken into
+    account if it is defined in the class' own body.
+    """
+    return vars(cls).get('abstract', False)
+
+
 def export_subclasses(package__all__, package_name, package_dir, base_class):
     """Append `base_class` and all of its subclasses declared in
     modules in `package_dir` to `all`. This is meant to be used in
@@ -48,8 +72,43 @@ def export_subclasses(package__all__, package_name, package_dir, base_class):
         package__all__.append(cls.__name__)
 
 
+def get_metanorm_version():
+    """Returns the installed version of metanorm. If its metadata is
+    not available, for example when running from a source tree,
+    returns a digest of the modification times and sizes of its source
+    files
+    """
+    if importlib_metadata is not None:
+        try:
+            return importlib_metadata.version('metanorm')
+        except importlib_metadata.PackageNotFoundError:
+            pass
+    digest = hashlib.sha1()
+    package_dir = os.path.dirname(__file__)
+    for directory, _, file_names in sorted(os.walk(package_dir)):
+        for file_name in sorted(file_names):
+            if file_name.endswith('.py'):
+                path = os.path.join(directory, file_name)
+                stat = os.stat(path)
+                digest.update(
+                    f"{os.path.relpath(path, package_dir)}:{stat.st_mtime_ns}:{stat.st_size};"
+                    .encode())
+    return f"source-{digest.hexdigest()}"
+
+
 ######################## Pythesint utilities ########################
 
+# Pythesint vocabularies used by the normalizers
+PYTHESINT_VOCABULARIES = (
+    'gcmd_instrument',
+    'gcmd_location',
+    'gcmd_platform',
+    'gcmd_provider',
+    'iso19115_topic_category',
+    'cf_standard_name',
+    'wkv_variable',
+)
+
 # Field names commonly used in the 'summary' attribute
 SUMMARY_FIELDS = {
     'description': 'Description',
@@ -86,6 +145,120 @@ PYTHESINT_KEYWORD_TRANSLATION = {
     'NSIDC': ('NSIDC_ECS',),
 }
 
+def get_vocabulary_fingerprint(vocabulary_name):
+    """Returns a tuple which changes when the contents of a pythesint
+    vocabulary change: the vocabulary's name and version, and the
+    modification time and size of its file
+    """
+    vocabulary = pti.vocabularies[vocabulary_name]
+    try:
+        stat = os.stat(vocabulary.get_filepath())
+        file_state = (stat.st_mtime_ns, stat.st_size)
+    except (AttributeError, NotImplementedError, OSError):
+        file_state = None
+    return (vocabulary_name, getattr(vocabulary, 'version', None), file_state)
+
+
+# marks the lookups which are not cached, None being a valid result
+_NOT_CACHED = object()
+
+# on-disk cache of the vocabulary lookups, shared between processes.
+# Disabled unless configured with configure_persistent_cache() or the
+# METANORM_PERSISTENT_CACHE environment variable
+PERSISTENT_CACHE = None
+
+# lookups already read from the persistent cache or done by this
+# process, checked before the persistent cache
+_PERSISTENT_LOOKUPS = dispatch.LRUCache(1024)
+
+# fingerprints of the vocabularies used as persistent cache keys,
+# computed once per process
+_PERSISTENT_FINGERPRINTS = {}
+
+
+def configure_persistent_cache(path):
+    """Use the SQLite database at `path` as persistent cache for the
+    vocabulary lookups, or disable the persistent cache if `path` is
+    None. Worker processes started with the 'fork' method inherit the
+    configuration. Other processes need the METANORM_PERSISTENT_CACHE
+    environment variable.
+    """
+    global PERSISTENT_CACHE  # pylint: disable=global-statement
+    if PERSISTENT_CACHE is not None:
+        PERSISTENT_CACHE.close()
+    PERSISTENT_CACHE = PersistentCache(path) if path else None
+    _PERSISTENT_LOOKUPS.clear()
+    _PERSISTENT_FINGERPRINTS.clear()
+
+
+configure_persistent_cache(os.environ.get('METANORM_PERSISTENT_CACHE'))
+
+
+def _persistent_fingerprint(vocabulary_name):
+    """Returns the fingerprint of a vocabulary, computed once per
+    process
+    """
+    fingerprint = _PERSISTENT_FINGERPRINTS.get(vocabulary_name)
+    if fingerprint is None:
+        fingerprint = get_vocabulary_fingerprint(vocabulary_name)
+        _PERSISTENT_FINGERPRINTS[vocabulary_name] = fingerprint
+    return fingerprint
+
+
+def _hashable(value):
+    """Returns a hashable equivalent of a JSON-like value"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(item) for item in value)
+    if isinstance(value, dict):
+        return tuple((key, _hashable(item)) for key, item in value.items())
+    return value
+
+
+def persistently_cached(vocabulary_names):
+    """Decorator for vocabulary lookup functions whose results are
+    stored in the persistent cache, if it is enabled. Results are
+    keyed by the function's arguments, which must be
+    JSON-serializable, and are invalid when one of the vocabularies
+    they depend on changes. `vocabulary_names` is a tuple of names of
+    pythesint vocabularies, or a function which returns it from the
+    arguments of the decorated function. Exceptions are not cached.
+    Results are looked up in memory first, then in the persistent
+    cache, and each call returns a copy of the result.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = PERSISTENT_CACHE
+            if cache is None:
+                return func(*args, **kwargs)
+            # keyed by the arguments as they are given, binding them to
+            # the signature being too slow for the lookups in memory
+            try:
+                memory_key = (func, _hashable(args), _hashable(sorted(kwargs.items())))
+                result = _PERSISTENT_LOOKUPS.get(memory_key, _NOT_CACHED)
+            except TypeError:
+                memory_key = None
+                result = _NOT_CACHED
+            if result is _NOT_CACHED:
+                arguments = signature.bind(*args, **kwargs)
+                arguments.apply_defaults()
+                names = (vocabulary_names(*arguments.args) if callable(vocabulary_names)
+                         else vocabulary_names)
+                key = [func.__qualname__, list(arguments.arguments.values())]
+                fingerprint = [_persistent_fingerprint(name) for name in names]
+                result = cache.get(key, fingerprint, _NOT_CACHED)
+                if result is _NOT_CACHED:
+                    result = func(*args, **kwargs)
+                    cache.put(key, fingerprint, result)
+                if memory_key is not None:
+                    _PERSISTENT_LOOKUPS.put(memory_key, result)
+            return copy.copy(result)
+        return wrapper
+    return decorator
+
+
 def translate_pythesint_keyword(translation_dict, alias):
     """Get a valid pythesint search keyword from known aliases"""
     for valid_keyword, aliases in translation_dict.items():
@@ -107,6 +280,7 @@ def get_gcmd_provider(potential_provider_attributes, additional_keywords=None):
     return provider
 
 
+@persistently_cached(('gcmd_platform',))
 def get_gcmd_platform(platform_name, additional_keywords=None):
     """
     Gets a GCMD platform from a platform name, otherwise generate a GCMD platform-like data
@@ -125,6 +299,7 @@ def get_gcmd_platform(platform_name, additional_keywords=None):
     return gcmd_platform
 
 
+@persistently_cached(('gcmd_instrument',))
 def get_gcmd_instrument(instrument_name, additional_keywords=None):
     """
     Gets a GCMD instrument from an instrument name, otherwise generate a GCMD instrument-like data
@@ -145,16 +320,53 @@ def get_gcmd_instrument(instrument_name, additional_keywords=None):
     return gcmd_instrument
 
 
+# results of gcmd_search(). The keywords used by the normalizers are few
+# and constant, so most searches are answered from the cache
+GCMD_SEARCH_CACHE = dispatch.LRUCache(1024)
+
+
+def configure_gcmd_search_cache(maxsize):
+    """Replace the cache of gcmd_search() results with an empty cache
+    of `maxsize` entries. A size of 0 disables the cache.
+    """
+    global GCMD_SEARCH_CACHE  # pylint: disable=global-statement
+    GCMD_SEARCH_CACHE = dispatch.LRUCache(maxsize)
+
+
+def clear_gcmd_search_cache():
+    """Remove all entries from the cache of gcmd_search() results, the
+    GCMD indexes and the lookups kept in memory in front of the
+    persistent cache, for example after updating the pythesint
+    vocabularies
+    """
+    GCMD_SEARCH_CACHE.clear()
+    _GCMD_INDEXES.clear()
+    _PERSISTENT_LOOKUPS.clear()
+    _PERSISTENT_FINGERPRINTS.clear()
+
+
 def gcmd_search(vocabulary_name, keyword, additional_keywords=None):
     """
     Search for GCMD objects using the provided vocabulary name and keywords.
     Returns None if nothing was found.
+    Results are cached in GCMD_SEARCH_CACHE. Each call returns a copy
+    of the cached result, so callers can modify it.
     """
+    translated_keyword = translate_pythesint_keyword(PYTHESINT_KEYWORD_TRANSLATION, keyword)
+    cache_key = (vocabulary_name, translated_keyword, tuple(additional_keywords or ()))
+    gcmd_object = GCMD_SEARCH_CACHE.get(cache_key, _NOT_CACHED)
+    if gcmd_object is _NOT_CACHED:
+        gcmd_object = _gcmd_search(vocabulary_name, translated_keyword, additional_keywords)
+        GCMD_SEARCH_CACHE.put(cache_key, gcmd_object)
+    return gcmd_object.copy() if gcmd_object is not None else None
+
+
+@persistently_cached(lambda vocabulary_name, *_: (f"gcmd_{vocabulary_name}",))
+def _gcmd_search(vocabulary_name, translated_keyword, additional_keywords):
+    """Does the actual search for gcmd_search()"""
     pti_search_method = getattr(pti, f"search_gcmd_{vocabulary_name}_list")
     pti_get_method = getattr(pti, f"get_gcmd_{vocabulary_name}")
 
-    translated_keyword = translate_pythesint_keyword(PYTHESINT_KEYWORD_TRANSLATION, keyword)
-
     gcmd_object = None
     # Try to search for the object name
     matching_objects = pti_search_method(translated_keyword)
@@ -165,7 +377,8 @@ def gcmd_search(vocabulary_name, keyword, additional_keywords=None):
     # If more than one is found, look for the additional keywords
     # in the search results to narrow it down
     elif matching_objects_length > 1 and additional_keywords:
-        restricted_search = restrict_gcmd_search(matching_objects, additional_keywords)
+        restricted_search = restrict_gcmd_search(matching_objects, additional_keywords,
+                                                 vocabulary_name)
         restricted_search_length = len(restricted_search)
         if restricted_search_length == 1:
             gcmd_object = restricted_search[0]
@@ -181,24 +394,101 @@ def gcmd_search(vocabulary_name, keyword, additional_keywords=None):
     return gcmd_object
 
 
-def restrict_gcmd_search(gcmd_objects, keywords):
-    """Restricts a list of GCMD objects using a list of keywords to search"""
-    restricted_search = gcmd_objects.copy()
+class GCMDIndex():
+    """Index of the text of GCMD objects used to find the objects
+    which contain a keyword
+    """
+
+    def __init__(self, gcmd_objects):
+        gcmd_objects = list(gcmd_objects)
+        self.token_index = dispatch.TokenIndex(
+            str(gcmd_object).lower() for gcmd_object in gcmd_objects)
+        self._positions = {self._object_key(gcmd_object): position
+                           for position, gcmd_object in enumerate(gcmd_objects)}
+
+    @staticmethod
+    def _object_key(gcmd_object):
+        return tuple(gcmd_object.items())
+
+    def positions(self, gcmd_objects):
+        """Returns the positions of the GCMD objects in the index, or
+        None if one of them is not indexed
+        """
+        try:
+            return [self._positions[self._object_key(gcmd_object)]
+                    for gcmd_object in gcmd_objects]
+        except KeyError:
+            return None
+
+    def find(self, keyword):
+        """Returns the positions of the GCMD objects which contain
+        `keyword`, ignoring case
+        """
+        return self.token_index.find(keyword.lower())
+
+
+# maps the GCMD vocabulary names to (fingerprint, GCMDIndex) tuples
+_GCMD_INDEXES = {}
+
+
+def get_gcmd_index(vocabulary_name, revalidate=False):
+    """Returns the index of the GCMD vocabulary designated by
+    `vocabulary_name` (for example 'instrument'). The index is built
+    on the first call. If `revalidate` is True, it is rebuilt if the
+    vocabulary changed since it was built
+    """
+    full_name = f"gcmd_{vocabulary_name}"
+    fingerprint_and_index = _GCMD_INDEXES.get(vocabulary_name)
+    if fingerprint_and_index is not None and not revalidate:
+        return fingerprint_and_index[1]
+    fingerprint = get_vocabulary_fingerprint(full_name)
+    if fingerprint_and_index is None or fingerprint_and_index[0] != fingerprint:
+        fingerprint_and_index = (fingerprint, GCMDIndex(pti.vocabularies[full_name].get_list()))
+        _GCMD_INDEXES[vocabulary_name] = fingerprint_and_index
+    return fingerprint_and_index[1]
+
+
+def load_vocabulary(vocabulary_name):
+    """Load a pythesint vocabulary. The index of GCMD vocabularies is
+    built at the same time, or rebuilt if the vocabulary changed
+    """
+    if vocabulary_name.startswith('gcmd_'):
+        get_gcmd_index(vocabulary_name[len('gcmd_'):], revalidate=True)
+    else:
+        pti.vocabularies[vocabulary_name].get_list()
+
+
+def restrict_gcmd_search(gcmd_objects, keywords, vocabulary_name=None):
+    """Restricts a list of GCMD objects using a list of keywords to search.
+    If `vocabulary_name` is given, the index of this vocabulary is used
+    to find the objects which contain each keyword.
+    """
+    positions = None
+    if vocabulary_name is not None:
+        index = get_gcmd_index(vocabulary_name)
+        positions = index.positions(gcmd_objects)
+    if positions is None:
+        index = GCMDIndex(gcmd_objects)
+        positions = range(len(gcmd_objects))
+
+    restricted_search = list(zip(positions, gcmd_objects))
     restricted_search_length = len(restricted_search)
 
     for keyword in keywords:
+        matching_positions = index.find(keyword)
         keyword_search = [
-            gcmd_object for gcmd_object in restricted_search
-            if keyword.lower() in str(gcmd_object).lower()
+            (position, gcmd_object) for position, gcmd_object in restricted_search
+            if position in matching_positions
         ]
         keyword_search_length = len(keyword_search)
         if keyword_search_length > 0 and keyword_search_length < restricted_search_length:
             restricted_search = keyword_search
             restricted_search_length = keyword_search_length
 
-    return restricted_search
+    return [gcmd_object for _, gcmd_object in restricted_search]
 
 
+@persistently_cached(('cf_standard_name', 'wkv_variable'))
 def get_cf_or_wkv_standard_name(keyword):
     """return the values of a dataset parameter in a standard way from the
     standards that are defined in the pti package based on the keyword that has been passed to it.
@@ -403,6 +693,36 @@ def dict_to_string(dictionary):
     return string.rstrip(';')
 
 
+def project_metadata(raw_metadata, paths):
+    """Returns a copy of `raw_metadata` which only contains the values
+    designated by `paths`. A path is a list of keys separated by dots,
+    for example 'umm.TemporalExtent'.
+    The dictionaries on a path are kept even if the designated value
+    is missing, so that the presence of their key can still be
+    checked. Values which are not dictionaries are kept whole.
+    The values are not copied.
+    """
+    projection = {}
+    for path in paths:
+        source = raw_metadata
+        target = projection
+        keys = path.split('.')
+        for depth, key in enumerate(keys, start=1):
+            if not isinstance(source, dict) or key not in source:
+                break
+            value = source[key]
+            if depth == len(keys) or not isinstance(value, dict):
+                target[key] = value
+                break
+            if target.get(key) is value:
+                # the whole dictionary was already designated by
+                # another path
+                break
+            source = value
+            target = target.setdefault(key, {})
+    return projection
+
+
 def raises(exceptions):
     """Decorator for methods which get an attribute from metadata.
     Makes it possible to declare which exception(s) are thrown when the
@@ -425,6 +745,78 @@ def raises(exceptions):
     return decorator
 
 
+class TimeBudgetExceeded(BaseException):
+    """Raised by time_budget() when the time budget is exhausted.
+    It does not inherit from Exception so that it is not caught by the
+    error handling of the normalizers
+    """
+
+
+def check_time_budget(seconds):
+    """Raise a RuntimeError if a time budget of `seconds` can't be
+    enforced in the current thread
+    """
+    if not seconds:
+        return
+    if not hasattr(signal, 'setitimer'):
+        raise RuntimeError("Time budgets require SIGALRM, which is not available on this system")
+    if threading.current_thread() is not threading.main_thread():
+        raise RuntimeError(
+            "Time budgets can only be enforced in the main thread, "
+            f"not in {threading.current_thread().name}")
+
+
+@contextlib.contextmanager
+def time_budget(seconds):
+    """Context manager which interrupts the code it wraps with a
+    TimeBudgetExceeded exception after `seconds` seconds. No limit is
+    set if `seconds` is None or 0.
+    Relies on SIGALRM, so it can only be used in the main thread, on
+    Unix systems: a RuntimeError is raised otherwise. Code running
+    outside of the Python interpreter (for example a GEOS operation) is
+    only interrupted when it returns. The functions of the parallel
+    module also kill the worker processes which exceed their budget.
+    A timer set by the calling code is suspended in the block and
+    re-armed with its remaining time when it exits; if it should have
+    expired in the block, it fires as soon as the block exits.
+    """
+    check_time_budget(seconds)
+    if not seconds:
+        yield
+        return
+
+    def on_alarm(signal_number, frame):  # pylint: disable=unused-argument
+        raise TimeBudgetExceeded(seconds)
+
+    previous_handler = signal.signal(signal.SIGALRM, on_alarm)
+    outer_delay, outer_interval = signal.setitimer(signal.ITIMER_REAL, seconds)
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+        if outer_delay:
+            remaining = max(outer_delay - (time.monotonic() - start), 1e-6)
+            signal.setitimer(signal.ITIMER_REAL, remaining, outer_interval)
+
+
+def record_independent(method):
+    """Decorator for the getters of normalizers which return the same
+    value whatever the metadata. Normalizers can compute such a value
+    once and reuse it.
+    """
+    method.record_independent = True
+    return method
+
+
+def is_record_independent(method):
+    """Returns True if `method` was decorated with
+    `record_independent`
+    """
+    return getattr(method, 'record_independent', False) is True
+
+
 def create_parameter_list(parameters):
     """Converts a list of standard names into a list of Pythesint dicts
     """
@@ -2,7 +2,9 @@
 #pylint: disable=protected-access
 
 import unittest
+import unittest.mock as mock
 
+import metanorm.errors as errors
 import metanorm.normalizers as normalizers
 
 
@@ -18,3 +20,80 @@ class MetadataNormalizerTestCase(unittest.TestCase):
         """normalize() should raise a NotImplementedError"""
         with self.assertRaises(NotImplementedError):
             normalizers.MetadataNormalizer().normalize({})
+
+    def test_no_url_prefixes(self):
+        """The base class should not declare any URL prefix"""
+        self.assertEqual(normalizers.MetadataNormalizer().url_prefixes, ())
+
+    def test_no_required_keys(self):
+        """The base class should not declare any required key"""
+        self.assertEqual(normalizers.MetadataNormalizer().required_keys, frozenset())
+
+    def test_no_url_markers(self):
+        """The base class should not declare any URL marker"""
+        self.assertEqual(normalizers.MetadataNormalizer().url_markers, ())
+        self.assertTrue(normalizers.MetadataNormalizer().url_routing_is_exhaustive)
+
+    def test_no_routing_tags(self):
+        """The base class should not declare any routing tag"""
+        self.assertEqual(normalizers.MetadataNormalizer().routing_tags, ())
+
+    def test_no_vocabularies(self):
+        """The base class should not declare any vocabulary, and its
+        warm-up should do nothing
+        """
+        self.assertEqual(normalizers.MetadataNormalizer().vocabularies, ())
+        self.assertIsNone(normalizers.MetadataNormalizer().warm_up())
+
+    def test_project_without_input_fields(self):
+        """The whole metadata should be returned if no input field is
+        declared
+        """
+        raw_metadata = {'foo': 'bar'}
+        self.assertEqual(normalizers.MetadataNormalizer().input_fields, ())
+        self.assertIs(normalizers.MetadataNormalizer.project(raw_metadata), raw_metadata)
+
+    def test_project(self):
+        """Only the declared input fields should be returned"""
+        class ProjectingNormalizer(normalizers.MetadataNormalizer):
+            """Normalizer which declares input fields"""
+            abstract = True
+            input_fields = ('foo', 'bar.baz')
+        self.assertDictEqual(
+            ProjectingNormalizer.project({'foo': 1, 'bar': {'baz': 2, 'qux': 3}, 'quux': 4}),
+            {'foo': 1, 'bar': {'baz': 2}})
+
+    def test_default_check_priority(self):
+        """The default check priority should be 0"""
+        self.assertEqual(normalizers.MetadataNormalizer().check_priority, 0)
+
+    def test_routing_gate(self):
+        """The default routing gate should always pass"""
+        self.assertTrue(normalizers.MetadataNormalizer.routing_gate({}))
+
+    def test_abstract(self):
+        """The base class should be abstract"""
+        self.assertTrue(normalizers.MetadataNormalizer.abstract)
+
+    def test_abstract_not_inherited(self):
+        """The 'abstract' attribute of subclasses should be False unless
+        it is declared in their own body
+        """
+        self.assertTrue(normalizers.CMEMSMetadataNormalizer.abstract)
+        self.assertFalse(normalizers.CMEMS008046MetadataNormalizer.abstract)
+        self.assertFalse(normalizers.CMEMS008046MetadataNormalizer().abstract)
+
+    def test_normalize_many(self):
+        """normalize_many() should call normalize() for each element
+        and return the results or errors in the same order
+        """
+        error = errors.MetadataNormalizationError('foo')
+        normalizer = normalizers.MetadataNormalizer()
+        with mock.patch.object(normalizer, 'normalize',
+                               side_effect=[{'a': 1}, error, KeyError('b'), {'c': 3}]):
+            results = normalizer.normalize_many([{}, {}, {}, {}])
+        self.assertEqual(results[0], {'a': 1})
+        self.assertIs(results[1], error)
+        self.assertIsInstance(results[2], errors.MetadataNormalizationError)
+        self.assertIsInstance(results[2].__cause__, KeyError)
+        self.assertEqual(results[3], {'c': 3})
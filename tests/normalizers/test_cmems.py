@@ -47,6 +47,25 @@ class CMEMSMetadataNormalizerTestCase(unittest.TestCase):
         self.assertFalse(self.normalizer.check({'url': ''}))
         self.assertFalse(self.normalizer.check({'url': 'ftp://foo'}))
 
+    def test_routing_gate(self):
+        """The routing gate should only pass for URLs from the CMEMS
+        servers or TOPAZ 5 files
+        """
+        self.assertTrue(normalizers.geospaas.CMEMSMetadataNormalizer.routing_gate(
+            {'url': 'ftp://nrt.cmems-du.eu/Core/foo/bar.nc'}))
+        self.assertTrue(normalizers.geospaas.CMEMSMetadataNormalizer.routing_gate(
+            {'url': 'https://thredds.met.no/20230101_dm-metno-MODEL-topaz5-ARC-b.nc'}))
+        self.assertFalse(normalizers.geospaas.CMEMSMetadataNormalizer.routing_gate(
+            {'url': 'ftp://foo/bar.nc'}))
+        self.assertFalse(normalizers.geospaas.CMEMSMetadataNormalizer.routing_gate({}))
+
+    def test_url_prefixes(self):
+        """url_prefixes should contain url_prefix if it is defined"""
+        self.assertTupleEqual(self.normalizer.url_prefixes, ())
+        self.assertTupleEqual(
+            normalizers.geospaas.CMEMS008046MetadataNormalizer().url_prefixes,
+            ('ftp://nrt.cmems-du.eu/Core/SEALEVEL_GLO_PHY_L4_NRT_OBSERVATIONS_008_046',))
+
     def test_entry_id(self):
         """Test extracting the entry_id from a URL"""
         self.assertEqual(self.normalizer.get_entry_id({'url': 'ftp://foo/bar/baz123.nc'}), 'baz123')
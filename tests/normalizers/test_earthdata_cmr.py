@@ -23,6 +23,38 @@ class EarthdataCMRMetadataNormalizerTestCase(unittest.TestCase):
 
         self.assertFalse(self.normalizer.check({}))
 
+    def test_input_fields(self):
+        """The projection on the input fields should contain everything
+        needed to normalize the metadata
+        """
+        attributes = {
+            'meta': {'provider-id': 'POCLOUD', 'concept-id': 'G1', 'revision-id': 1},
+            'umm': {
+                'GranuleUR': '20190101000000-foo.nc',
+                'CollectionReference': {'ShortName': 'FOO_L2P_GHRSST'},
+                'Platforms': [{'ShortName': 'Terra', 'Instruments': [{'ShortName': 'MODIS'}]}],
+                'TemporalExtent': {'RangeDateTime': {
+                    'BeginningDateTime': '2019-01-01T00:00:00.000Z',
+                    'EndingDateTime': '2019-01-01T00:04:59.000Z'}},
+                'SpatialExtent': {'HorizontalSpatialDomain': {'Geometry': {
+                    'BoundingRectangles': [{
+                        'EastBoundingCoordinate': 10, 'SouthBoundingCoordinate': 0,
+                        'NorthBoundingCoordinate': 10, 'WestBoundingCoordinate': 0}]}}},
+                'RelatedUrls': [{'URL': 'https://foo/bar.nc'}] * 100,
+                'AdditionalAttributes': [{'Name': 'foo', 'Values': ['bar']}] * 100,
+            },
+        }
+        projection = self.normalizer.project(attributes)
+        self.assertNotIn('RelatedUrls', projection['umm'])
+        self.assertNotIn('AdditionalAttributes', projection['umm'])
+        self.assertDictEqual(projection['meta'], {'provider-id': 'POCLOUD'})
+        self.assertTrue(self.normalizer.check(projection))
+        for method in (self.normalizer.get_entry_id, self.normalizer.get_summary,
+                       self.normalizer.get_time_coverage_start,
+                       self.normalizer.get_time_coverage_end,
+                       self.normalizer.get_location_geometry):
+            self.assertEqual(method(projection), method(attributes))
+
     def test_entry_id(self):
         """Test getting the ID"""
         attributes = {
@@ -1,8 +1,10 @@
 """Tests for the base GeoSPaaS normalizer"""
+#pylint: disable=protected-access
 
 import logging
 import unittest
 import unittest.mock as mock
+from collections import OrderedDict
 
 import metanorm.errors as errors
 import metanorm.normalizers as normalizers
@@ -101,6 +103,86 @@ class GeoSPaaSMetadataNormalizerTestCase(unittest.TestCase):
             with self.assertRaises(errors.MetadataNormalizationError):
                 _ = self.normalizer.get_gcmd_location({})
 
+    def test_vocabularies(self):
+        """GeoSPaaS normalizers should declare the pythesint
+        vocabularies
+        """
+        self.assertTupleEqual(self.normalizer.vocabularies, utils.PYTHESINT_VOCABULARIES)
+
+    def test_warm_up(self):
+        """warm_up() should only call the record-independent getters,
+        and log their errors
+        """
+        with mock.patch('pythesint.get_gcmd_location') as mock_get_gcmd_location, \
+                mock.patch('pythesint.get_iso19115_topic_category', side_effect=IndexError), \
+                mock.patch.object(self.normalizer, 'get_entry_title') as mock_get_entry_title:
+            with self.assertLogs('metanorm.normalizers.geospaas.base', level='WARNING'):
+                self.normalizer.warm_up()
+        mock_get_gcmd_location.assert_called_once_with('SEA SURFACE')
+        mock_get_entry_title.assert_not_called()
+
+    def test_normalize_record_independent_fields(self):
+        """The record-independent fields should be computed once, and
+        copies of their value returned
+        """
+        class TestNormalizer(normalizers.geospaas.GeoSPaaSMetadataNormalizer):
+            """Normalizer with record-independent getters"""
+            # not used by the handlers built in other tests
+            abstract = True
+            get_entry_title = mock.Mock(side_effect=lambda raw_metadata: raw_metadata['title'])
+            get_platform = utils.record_independent(
+                mock.Mock(side_effect=lambda raw_metadata: {'Short_Name': 'foo'}))
+
+        for field in TestNormalizer.FIELDS:
+            if field not in ('entry_title', 'platform'):
+                setattr(TestNormalizer, f"get_{field}", mock.Mock())
+        normalizer = TestNormalizer()
+        first_result = normalizer.normalize({'title': 'bar'})
+        first_result['platform']['Short_Name'] = 'modified'
+        second_result = normalizer.normalize({'title': 'baz'})
+        self.assertListEqual(list(second_result), list(TestNormalizer.FIELDS))
+        self.assertEqual(second_result['entry_title'], 'baz')
+        self.assertDictEqual(second_result['platform'], {'Short_Name': 'foo'})
+        TestNormalizer.get_platform.assert_called_once_with({'title': 'bar'})
+        self.assertEqual(TestNormalizer.get_entry_title.call_count, 2)
+
+    def test_copy_containers(self):
+        """The dictionaries and lists should be copied with their type,
+        the other values returned as is
+        """
+        geometry = mock.Mock()
+        value = OrderedDict([('foo', [{'bar': 'baz'}]), ('geometry', geometry)])
+        copied_value = self.normalizer._copy_containers(value)
+        self.assertIsInstance(copied_value, OrderedDict)
+        self.assertEqual(copied_value, value)
+        self.assertIsNot(copied_value, value)
+        self.assertIsNot(copied_value['foo'], value['foo'])
+        self.assertIsNot(copied_value['foo'][0], value['foo'][0])
+        self.assertIs(copied_value['geometry'], geometry)
+
+    def test_record_independent_errors_not_kept(self):
+        """Record-independent getters which raise an exception should
+        be called again
+        """
+        with mock.patch('pythesint.get_gcmd_location',
+                        side_effect=[IndexError, 'location']) as mock_get_gcmd_location:
+            with self.assertRaises(errors.MetadataNormalizationError):
+                self.normalizer._get_field('gcmd_location', {})
+            self.assertEqual(self.normalizer._get_field('gcmd_location', {}), 'location')
+            self.assertEqual(self.normalizer._get_field('gcmd_location', {}), 'location')
+        self.assertEqual(mock_get_gcmd_location.call_count, 2)
+
+    def test_warm_up_record_independent_fields(self):
+        """warm_up() should compute the record-independent fields"""
+        with mock.patch('pythesint.get_gcmd_location', return_value='location'), \
+                mock.patch('pythesint.get_iso19115_topic_category', return_value='category'):
+            self.normalizer.warm_up()
+        self.assertDictEqual(self.normalizer._constant_fields, {
+            'summary': utils.UNKNOWN,
+            'gcmd_location': 'location',
+            'iso_topic_category': 'category',
+        })
+
     def test_get_dataset_parameters(self):
         """Test getting parameters from the 'raw_dataset_parameters'
         attribute
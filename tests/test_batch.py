@@ -0,0 +1,338 @@
+"""Tests for the batch module"""
+#pylint: disable=protected-access
+
+import json
+import os
+import os.path
+import tempfile
+import time
+import unittest
+import unittest.mock as mock
+from datetime import datetime
+
+import metanorm.batch as batch
+import metanorm.errors as errors
+import metanorm.normalizers as normalizers
+
+
+class BatchTestBaseNormalizer(normalizers.MetadataNormalizer):
+    """Base class for the normalizers used in the batch tests"""
+
+    abstract = True
+
+
+class BatchTestNormalizer(BatchTestBaseNormalizer):
+    """Normalizer used in the batch tests"""
+
+    def check(self, raw_metadata):
+        return 'foo' in raw_metadata
+
+    def normalize(self, raw_metadata):
+        if raw_metadata['foo'] == 'error':
+            raise errors.MetadataNormalizationError('error')
+        return {'foo': self.get_foo(raw_metadata), 'time': datetime(2020, 1, 1)}
+
+    def get_foo(self, raw_metadata):
+        """Loops forever on 'slow' metadata"""
+        while raw_metadata['foo'] == 'slow':
+            pass
+        return raw_metadata['foo']
+
+
+class ShardedBatchRunnerTestCase(unittest.TestCase):
+    """Tests for the ShardedBatchRunner class"""
+
+    RECORDS = [{'foo': 1}, {'bar': 2}, {'foo': 'error'}, {'foo': 4}, {'foo': 5}]
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.work_dir = os.path.join(self.temp_dir.name, 'work')
+        self.input_path = os.path.join(self.temp_dir.name, 'input.jsonl')
+        with open(self.input_path, 'w', encoding='utf-8') as input_file:
+            for record in self.RECORDS:
+                input_file.write(json.dumps(record) + '\n')
+            input_file.write('\n')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def runner(self, **kwargs):
+        """Returns a runner working in the temporary directory"""
+        arguments = {'base_class': BatchTestBaseNormalizer, 'records_per_shard': 2,
+                     'workers': 0, 'checkpoint_interval': 1}
+        arguments.update(kwargs)
+        return batch.ShardedBatchRunner(self.work_dir, **arguments)
+
+    def read_output(self, runner):
+        """Returns the documents written by the runner, in order"""
+        documents = []
+        for shard in runner.shards():
+            with open(runner._path('output', shard, 'jsonl'), encoding='utf-8') as output:
+                documents.append([json.loads(line) for line in output])
+        return documents
+
+    def check_output(self, runner):
+        """Check the output of the normalization of RECORDS"""
+        self.assertListEqual(self.read_output(runner), [
+            [
+                {'index': 0, 'result': {'foo': 1, 'time': '2020-01-01T00:00:00'}},
+                {'index': 1, 'error': {'type': 'NoNormalizerFound',
+                                       'message': mock.ANY}},
+            ],
+            [
+                {'index': 0, 'error': {'type': 'MetadataNormalizationError',
+                                       'message': 'error'}},
+                {'index': 1, 'result': {'foo': 4, 'time': '2020-01-01T00:00:00'}},
+            ],
+            [
+                {'index': 0, 'result': {'foo': 5, 'time': '2020-01-01T00:00:00'}},
+            ],
+        ])
+
+    def test_split(self):
+        """The input should be split in shards of the requested size,
+        ignoring empty lines
+        """
+        runner = self.runner()
+        self.assertIsNone(runner.shards())
+        shards = runner.split(self.input_path)
+        self.assertListEqual(shards, ['shard-000000', 'shard-000001', 'shard-000002'])
+        with open(runner._path('shards', 'shard-000002', 'jsonl'), encoding='utf-8') as shard:
+            self.assertEqual(shard.read(), '{"foo": 5}\n')
+        self.assertFalse(os.path.exists(os.path.join(self.work_dir, 'locks', 'split.lock')))
+
+    def test_split_only_once(self):
+        """The input should not be split again if it was already"""
+        self.runner().split(self.input_path)
+        runner = self.runner()
+        with mock.patch.object(runner, '_split') as mock_split:
+            runner.split(self.input_path)
+        mock_split.assert_not_called()
+
+    def test_run(self):
+        """All shards should be normalized and marked as done"""
+        runner = self.runner()
+        self.assertListEqual(runner.run(self.input_path),
+                             ['shard-000000', 'shard-000001', 'shard-000002'])
+        self.check_output(runner)
+        for shard in runner.shards():
+            self.assertTrue(runner.is_done(shard))
+            self.assertFalse(os.path.exists(runner._path('locks', shard, 'lock')))
+        self.assertListEqual(self.runner().run(self.input_path), [])
+
+    def test_run_with_workers(self):
+        """The records can be normalized by worker processes"""
+        runner = self.runner(workers=1)
+        runner.run(self.input_path)
+        self.check_output(runner)
+
+    def test_claim_locked_shard(self):
+        """A shard locked by a live runner should not be claimed"""
+        first_runner = self.runner()
+        first_runner.split(self.input_path)
+        second_runner = self.runner()
+        self.assertEqual(first_runner.claim(), 'shard-000000')
+        self.assertEqual(second_runner.claim(), 'shard-000001')
+        self.assertEqual(second_runner.claim(), 'shard-000002')
+        self.assertIsNone(second_runner.claim())
+
+    def test_reclaim_stale_lock(self):
+        """The lock of a runner which did not checkpoint for longer
+        than `stale_after` should be taken over
+        """
+        first_runner = self.runner()
+        first_runner.split(self.input_path)
+        self.assertEqual(first_runner.claim(), 'shard-000000')
+        lock_path = first_runner._path('locks', 'shard-000000', 'lock')
+        stale_time = time.time() - 60
+        os.utime(lock_path, (stale_time, stale_time))
+
+        second_runner = self.runner(stale_after=30)
+        self.assertEqual(second_runner.claim(), 'shard-000000')
+        self.assertTrue(second_runner._owns(lock_path))
+        self.assertFalse(first_runner._owns(lock_path))
+        # the first runner stops at its next checkpoint
+        with self.assertRaises(RuntimeError):
+            first_runner.process('shard-000000')
+        self.assertTrue(os.path.exists(lock_path))
+
+    def test_stale_lock_race(self):
+        """A fresh lock created by another runner between the staleness
+        check and the rename should be put back
+        """
+        runner = self.runner(stale_after=30)
+        runner.split(self.input_path)
+        lock_path = runner._path('locks', 'shard-000000', 'lock')
+        other_runner = self.runner()
+        self.assertTrue(other_runner._acquire(lock_path))
+
+        original_stat = os.stat
+        def stale_stat(path, *args, **kwargs):
+            # the first check sees the stale lock which another runner
+            # has replaced in the meantime
+            if path == lock_path:
+                return os.stat_result((0,) * 7 + (0, time.time() - 60, 0))
+            return original_stat(path, *args, **kwargs)
+
+        with mock.patch('os.stat', side_effect=stale_stat):
+            self.assertFalse(runner._acquire(lock_path))
+        self.assertTrue(other_runner._owns(lock_path))
+        self.assertListEqual(os.listdir(os.path.dirname(lock_path)), ['shard-000000.lock'])
+
+    def test_run_lock_lost(self):
+        """A runner whose lock was taken over should move on to the next
+        shard
+        """
+        runner = self.runner()
+        runner.split(self.input_path)
+        original_process = runner.process
+        def process(shard):
+            if shard == 'shard-000000':
+                # another runner takes over the shard and finishes it
+                os.remove(runner._path('locks', shard, 'lock'))
+                with open(runner._path('done', shard, 'done'), 'w', encoding='utf-8'):
+                    pass
+                raise batch.LockLost('lost')
+            return original_process(shard)
+
+        with mock.patch.object(runner, 'process', side_effect=process), \
+                self.assertLogs(batch.logger, level='WARNING'):
+            self.assertListEqual(runner.run(self.input_path), ['shard-000001', 'shard-000002'])
+
+    def test_run_wait_for_other_runners(self):
+        """run() should wait for the shards locked by other runners, and
+        take them over if their locks become stale
+        """
+        first_runner = self.runner(stale_after=30)
+        first_runner.split(self.input_path)
+        self.assertEqual(first_runner.claim(), 'shard-000000')
+        lock_path = first_runner._path('locks', 'shard-000000', 'lock')
+
+        def make_stale(_):
+            stale_time = time.time() - 60
+            os.utime(lock_path, (stale_time, stale_time))
+
+        second_runner = self.runner(stale_after=30)
+        with mock.patch('time.sleep', side_effect=make_stale) as mock_sleep:
+            self.assertListEqual(second_runner.run(self.input_path),
+                                 ['shard-000001', 'shard-000002', 'shard-000000'])
+        mock_sleep.assert_called_once()
+        self.check_output(second_runner)
+
+    def test_resume_from_checkpoint(self):
+        """An interrupted shard should be resumed from its last
+        checkpoint, discarding the output written after it
+        """
+        runner = self.runner(records_per_shard=5, checkpoint_interval=2)
+        runner.split(self.input_path)
+        shard = runner.claim()
+
+        original_serialize = runner._serialize
+        def interrupt(index, result):
+            if index == 3:
+                raise KeyboardInterrupt()
+            return original_serialize(index, result)
+
+        with mock.patch.object(runner, '_serialize', side_effect=interrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                runner.process(shard)
+        self.assertFalse(runner.is_done(shard))
+        self.assertEqual(runner._read_checkpoint(shard)['offset'], 2)
+        # simulate output written after the checkpoint
+        checkpoint = runner._read_checkpoint(shard)
+        with open(os.path.join(self.work_dir, 'output', checkpoint['output']), 'a',
+                  encoding='utf-8') as output:
+            output.write('{"partial')
+
+        resumed_runner = self.runner(records_per_shard=5, checkpoint_interval=2)
+        with mock.patch.object(resumed_runner, '_records',
+                               wraps=resumed_runner._records) as mock_records:
+            self.assertListEqual(resumed_runner.run(self.input_path), [shard])
+        mock_records.assert_called_once_with(shard, 2)
+        self.assertListEqual(
+            [document['index'] for document in self.read_output(resumed_runner)[0]],
+            [0, 1, 2, 3, 4])
+        self.assertEqual(resumed_runner._read_checkpoint(shard)['offset'], 5)
+        self.assertListEqual(os.listdir(os.path.join(self.work_dir, 'output')),
+                             [f"{shard}.jsonl"])
+
+    def test_missing_committed_output(self):
+        """A shard should be restarted if the output of its last
+        checkpoint is missing
+        """
+        runner = self.runner()
+        runner.split(self.input_path)
+        shard = runner.claim()
+        with open(runner._path('checkpoints', shard, 'json'), 'w', encoding='utf-8') as checkpoint:
+            json.dump({'offset': 1, 'output': 'missing.part', 'output_size': 10}, checkpoint)
+        with self.assertLogs(batch.logger, level='WARNING'):
+            runner.process(shard)
+        with open(runner._path('output', shard, 'jsonl'), encoding='utf-8') as output:
+            self.assertListEqual([json.loads(line)['index'] for line in output], [0, 1])
+
+    def test_stale_owner_output(self):
+        """A runner whose lock was taken over should not write in the
+        output of the new owner
+        """
+        first_runner = self.runner(records_per_shard=5, checkpoint_interval=2, stale_after=30)
+        first_runner.split(self.input_path)
+        shard = first_runner.claim()
+        lock_path = first_runner._path('locks', shard, 'lock')
+        second_runner = self.runner(records_per_shard=5, checkpoint_interval=2, stale_after=30)
+
+        original_serialize = first_runner._serialize
+        def take_over(index, result):
+            # the second runner takes over after the first checkpoint
+            # of the first one, and processes the whole shard while
+            # the first one is still writing
+            if index == 3:
+                stale_time = time.time() - 60
+                os.utime(lock_path, (stale_time, stale_time))
+                self.assertEqual(second_runner.claim(), shard)
+                second_runner.process(shard)
+            return original_serialize(index, result)
+
+        with mock.patch.object(first_runner, '_serialize', side_effect=take_over):
+            with self.assertRaises(RuntimeError):
+                first_runner.process(shard)
+        self.assertTrue(second_runner.is_done(shard))
+        self.assertListEqual(
+            [document['index'] for document in self.read_output(second_runner)[0]],
+            [0, 1, 2, 3, 4])
+
+    def test_malformed_lines(self):
+        """Lines which are not valid JSON should be written as errors
+        without interrupting the shard
+        """
+        with open(self.input_path, 'w', encoding='utf-8') as input_file:
+            input_file.write('{"foo": 1}\n{"foo\n{"foo": 3}\nnot json\n')
+        for workers in (0, 1):
+            with self.subTest(workers=workers):
+                self.work_dir = os.path.join(self.temp_dir.name, f"work-{workers}")
+                runner = self.runner(records_per_shard=5, workers=workers)
+                runner.run(self.input_path)
+                documents = self.read_output(runner)[0]
+                self.assertListEqual([document['index'] for document in documents],
+                                     [0, 1, 2, 3])
+                self.assertEqual(documents[0]['result']['foo'], 1)
+                self.assertEqual(documents[1]['error']['type'], 'JSONDecodeError')
+                self.assertEqual(documents[2]['result']['foo'], 3)
+                self.assertEqual(documents[3]['error']['type'], 'JSONDecodeError')
+
+    def test_time_budget(self):
+        """Records which exceed the time budget should be written as
+        timeouts with the normalizer and the field
+        """
+        with open(self.input_path, 'w', encoding='utf-8') as input_file:
+            input_file.write('{"foo": "slow"}\n{"foo": 2}\n')
+        runner = self.runner(time_budget=0.05)
+        runner.run(self.input_path)
+        self.assertDictEqual(self.read_output(runner)[0][0], {'index': 0, 'error': {
+            'type': 'NormalizationTimeout', 'message': mock.ANY,
+            'normalizer': 'BatchTestNormalizer', 'field': 'foo'}})
+        self.assertEqual(self.read_output(runner)[0][1]['result']['foo'], 2)
+
+    def test_json_default(self):
+        """Unsupported values should raise a TypeError"""
+        with self.assertRaises(TypeError):
+            batch._json_default(object())
@@ -0,0 +1,380 @@
+"""Tests for the dispatch module"""
+
+import pickle
+import threading
+import unittest
+import unittest.mock as mock
+
+import metanorm.dispatch as dispatch
+
+
+class PrefixTrieTestCase(unittest.TestCase):
+    """Tests for the PrefixTrie class"""
+
+    def setUp(self):
+        self.trie = dispatch.PrefixTrie()
+        self.trie.insert('ftp://foo', 'foo')
+        self.trie.insert('ftp://foo/bar', 'bar')
+        self.trie.insert('ftp://foo/bar', 'bar2')
+        self.trie.insert('https://baz', 'baz')
+
+    def test_lookup(self):
+        """lookup() should return the values of all the matching
+        prefixes, longest first
+        """
+        self.assertListEqual(self.trie.lookup('ftp://foo/bar/qux.nc'), ['bar', 'bar2', 'foo'])
+        self.assertListEqual(self.trie.lookup('ftp://foo/baz.nc'), ['foo'])
+        self.assertListEqual(self.trie.lookup('https://baz'), ['baz'])
+
+    def test_lookup_no_match(self):
+        """lookup() should return an empty list if no prefix matches"""
+        self.assertListEqual(self.trie.lookup('ftp://fo'), [])
+        self.assertListEqual(self.trie.lookup('http://foo'), [])
+        self.assertListEqual(self.trie.lookup(''), [])
+
+    def test_empty_prefix(self):
+        """An empty prefix matches any string"""
+        self.trie.insert('', 'any')
+        self.assertListEqual(self.trie.lookup('qux'), ['any'])
+        self.assertListEqual(self.trie.lookup('ftp://foo'), ['foo', 'any'])
+
+    def test_bool(self):
+        """A trie is truthy only if it contains prefixes"""
+        self.assertTrue(self.trie)
+        self.assertFalse(dispatch.PrefixTrie())
+
+
+class KeySignatureIndexTestCase(unittest.TestCase):
+    """Tests for the KeySignatureIndex class"""
+
+    def setUp(self):
+        self.index = dispatch.KeySignatureIndex()
+        self.index.insert(('foo', 'bar'), 'foobar')
+        self.index.insert(('bar',), 'bar')
+        self.index.insert(('baz', 'qux', 'bar'), 'bazquxbar')
+
+    def test_signature(self):
+        """Unknown keys should not be part of the signature"""
+        self.assertEqual(self.index.signature(('foo', 'unknown')), self.index.signature(('foo',)))
+        self.assertEqual(self.index.signature(()), 0)
+
+    def test_lookup(self):
+        """lookup() should return the values whose required keys are
+        all present, in insertion order
+        """
+        self.assertListEqual(self.index.lookup({'foo': 1, 'bar': 2}.keys()), ['foobar', 'bar'])
+        self.assertListEqual(
+            self.index.lookup(('qux', 'bar', 'baz', 'foo', 'other')),
+            ['foobar', 'bar', 'bazquxbar'])
+        self.assertListEqual(self.index.lookup(('foo', 'baz', 'qux')), [])
+
+    def test_bool(self):
+        """An index is truthy only if it contains entries"""
+        self.assertTrue(self.index)
+        self.assertFalse(dispatch.KeySignatureIndex())
+
+
+class SubstringAutomatonTestCase(unittest.TestCase):
+    """Tests for the SubstringAutomaton class"""
+
+    def setUp(self):
+        self.automaton = dispatch.SubstringAutomaton()
+        self.automaton.insert('he', 'he')
+        self.automaton.insert('she', 'she')
+        self.automaton.insert('his', 'his')
+        self.automaton.insert('hers', 'hers')
+
+    def test_lookup(self):
+        """lookup() should return the values of all the contained
+        substrings in order of first occurrence, including overlapping
+        substrings
+        """
+        self.assertListEqual(self.automaton.lookup('ushers'), ['she', 'he', 'hers'])
+        self.assertListEqual(self.automaton.lookup('this is his'), ['his'])
+        self.assertListEqual(self.automaton.lookup('he said he'), ['he'])
+
+    def test_lookup_no_match(self):
+        """lookup() should return an empty list if no substring is
+        contained in the string
+        """
+        self.assertListEqual(self.automaton.lookup('foo'), [])
+        self.assertListEqual(self.automaton.lookup(''), [])
+
+    def test_same_value_multiple_substrings(self):
+        """A value associated with several substrings should be
+        returned only once
+        """
+        self.automaton.insert('foo', 'multi')
+        self.automaton.insert('bar', 'multi')
+        self.assertListEqual(self.automaton.lookup('barfoo'), ['multi'])
+
+    def test_insert_after_lookup(self):
+        """Substrings inserted after a lookup should be found"""
+        self.automaton.lookup('she')
+        self.automaton.insert('sh', 'sh')
+        self.assertListEqual(self.automaton.lookup('she'), ['sh', 'she', 'he'])
+
+    def test_insert_empty_substring(self):
+        """Empty substrings should be rejected"""
+        with self.assertRaises(ValueError):
+            self.automaton.insert('', 'empty')
+
+    def test_consistent_with_in_operator(self):
+        """The result should match a naive search"""
+        automaton = dispatch.SubstringAutomaton()
+        markers = ('-metno-MODEL-topaz5-ARC-', '-metno-MODEL-topaz5_ecosmo-ARC-', 'tabledap',
+                   'aviso.altimetry.fr', 'aaab', 'ab', 'b')
+        for marker in markers:
+            automaton.insert(marker, marker)
+        for string in ('https://thredds.met.no/20230101_dm-metno-MODEL-topaz5_ecosmo-ARC-b.nc',
+                       'https://erddap/tabledap/aviso.altimetry.fr', 'aaaaab', 'foo'):
+            self.assertCountEqual(
+                automaton.lookup(string),
+                [marker for marker in markers if marker in string])
+
+    def test_pickle(self):
+        """An automaton should still work after being pickled"""
+        automaton = pickle.loads(pickle.dumps(self.automaton))
+        self.assertListEqual(automaton.lookup('ushers'), ['she', 'he', 'hers'])
+        automaton.insert('us', 'us')
+        self.assertListEqual(automaton.lookup('ushers'), ['us', 'she', 'he', 'hers'])
+
+    def test_bool(self):
+        """An automaton is truthy only if it contains substrings"""
+        self.assertTrue(self.automaton)
+        self.assertFalse(dispatch.SubstringAutomaton())
+
+
+class TokenIndexTestCase(unittest.TestCase):
+    """Tests for the TokenIndex class"""
+
+    TEXTS = ["{'short_name': 'sentinel-1a'}", "{'short_name': 'sentinel-2b'}", "{'foo': 'bar'}"]
+
+    def setUp(self):
+        self.index = dispatch.TokenIndex(self.TEXTS)
+
+    def test_find(self):
+        """find() should return the same positions as a substring
+        search in each text
+        """
+        for substring in ('sentinel', 'sentinel-1', 'nel-2', '1a', "name': 'sen", 'foo',
+                          'short_name', "'", '-', '', 'baz', 'sentinel-1b', "'sentinel-",
+                          "-2b'", "ame': 'sentinel-2", "{'foo'}", 'tinel-1a'):
+            with self.subTest(substring=substring):
+                self.assertSetEqual(
+                    self.index.find(substring),
+                    {position for position, text in enumerate(self.TEXTS) if substring in text})
+
+    def test_find_memoized(self):
+        """The results should be memoized"""
+        self.assertIs(self.index.find('sentinel'), self.index.find('sentinel'))
+
+    def test_find_exact_tokens(self):
+        """The tokens delimited on both sides should be looked up in the
+        index without scanning the other tokens
+        """
+        with mock.patch.object(self.index, '_contains_part') as mock_contains_part:
+            self.assertSetEqual(self.index.find("'sentinel-1a'"), {0})
+        mock_contains_part.assert_not_called()
+
+    def test_find_cache_size(self):
+        """Only the last `cache_size` results should be kept"""
+        index = dispatch.TokenIndex(self.TEXTS, cache_size=1)
+        matches = index.find('sentinel')
+        index.find('foo')
+        self.assertIsNot(index.find('sentinel'), matches)
+
+
+class LRUCacheTestCase(unittest.TestCase):
+    """Tests for the LRUCache class"""
+
+    def setUp(self):
+        self.cache = dispatch.LRUCache(2)
+
+    def test_get_put(self):
+        """Values should be retrieved and hits and misses counted"""
+        self.assertIsNone(self.cache.get('foo'))
+        self.cache.put('foo', 1)
+        self.assertEqual(self.cache.get('foo'), 1)
+        self.assertEqual(self.cache.get('bar', 'default'), 'default')
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+    def test_eviction(self):
+        """The least recently used entry should be discarded when the
+        cache is full
+        """
+        self.cache.put('foo', 1)
+        self.cache.put('bar', 2)
+        self.cache.get('foo')
+        self.cache.put('baz', 3)
+        self.assertIn('foo', self.cache)
+        self.assertNotIn('bar', self.cache)
+        self.assertIn('baz', self.cache)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_validate(self):
+        """Entries which are not valid should be discarded and counted
+        as misses
+        """
+        self.cache.put('foo', 1)
+        self.assertIsNone(self.cache.get('foo', validate=lambda value: value > 1))
+        self.assertNotIn('foo', self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+
+    def test_disabled(self):
+        """A cache with a size of 0 should not store anything"""
+        cache = dispatch.LRUCache(0)
+        cache.put('foo', 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_discard_clear(self):
+        """Test removing entries"""
+        self.cache.put('foo', 1)
+        self.cache.put('bar', 2)
+        self.cache.discard('foo')
+        self.cache.discard('baz')
+        self.assertNotIn('foo', self.cache)
+        self.cache.get('bar')
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 0))
+
+    def test_stats(self):
+        """Test the statistics"""
+        self.assertDictEqual(
+            self.cache.stats(),
+            {'hits': 0, 'misses': 0, 'hit_rate': 0., 'size': 0, 'maxsize': 2})
+        self.cache.put('foo', 1)
+        self.cache.get('foo')
+        self.cache.get('foo')
+        self.cache.get('bar')
+        self.cache.get('foo')
+        self.assertDictEqual(
+            self.cache.stats(),
+            {'hits': 3, 'misses': 1, 'hit_rate': 0.75, 'size': 1, 'maxsize': 2})
+
+    def test_pickle(self):
+        """A cache should keep its entries and counters when pickled"""
+        self.cache.put('foo', 1)
+        self.cache.get('foo')
+        cache = pickle.loads(pickle.dumps(self.cache))
+        self.assertEqual(cache.get('foo'), 1)
+        self.assertEqual((cache.hits, cache.misses), (2, 0))
+        cache.put('bar', 2)
+        self.assertNotIn('bar', self.cache)
+
+    def test_concurrent_access(self):
+        """The cache should stay consistent when used by several
+        threads
+        """
+        cache = dispatch.LRUCache(10)
+
+        def use_cache(offset):
+            for i in range(1000):
+                key = (i + offset) % 20
+                if cache.get(key, validate=lambda value, key=key: value == key) is None:
+                    cache.put(key, key)
+
+        threads = [threading.Thread(target=use_cache, args=(offset,)) for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache.hits + cache.misses, 8000)
+        self.assertLessEqual(len(cache), 10)
+
+
+    def test_items_update(self):
+        """items() should list the entries from the least to the most
+        recently used, and update() should put them in a cache
+        """
+        self.cache.put('foo', 1)
+        self.cache.put('bar', 2)
+        self.cache.get('foo')
+        self.assertListEqual(self.cache.items(), [('bar', 2), ('foo', 1)])
+        other_cache = dispatch.LRUCache(2)
+        other_cache.update(self.cache.items())
+        self.assertListEqual(other_cache.items(), [('bar', 2), ('foo', 1)])
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    """Tests for the CircuitBreaker class"""
+
+    def setUp(self):
+        self.breaker = dispatch.CircuitBreaker(0.5, window=4, cooldown=10)
+
+    def test_invalid_failure_rate(self):
+        """The failure rate must be between 0 and 1"""
+        with self.assertRaises(ValueError):
+            dispatch.CircuitBreaker(0)
+        with self.assertRaises(ValueError):
+            dispatch.CircuitBreaker(1.5)
+
+    def test_open_circuit(self):
+        """The circuit should open when the failure rate is reached over
+        a full window, and refuse the calls during the cooldown
+        """
+        with mock.patch('time.monotonic', return_value=100):
+            for success in (False, False, True):
+                self.assertTrue(self.breaker.allow('foo'))
+                self.assertIsNone(self.breaker.record('foo', success))
+            self.assertEqual(self.breaker.record('foo', True), dispatch.CircuitBreaker.OPEN)
+            self.assertFalse(self.breaker.allow('foo'))
+            self.assertFalse(self.breaker.allow('foo'))
+            self.assertTrue(self.breaker.allow('bar'))
+            # outcomes of calls allowed before the opening are ignored
+            self.assertIsNone(self.breaker.record('foo', False))
+            self.assertDictEqual(self.breaker.status(), {
+                'foo': {'state': 'open', 'failures': 2, 'calls': 4, 'rejected': 2}})
+
+    def test_successful_trial(self):
+        """After the cooldown, one trial call is allowed, and the
+        circuit is closed if it succeeds
+        """
+        with mock.patch('time.monotonic', return_value=100):
+            for _ in range(4):
+                self.breaker.record('foo', False)
+        with mock.patch('time.monotonic', return_value=110):
+            self.assertEqual(self.breaker.status()['foo']['state'], 'half-open')
+            self.assertTrue(self.breaker.allow('foo'))
+            self.assertFalse(self.breaker.allow('foo'))
+            self.assertEqual(self.breaker.record('foo', True), dispatch.CircuitBreaker.CLOSED)
+            self.assertTrue(self.breaker.allow('foo'))
+            self.assertDictEqual(self.breaker.status(), {})
+
+    def test_failed_trial(self):
+        """The circuit should be opened again if the trial call fails
+        """
+        with mock.patch('time.monotonic', return_value=100):
+            for _ in range(4):
+                self.breaker.record('foo', False)
+        with mock.patch('time.monotonic', return_value=110):
+            self.assertTrue(self.breaker.allow('foo'))
+            self.assertEqual(self.breaker.record('foo', False), dispatch.CircuitBreaker.OPEN)
+            self.assertFalse(self.breaker.allow('foo'))
+        with mock.patch('time.monotonic', return_value=120):
+            self.assertTrue(self.breaker.allow('foo'))
+
+    def test_released_trial(self):
+        """A trial call released without outcome should allow another
+        trial
+        """
+        with mock.patch('time.monotonic', return_value=100):
+            for _ in range(4):
+                self.breaker.record('foo', False)
+        with mock.patch('time.monotonic', return_value=110):
+            self.assertTrue(self.breaker.allow('foo'))
+            self.assertFalse(self.breaker.allow('foo'))
+            self.breaker.release('foo')
+            self.assertEqual(self.breaker.status()['foo']['state'], 'half-open')
+            self.assertTrue(self.breaker.allow('foo'))
+
+    def test_pickle(self):
+        """Only the configuration should be pickled"""
+        for _ in range(4):
+            self.breaker.record('foo', False)
+        unpickled = pickle.loads(pickle.dumps(self.breaker))
+        self.assertEqual((unpickled.failure_rate, unpickled.window, unpickled.cooldown),
+                         (0.5, 4, 10))
+        self.assertTrue(unpickled.allow('foo'))
+        self.assertDictEqual(unpickled.status(), {})
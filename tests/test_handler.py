@@ -1,9 +1,16 @@
 """Tests for the metadata handler"""
 #pylint: disable=protected-access
 
+import asyncio
+import concurrent.futures
+import os.path
+import tempfile
+import threading
+import time
 import unittest
 import unittest.mock as mock
 
+import metanorm.dispatch as dispatch
 import metanorm.errors as errors
 import metanorm.handlers as handlers
 import metanorm.normalizers as normalizers
@@ -51,13 +58,48 @@ class MetadataHandlerTestCase(unittest.TestCase):
     class TestNormalizer3(TestNormalizer2):
         """Test normalizer"""
 
+        required_keys = frozenset(('baz', 'qux', 'quux'))
+
         def check(self, raw_metadata):
-            return set(('baz', 'qux', 'quux')).issubset(raw_metadata.keys())
+            return self.required_keys.issubset(raw_metadata.keys())
 
         def get_bar(self, raw_metadata):
             return f"{raw_metadata['qux']}, {raw_metadata['quux']}"
 
 
+    class TestURLNormalizer(TestBaseNormalizer):
+        """Test normalizer which declares URL prefixes"""
+
+        url_prefixes = ('ftp://foo/', 'https://foo/')
+        routing_tags = ('foo_url',)
+
+        def check(self, raw_metadata):
+            return raw_metadata.get('url', '').startswith(self.url_prefixes)
+
+        def get_foo(self, raw_metadata):
+            return 'url'
+
+        def get_bar(self, raw_metadata):
+            return raw_metadata['url']
+
+
+    class TestMarkerNormalizer(TestBaseNormalizer):
+        """Test normalizer which declares URL markers and can also be
+        identified otherwise
+        """
+
+        url_markers = ('/marker/',)
+        url_routing_is_exhaustive = False
+
+        def check(self, raw_metadata):
+            return '/marker/' in (raw_metadata.get('url') or '') or 'marker' in raw_metadata
+
+        def get_foo(self, raw_metadata):
+            return 'marker'
+
+        def get_bar(self, raw_metadata):
+            return raw_metadata.get('url')
+
     def setUp(self):
         self.handler = handlers.MetadataHandler(self.TestBaseNormalizer)
 
@@ -66,7 +108,8 @@ class MetadataHandlerTestCase(unittest.TestCase):
         inherit from a base class
         """
         self.assertCountEqual(
-            (self.TestNormalizer1, self.TestNormalizer2, self.TestNormalizer3),
+            (self.TestNormalizer1, self.TestNormalizer2, self.TestNormalizer3,
+             self.TestURLNormalizer, self.TestMarkerNormalizer),
             (n.__class__ for n in self.handler.normalizers))
 
     def test_default_instantiation(self):
@@ -101,3 +144,894 @@ class MetadataHandlerTestCase(unittest.TestCase):
         """
         with self.assertRaises(errors.NoNormalizerFound):
             self.handler.get_parameters({'something': 'something'})
+
+    def test_url_prefix_routing(self):
+        """Normalizers which declare URL prefixes should be found
+        without checking the other normalizers
+        """
+        with mock.patch.object(self.TestNormalizer1, 'check') as mock_check1, \
+                mock.patch.object(self.TestNormalizer3, 'check') as mock_check3:
+            self.assertDictEqual(
+                self.handler.get_parameters({'url': 'https://foo/bar.nc'}),
+                {'foo': 'url', 'bar': 'https://foo/bar.nc'})
+        mock_check1.assert_not_called()
+        mock_check3.assert_not_called()
+
+    def test_url_prefix_routing_check_fails(self):
+        """If the check() method of a normalizer found using its URL
+        prefixes returns False, the other normalizers should be tried
+        """
+        with mock.patch.object(self.TestURLNormalizer, 'check', return_value=False):
+            self.assertDictEqual(
+                self.handler.get_parameters({'url': 'ftp://foo/bar.nc', 'foo': 1, 'bar': 2}),
+                {'foo': 1, 'bar': 2})
+
+    def test_url_prefix_not_checked_without_match(self):
+        """Normalizers which declare URL prefixes should not be checked
+        if the URL does not start with one of them
+        """
+        with mock.patch.object(self.TestURLNormalizer, 'check') as mock_check:
+            with self.assertRaises(errors.NoNormalizerFound):
+                self.handler.get_parameters({'url': 'ftp://bar/baz.nc'})
+            with self.assertRaises(errors.NoNormalizerFound):
+                self.handler.get_parameters({'url': None})
+        mock_check.assert_not_called()
+
+    def test_required_keys_routing(self):
+        """Normalizers whose required keys are missing from the
+        metadata should not be checked
+        """
+        with mock.patch.object(self.TestNormalizer3, 'check') as mock_check:
+            with self.assertRaises(errors.NoNormalizerFound):
+                self.handler.get_parameters({'baz': 1, 'qux': 2})
+        mock_check.assert_not_called()
+
+        self.assertDictEqual(
+            self.handler.get_parameters({'baz': 1, 'qux': 2, 'quux': 3}),
+            {'foo': 1, 'bar': '2, 3'})
+
+    def test_url_marker_routing(self):
+        """Normalizers which declare URL markers should be found
+        without checking the other normalizers
+        """
+        with mock.patch.object(self.TestNormalizer1, 'check') as mock_check:
+            self.assertDictEqual(
+                self.handler.get_parameters({'url': 'http://bar/marker/baz.nc'}),
+                {'foo': 'marker', 'bar': 'http://bar/marker/baz.nc'})
+        mock_check.assert_not_called()
+
+    def test_non_exhaustive_url_routing(self):
+        """Normalizers whose URL routing is not exhaustive should be
+        checked even if their markers are not found
+        """
+        self.assertDictEqual(
+            self.handler.get_parameters({'url': 'http://bar/baz.nc', 'marker': True}),
+            {'foo': 'marker', 'bar': 'http://bar/baz.nc'})
+        self.assertDictEqual(
+            self.handler.get_parameters({'marker': True}),
+            {'foo': 'marker', 'bar': None})
+
+    def test_non_exhaustive_url_routing_checked_once(self):
+        """A normalizer found by its markers should not be checked
+        again as an unindexed normalizer
+        """
+        with mock.patch.object(self.TestMarkerNormalizer, 'check',
+                               return_value=False) as mock_check:
+            with self.assertRaises(errors.NoNormalizerFound):
+                self.handler.get_parameters({'url': 'http://bar/marker/baz.nc'})
+        mock_check.assert_called_once()
+
+    def test_default_ordering(self):
+        """Normalizers should be sorted by decreasing priority, then by
+        name
+        """
+        with mock.patch.object(self.TestNormalizer3, 'check_priority', 1):
+            handler = handlers.MetadataHandler(self.TestBaseNormalizer)
+        self.assertTupleEqual(
+            handler.ordering,
+            ('TestNormalizer3', 'TestMarkerNormalizer', 'TestNormalizer1', 'TestNormalizer2',
+             'TestURLNormalizer'))
+        self.assertListEqual(handler.ordering_history, [(0, handler.ordering)])
+
+    def test_priority(self):
+        """When several normalizers can deal with some metadata, the
+        one with the highest priority should be used
+        """
+        raw_metadata = {'url': 'ftp://foo/bar.nc', 'foo': 1, 'bar': 2}
+        self.assertDictEqual(
+            self.handler.get_parameters(raw_metadata),
+            {'foo': 'url', 'bar': 'ftp://foo/bar.nc'})
+        with mock.patch.object(self.TestNormalizer1, 'check_priority', 1):
+            handler = handlers.MetadataHandler(self.TestBaseNormalizer)
+        self.assertDictEqual(handler.get_parameters(raw_metadata), {'foo': 1, 'bar': 2})
+
+    def test_adaptive_ordering(self):
+        """In adaptive mode, normalizers should be reordered by
+        decreasing number of matches every `reordering_interval`
+        lookups
+        """
+        handler = handlers.MetadataHandler(
+            self.TestBaseNormalizer, adaptive_ordering=True, reordering_interval=3)
+        initial_ordering = handler.ordering
+        handler.get_parameters({'baz': 1, 'qux': 2, 'quux': 3})
+        handler.get_parameters({'url': 'ftp://foo/bar.nc'})
+        self.assertTupleEqual(handler.ordering, initial_ordering)
+        with self.assertRaises(errors.NoNormalizerFound):
+            handler.get_parameters({})
+
+        self.assertEqual(handler.lookups_count, 3)
+        self.assertDictEqual(
+            dict(handler.match_counts),
+            {self.TestNormalizer3: 1, self.TestURLNormalizer: 1})
+        self.assertTupleEqual(
+            handler.ordering,
+            ('TestNormalizer3', 'TestURLNormalizer', 'TestMarkerNormalizer', 'TestNormalizer1',
+             'TestNormalizer2'))
+        self.assertListEqual(
+            handler.ordering_history,
+            [(0, initial_ordering), (3, handler.ordering)])
+
+    def test_adaptive_ordering_respects_priority(self):
+        """Reordering should not put normalizers before normalizers
+        which have a higher priority
+        """
+        with mock.patch.object(self.TestNormalizer1, 'check_priority', 1):
+            handler = handlers.MetadataHandler(
+                self.TestBaseNormalizer, adaptive_ordering=True, reordering_interval=1)
+            handler.get_parameters({'url': 'ftp://foo/bar.nc'})
+        self.assertEqual(handler.ordering[:2], ('TestNormalizer1', 'TestURLNormalizer'))
+
+    def test_no_reordering_history_without_change(self):
+        """The ordering history should only be updated when the order
+        changes
+        """
+        handler = handlers.MetadataHandler(self.TestBaseNormalizer)
+        handler.reorder_normalizers()
+        self.assertEqual(len(handler.ordering_history), 1)
+
+    def test_no_counting_by_default(self):
+        """Matches should not be counted if the adaptive mode is off"""
+        self.handler.get_parameters({'foo': 1, 'bar': 2})
+        self.assertEqual(self.handler.lookups_count, 0)
+        self.assertFalse(self.handler.match_counts)
+
+    def test_url_directory(self):
+        """url_directory() should return the URL without the basename
+        """
+        self.assertEqual(handlers.url_directory({'url': 'ftp://foo/bar/baz.nc'}), 'ftp://foo/bar')
+        self.assertIsNone(handlers.url_directory({'url': 'foo'}))
+        self.assertIsNone(handlers.url_directory({'url': None}))
+        self.assertIsNone(handlers.url_directory({}))
+
+    def test_routing_cache(self):
+        """The normalizer found for some metadata should be tried
+        first for metadata which has the same routing key
+        """
+        handler = handlers.MetadataHandler(self.TestBaseNormalizer, routing_cache_size=10)
+        handler.get_parameters({'url': 'ftp://foo/bar/1.nc'})
+        with mock.patch.object(handler, '_candidates') as mock_candidates:
+            self.assertDictEqual(
+                handler.get_parameters({'url': 'ftp://foo/bar/2.nc'}),
+                {'foo': 'url', 'bar': 'ftp://foo/bar/2.nc'})
+        mock_candidates.assert_not_called()
+        self.assertDictEqual(
+            handler.routing_cache_stats,
+            {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'size': 1, 'maxsize': 10})
+
+    def test_routing_cache_stale_entry(self):
+        """If the cached normalizer does not match, the full scan
+        should be done
+        """
+        handler = handlers.MetadataHandler(
+            self.TestBaseNormalizer, routing_cache_size=10, routing_key=lambda r: 'key')
+        handler.get_parameters({'url': 'ftp://foo/bar/1.nc'})
+        self.assertDictEqual(
+            handler.get_parameters({'foo': 1, 'bar': 2}),
+            {'foo': 1, 'bar': 2})
+        self.assertEqual(handler.routing_cache_stats['misses'], 2)
+        self.assertIsInstance(handler.routing_cache.get('key'), self.TestNormalizer1)
+
+    def test_routing_cache_no_key(self):
+        """Nothing should be cached when the routing key is None"""
+        handler = handlers.MetadataHandler(self.TestBaseNormalizer, routing_cache_size=10)
+        handler.get_parameters({'foo': 1, 'bar': 2})
+        self.assertEqual(len(handler.routing_cache), 0)
+
+    def test_routing_cache_disabled_by_default(self):
+        """The routing cache should be disabled by default"""
+        mock_routing_key = mock.Mock(return_value='key')
+        handler = handlers.MetadataHandler(self.TestBaseNormalizer, routing_key=mock_routing_key)
+        handler.get_parameters({'url': 'ftp://foo/bar/1.nc'})
+        mock_routing_key.assert_not_called()
+        self.assertEqual(len(handler.routing_cache), 0)
+
+    def test_hint_index(self):
+        """Normalizers should be designated by their class, their
+        ancestors, their names and their tags
+        """
+        hints = self.handler._hints
+        self.assertListEqual(
+            [n.__class__ for n in hints[self.TestNormalizer3]], [self.TestNormalizer3])
+        self.assertListEqual(
+            [n.__class__ for n in hints['TestNormalizer3']], [self.TestNormalizer3])
+        self.assertListEqual(
+            [n.__class__ for n in hints['foo_url']], [self.TestURLNormalizer])
+        self.assertCountEqual(
+            [n.__class__ for n in hints[self.TestNormalizer2]],
+            [self.TestNormalizer2, self.TestNormalizer3])
+        self.assertEqual(len(hints['TestBaseNormalizer']), 5)
+        self.assertNotIn(normalizers.MetadataNormalizer, hints)
+
+    def test_get_parameters_with_hint(self):
+        """The normalizer designated by the hint should be used without
+        scanning the other normalizers
+        """
+        raw_metadata = {'url': 'ftp://foo/bar.nc'}
+        for hint in (self.TestURLNormalizer, 'TestURLNormalizer', 'foo_url'):
+            with self.subTest(hint=hint), \
+                    mock.patch.object(self.handler, '_candidates') as mock_candidates:
+                self.assertDictEqual(
+                    self.handler.get_parameters(raw_metadata, hint=hint),
+                    {'foo': 'url', 'bar': 'ftp://foo/bar.nc'})
+                mock_candidates.assert_not_called()
+
+    def test_hint_designating_several_normalizers(self):
+        """When a hint designates several normalizers, they should be
+        checked
+        """
+        self.assertDictEqual(
+            self.handler.get_parameters({'baz': 1, 'qux': 2, 'quux': 3},
+                                        hint=self.TestNormalizer2),
+            {'foo': 1, 'bar': '2, 3'})
+
+    def test_wrong_hint_fallback(self):
+        """If the designated normalizer does not match, the other
+        normalizers should be tried
+        """
+        self.assertDictEqual(
+            self.handler.get_parameters({'foo': 1, 'bar': 2}, hint='foo_url'),
+            {'foo': 1, 'bar': 2})
+
+    def test_unknown_hint(self):
+        """An unknown hint should raise a ValueError"""
+        with self.assertRaises(ValueError):
+            self.handler.get_parameters({'foo': 1, 'bar': 2}, hint='unknown')
+        with self.assertRaises(ValueError):
+            self.handler.get_parameters({'foo': 1, 'bar': 2}, hint=['unhashable'])
+
+    def test_hint_verification_never(self):
+        """With the 'never' policy, the designated normalizer should
+        not be checked
+        """
+        handler = handlers.MetadataHandler(self.TestBaseNormalizer, hint_verification='never')
+        with mock.patch.object(self.TestURLNormalizer, 'check') as mock_check:
+            self.assertDictEqual(
+                handler.get_parameters({'url': 'ftp://foo/bar.nc'}, hint='foo_url'),
+                {'foo': 'url', 'bar': 'ftp://foo/bar.nc'})
+        mock_check.assert_not_called()
+
+    def test_hint_verification_sample(self):
+        """With the 'sample' policy, the designated normalizer should
+        be checked once every `hint_sampling_interval` lookups
+        """
+        handler = handlers.MetadataHandler(
+            self.TestBaseNormalizer, hint_verification='sample', hint_sampling_interval=3)
+        with mock.patch.object(self.TestURLNormalizer, 'check', return_value=True) as mock_check:
+            for _ in range(7):
+                handler.get_parameters({'url': 'ftp://foo/bar.nc'}, hint='foo_url')
+        self.assertEqual(mock_check.call_count, 2)
+
+    def test_hint_verification_always(self):
+        """By default, the designated normalizer should always be
+        checked
+        """
+        with mock.patch.object(self.TestURLNormalizer, 'check', return_value=True) as mock_check:
+            for _ in range(3):
+                self.handler.get_parameters({'url': 'ftp://foo/bar.nc'}, hint='foo_url')
+        self.assertEqual(mock_check.call_count, 3)
+
+    def test_wrong_hint_verification_policy(self):
+        """An unknown verification policy should raise a ValueError"""
+        with self.assertRaises(ValueError):
+            handlers.MetadataHandler(self.TestBaseNormalizer, hint_verification='sometimes')
+
+    def test_route(self):
+        """route() should return the class of the matching normalizer
+        without normalizing the metadata
+        """
+        with mock.patch.object(self.TestNormalizer1, 'normalize') as mock_normalize:
+            self.assertIs(self.handler.route({'foo': 1, 'bar': 2}), self.TestNormalizer1)
+        mock_normalize.assert_not_called()
+        self.assertIs(
+            self.handler.route({'url': 'ftp://foo/bar.nc'}, hint='foo_url'),
+            self.TestURLNormalizer)
+        self.assertIsNone(self.handler.route({'something': 'something'}))
+
+    def test_route_many(self):
+        """route_many() should return the classes of the matching
+        normalizers in the input order
+        """
+        routes = self.handler.route_many(
+            [{'foo': 1, 'bar': 2}, {'something': 'something'}, {'url': 'ftp://foo/bar.nc'}])
+        self.assertListEqual(
+            list(routes), [self.TestNormalizer1, None, self.TestURLNormalizer])
+
+    def test_route_many_aggregate(self):
+        """route_many() should count the number of elements routed to
+        each normalizer when `aggregate` is True
+        """
+        raw_metadata_iterable = (
+            {'foo': 1, 'bar': 2} if i % 3 else {'something': 'something'} for i in range(6))
+        self.assertDictEqual(
+            self.handler.route_many(raw_metadata_iterable, aggregate=True),
+            {self.TestNormalizer1: 4, None: 2})
+
+    def test_get_parameters_many(self):
+        """get_parameters_many() should return the results in the input
+        order, with errors in place of the elements which could not be
+        normalized
+        """
+        with mock.patch.object(self.TestNormalizer1, 'get_bar', side_effect=[2, KeyError, 6]):
+            results = self.handler.get_parameters_many([
+                {'foo': 1, 'bar': 2},
+                {'something': 'something'},
+                {'url': 'ftp://foo/bar.nc'},
+                {'foo': 3, 'bar': 4},
+                {'foo': 5, 'bar': 6},
+            ])
+        self.assertEqual(results[0], {'foo': 1, 'bar': 2})
+        self.assertIsInstance(results[1], errors.NoNormalizerFound)
+        self.assertEqual(results[2], {'foo': 'url', 'bar': 'ftp://foo/bar.nc'})
+        self.assertIsInstance(results[3], errors.MetadataNormalizationError)
+        self.assertIsInstance(results[3].__cause__, KeyError)
+        self.assertEqual(results[4], {'foo': 5, 'bar': 6})
+
+    def test_get_parameters_many_groups(self):
+        """Each normalizer should receive all the elements it can deal
+        with in one call to normalize_many()
+        """
+        with mock.patch.object(self.TestNormalizer1, 'normalize_many',
+                               return_value=['r1', 'r2']) as mock_normalize_many:
+            results = self.handler.get_parameters_many([
+                {'foo': 1, 'bar': 2},
+                {'url': 'ftp://foo/bar.nc'},
+                {'foo': 3, 'bar': 4},
+            ])
+        mock_normalize_many.assert_called_once_with([{'foo': 1, 'bar': 2}, {'foo': 3, 'bar': 4}])
+        self.assertListEqual(
+            results, ['r1', {'foo': 'url', 'bar': 'ftp://foo/bar.nc'}, 'r2'])
+
+    def test_get_parameters_many_group_failure(self):
+        """If normalize_many() fails or returns the wrong number of
+        results, the whole group should be reported as failed
+        """
+        for side_effect in (ValueError, [['r1']]):
+            with self.subTest(side_effect=side_effect), \
+                    mock.patch.object(self.TestNormalizer1, 'normalize_many',
+                                      side_effect=side_effect):
+                results = self.handler.get_parameters_many([
+                    {'foo': 1, 'bar': 2},
+                    {'url': 'ftp://foo/bar.nc'},
+                    {'foo': 3, 'bar': 4},
+                ])
+            self.assertIsInstance(results[0], errors.MetadataNormalizationError)
+            self.assertEqual(results[1], {'foo': 'url', 'bar': 'ftp://foo/bar.nc'})
+            self.assertIsInstance(results[2], errors.MetadataNormalizationError)
+            self.assertIsNot(results[0], results[2])
+
+    def test_get_parameters_or_error(self):
+        """get_parameters_or_error() should return the exceptions
+        instead of raising them
+        """
+        self.assertDictEqual(
+            self.handler.get_parameters_or_error({'foo': 1, 'bar': 2}), {'foo': 1, 'bar': 2})
+        self.assertIsInstance(
+            self.handler.get_parameters_or_error({'something': 'something'}),
+            errors.NoNormalizerFound)
+        error = errors.MetadataNormalizationError()
+        with mock.patch.object(self.TestNormalizer1, 'get_bar', side_effect=error):
+            self.assertIs(self.handler.get_parameters_or_error({'foo': 1, 'bar': 2}), error)
+        with mock.patch.object(self.TestNormalizer1, 'get_bar', side_effect=KeyError):
+            result = self.handler.get_parameters_or_error({'foo': 1, 'bar': 2})
+        self.assertIsInstance(result, errors.MetadataNormalizationError)
+        self.assertIsInstance(result.__cause__, KeyError)
+
+    def test_get_parameters_or_error_time_budget(self):
+        """A normalization which exceeds the time budget should be
+        interrupted, and reported with the normalizer and the field
+        which were being processed
+        """
+        def get_bar(self, raw_metadata):  # pylint: disable=unused-argument
+            while True:
+                pass
+
+        with mock.patch.object(self.TestNormalizer1, 'get_bar', get_bar):
+            result = self.handler.get_parameters_or_error({'foo': 1, 'bar': 2}, time_budget=0.05)
+        self.assertIsInstance(result, errors.NormalizationTimeout)
+        self.assertEqual(result.normalizer, 'TestNormalizer1')
+        self.assertEqual(result.field, 'bar')
+        # the handler still works after a timeout
+        self.assertDictEqual(
+            self.handler.get_parameters_or_error({'foo': 1, 'bar': 2}, time_budget=1),
+            {'foo': 1, 'bar': 2})
+
+    def test_get_parameters_or_error_time_budget_thread(self):
+        """A clear error should be raised if a time budget is requested
+        outside of the main thread
+        """
+        results = []
+        def normalize():
+            try:
+                self.handler.get_parameters_or_error({'foo': 1, 'bar': 2}, time_budget=1)
+            except RuntimeError as error:
+                results.append(error)
+        thread = threading.Thread(target=normalize)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(results), 1)
+        self.assertIn('main thread', str(results[0]))
+
+    def test_get_parameters_many_time_budget(self):
+        """With a time budget, the elements should be normalized one by
+        one, each only once, and only the slow ones reported as
+        timeouts
+        """
+        original_get_bar = self.TestNormalizer1.get_bar
+        calls = []
+        def get_bar(self, raw_metadata):
+            calls.append(raw_metadata['bar'])
+            while raw_metadata['bar'] == 'slow':
+                pass
+            return original_get_bar(self, raw_metadata)
+
+        with mock.patch.object(self.TestNormalizer1, 'get_bar', get_bar):
+            with self.assertLogs(handlers.logger, level='WARNING'):
+                results = self.handler.get_parameters_many(
+                    [{'foo': 1, 'bar': 2}, {'foo': 1, 'bar': 'slow'}, {'foo': 3, 'bar': 4}],
+                    time_budget=0.05)
+        self.assertDictEqual(results[0], {'foo': 1, 'bar': 2})
+        self.assertIsInstance(results[1], errors.NormalizationTimeout)
+        self.assertEqual(results[1].field, 'bar')
+        self.assertDictEqual(results[2], {'foo': 3, 'bar': 4})
+        self.assertListEqual(calls, [2, 'slow', 4])
+
+    def test_circuit_breaker(self):
+        """A normalizer which fails repeatedly should be disabled, and
+        the opening of the circuit should be logged once
+        """
+        handler = handlers.MetadataHandler(
+            self.TestBaseNormalizer, circuit_breaker_failure_rate=0.5, circuit_breaker_window=2)
+        self.assertIsNone(self.handler.circuit_breaker)
+        with mock.patch.object(self.TestNormalizer1, 'get_bar',
+                               side_effect=errors.MetadataNormalizationError) as mock_get_bar, \
+                self.assertLogs(handlers.logger, level='ERROR') as logs:
+            results = [handler.get_parameters_or_error({'foo': 1, 'bar': 2}) for _ in range(4)]
+        self.assertEqual(mock_get_bar.call_count, 2)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('TestNormalizer1 failed to normalize 2 of its last 2 elements',
+                      logs.output[0])
+        self.assertIsInstance(results[1], errors.MetadataNormalizationError)
+        self.assertNotIsInstance(results[1], errors.NormalizerDisabled)
+        self.assertIsInstance(results[2], errors.NormalizerDisabled)
+        self.assertIsInstance(results[3], errors.NormalizerDisabled)
+        # the other normalizers are not affected
+        self.assertDictEqual(handler.get_parameters({'url': 'ftp://foo/bar'}),
+                             {'foo': 'url', 'bar': 'ftp://foo/bar'})
+        self.assertEqual(handler.circuit_breaker.status()['TestNormalizer1']['rejected'], 2)
+
+        # the normalizer is enabled again after the cooldown if it works
+        with mock.patch('time.monotonic', return_value=time.monotonic() + 60), \
+                self.assertLogs(handlers.logger, level='WARNING') as logs:
+            self.assertDictEqual(handler.get_parameters({'foo': 1, 'bar': 2}),
+                                 {'foo': 1, 'bar': 2})
+        self.assertIn('2 elements were rejected', logs.output[0])
+
+    def test_circuit_breaker_interrupted_trial(self):
+        """A trial call interrupted by a BaseException should not leave
+        the circuit half-open forever
+        """
+        handler = handlers.MetadataHandler(
+            self.TestBaseNormalizer, circuit_breaker_failure_rate=1, circuit_breaker_window=1)
+        with mock.patch.object(self.TestNormalizer1, 'get_bar',
+                               side_effect=errors.MetadataNormalizationError), \
+                self.assertLogs(handlers.logger, level='ERROR'):
+            handler.get_parameters_or_error({'foo': 1, 'bar': 2})
+        def get_parameters_many(raw_metadata):
+            return handler.get_parameters_many([raw_metadata])
+
+        later = time.monotonic() + 60
+        with mock.patch('time.monotonic', return_value=later):
+            for get_parameters in (handler.get_parameters, get_parameters_many):
+                with mock.patch.object(self.TestNormalizer1, 'get_bar',
+                                       side_effect=KeyboardInterrupt):
+                    with self.assertRaises(KeyboardInterrupt):
+                        get_parameters({'foo': 1, 'bar': 2})
+                self.assertEqual(
+                    handler.circuit_breaker.status()['TestNormalizer1']['state'], 'half-open')
+            with self.assertLogs(handlers.logger, level='WARNING'):
+                self.assertDictEqual(handler.get_parameters({'foo': 1, 'bar': 2}),
+                                     {'foo': 1, 'bar': 2})
+
+    def test_circuit_breaker_batch(self):
+        """The circuit breaker should also apply to batches"""
+        handler = handlers.MetadataHandler(
+            self.TestBaseNormalizer, circuit_breaker_failure_rate=1, circuit_breaker_window=2)
+        with mock.patch.object(self.TestNormalizer1, 'get_bar',
+                               side_effect=errors.MetadataNormalizationError):
+            handler.get_parameters_many([{'foo': 1, 'bar': 2}] * 2)
+            results = handler.get_parameters_many([{'foo': 1, 'bar': 2}, {'url': 'ftp://foo/b'}])
+        self.assertIsInstance(results[0], errors.NormalizerDisabled)
+        self.assertDictEqual(results[1], {'foo': 'url', 'bar': 'ftp://foo/b'})
+
+    def test_circuit_breaker_opens_within_batch(self):
+        """The circuit breaker should disable a normalizer in the middle
+        of a batch, and let a single element through as the trial call
+        """
+        handler = handlers.MetadataHandler(
+            self.TestBaseNormalizer, circuit_breaker_failure_rate=1, circuit_breaker_window=2)
+        with mock.patch.object(self.TestNormalizer1, 'get_bar',
+                               side_effect=errors.MetadataNormalizationError) as mock_get_bar, \
+                mock.patch.object(handler, 'CIRCUIT_BREAKER_CHUNK_SIZE', 2), \
+                self.assertLogs(handlers.logger, level='ERROR'):
+            results = handler.get_parameters_many([{'foo': 1, 'bar': 2}] * 5)
+        self.assertEqual(mock_get_bar.call_count, 2)
+        for result in results[:2]:
+            self.assertIsInstance(result, errors.MetadataNormalizationError)
+            self.assertNotIsInstance(result, errors.NormalizerDisabled)
+        for result in results[2:]:
+            self.assertIsInstance(result, errors.NormalizerDisabled)
+        self.assertEqual(handler.circuit_breaker.status()['TestNormalizer1']['rejected'], 3)
+
+        with mock.patch('time.monotonic', return_value=time.monotonic() + 60), \
+                mock.patch.object(self.TestNormalizer1, 'get_bar',
+                                  side_effect=errors.MetadataNormalizationError) as mock_get_bar:
+            results = handler.get_parameters_many([{'foo': 1, 'bar': 2}] * 3)
+        mock_get_bar.assert_called_once()
+        self.assertNotIsInstance(results[0], errors.NormalizerDisabled)
+        self.assertIsInstance(results[1], errors.NormalizerDisabled)
+        self.assertIsInstance(results[2], errors.NormalizerDisabled)
+
+    def test_normalize_stream(self):
+        """normalize_stream() should yield the normalized elements and
+        send the failures to the error callback
+        """
+        records = iter([{'foo': 1, 'bar': 2}, {'something': 'something'}, {'url': 'ftp://foo/b'}])
+        on_error = mock.Mock()
+        stream = self.handler.normalize_stream(records, on_error=on_error)
+        self.assertTupleEqual(next(stream), (0, {'foo': 1, 'bar': 2}))
+        on_error.assert_not_called()
+        self.assertListEqual(list(stream), [(2, {'foo': 'url', 'bar': 'ftp://foo/b'})])
+        on_error.assert_called_once()
+        self.assertEqual(on_error.call_args[0][:2], (1, {'something': 'something'}))
+        self.assertIsInstance(on_error.call_args[0][2], errors.NoNormalizerFound)
+
+    def test_normalize_stream_log_errors(self):
+        """Failures should be logged if there is no error callback"""
+        with self.assertLogs(handlers.logger, level='WARNING'):
+            self.assertListEqual(list(self.handler.normalize_stream([{}])), [])
+
+    def test_normalize_stream_max_consecutive_errors(self):
+        """normalize_stream() should stop after
+        `max_consecutive_errors` consecutive failures
+        """
+        records = [{}, {}, {'foo': 1, 'bar': 2}, {}, {}, {}, {'foo': 3, 'bar': 4}]
+        on_error = mock.Mock()
+        results = []
+        with self.assertRaises(errors.MetadataNormalizationError) as raised:
+            for result in self.handler.normalize_stream(
+                    records, on_error=on_error, max_consecutive_errors=3):
+                results.append(result)
+        self.assertListEqual(results, [(2, {'foo': 1, 'bar': 2})])
+        self.assertEqual(on_error.call_count, 5)
+        self.assertIsInstance(raised.exception.__cause__, errors.NoNormalizerFound)
+
+    def test_aget_parameters(self):
+        """aget_parameters() should normalize the metadata in the
+        executor
+        """
+        mock_executor = mock.Mock()
+        async def run():
+            result = await self.handler.aget_parameters({'url': 'ftp://foo/bar.nc'})
+            with self.assertRaises(errors.NoNormalizerFound):
+                await self.handler.aget_parameters({'something': 'something'})
+            return result
+        self.assertDictEqual(asyncio.run(run()), {'foo': 'url', 'bar': 'ftp://foo/bar.nc'})
+
+        async def run_with_executor():
+            loop = asyncio.get_running_loop()
+            with mock.patch.object(loop, 'run_in_executor',
+                                   return_value=asyncio.sleep(0, 'result')) as mock_run:
+                result = await self.handler.aget_parameters({}, executor=mock_executor)
+            self.assertIs(mock_run.call_args[0][0], mock_executor)
+            return result
+        self.assertEqual(asyncio.run(run_with_executor()), 'result')
+
+    def test_anormalize_stream(self):
+        """anormalize_stream() should yield the results in input order
+        from an asynchronous or a regular iterable
+        """
+        records = [{'foo': 1, 'bar': 2}, {'something': 'something'}, {'url': 'ftp://foo/b'}]
+
+        async def records_generator():
+            for record in records:
+                await asyncio.sleep(0)
+                yield record
+
+        async def run(iterable):
+            return [result async for result in self.handler.anormalize_stream(
+                iterable, max_concurrency=2)]
+
+        for iterable in (records, records_generator()):
+            with self.subTest(iterable=iterable):
+                results = asyncio.run(run(iterable))
+                self.assertListEqual([index for index, _ in results], [0, 1, 2])
+                self.assertDictEqual(results[0][1], {'foo': 1, 'bar': 2})
+                self.assertIsInstance(results[1][1], errors.NoNormalizerFound)
+                self.assertDictEqual(results[2][1], {'foo': 'url', 'bar': 'ftp://foo/b'})
+
+    def test_anormalize_stream_backpressure(self):
+        """anormalize_stream() should not take more elements from the
+        input than `max_concurrency` plus the consumed results
+        """
+        consumed = []
+
+        def records():
+            for i in range(10):
+                consumed.append(i)
+                yield {'foo': i, 'bar': i}
+
+        async def run():
+            stream = self.handler.anormalize_stream(records(), max_concurrency=3)
+            await stream.__anext__()
+            await stream.aclose()
+
+        asyncio.run(run())
+        self.assertListEqual(consumed, [0, 1, 2, 3])
+
+    def test_anormalize_stream_process_executor(self):
+        """Process executors which were not created by
+        parallel.process_executor() should be rejected
+        """
+        async def run(executor):
+            async for _ in self.handler.anormalize_stream([{}], executor=executor):
+                pass
+        with concurrent.futures.ProcessPoolExecutor(1) as executor:
+            with self.assertRaises(ValueError):
+                asyncio.run(run(executor))
+
+    def test_anormalize_stream_wrong_concurrency(self):
+        """max_concurrency must be at least 1"""
+        async def run():
+            async for _ in self.handler.anormalize_stream([], max_concurrency=0):
+                pass
+        with self.assertRaises(ValueError):
+            asyncio.run(run())
+
+    def test_warm_up(self):
+        """warm_up() should load the vocabularies used by the
+        normalizers, warm up each normalizer and return the timings
+        """
+        with mock.patch.object(self.TestNormalizer1, 'vocabularies', ('foo', 'bar')), \
+                mock.patch.object(self.TestNormalizer3, 'vocabularies', ('foo',)), \
+                mock.patch('metanorm.utils.load_vocabulary') as mock_load_vocabulary, \
+                mock.patch.object(self.TestNormalizer1, 'warm_up') as mock_warm_up:
+            timings = self.handler.warm_up()
+        mock_load_vocabulary.assert_has_calls((mock.call('bar'), mock.call('foo')))
+        self.assertEqual(mock_load_vocabulary.call_count, 2)
+        mock_warm_up.assert_called_once_with()
+        self.assertCountEqual(timings['vocabularies'], ('foo', 'bar'))
+        self.assertCountEqual(
+            timings['lookups'],
+            ('TestNormalizer1', 'TestNormalizer2', 'TestNormalizer3', 'TestURLNormalizer',
+             'TestMarkerNormalizer'))
+        self.assertGreaterEqual(timings['total'], sum(timings['vocabularies'].values()))
+        self.assertIs(self.handler.warm_up_timings, timings)
+
+    def test_warm_up_errors(self):
+        """Errors during the warm-up should be logged"""
+        with mock.patch.object(self.TestNormalizer1, 'vocabularies', ('foo',)), \
+                mock.patch('metanorm.utils.load_vocabulary', side_effect=ValueError), \
+                mock.patch.object(self.TestNormalizer1, 'warm_up', side_effect=KeyError), \
+                self.assertLogs(handlers.logger, level='WARNING') as logs:
+            timings = self.handler.warm_up()
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('foo', timings['vocabularies'])
+
+    def test_warm_up_at_instantiation(self):
+        """The handler should be warmed up at instantiation if
+        requested
+        """
+        with mock.patch.object(handlers.MetadataHandler, 'warm_up') as mock_warm_up:
+            handlers.MetadataHandler(self.TestBaseNormalizer)
+            mock_warm_up.assert_not_called()
+            handlers.MetadataHandler(self.TestBaseNormalizer, warm_up=True)
+            mock_warm_up.assert_called_once_with()
+
+    def test_snapshot(self):
+        """A handler should be saved and loaded with its state"""
+        handler = handlers.MetadataHandler(
+            self.TestBaseNormalizer, adaptive_ordering=True, routing_cache_size=10)
+        handler.get_parameters({'url': 'ftp://foo/bar/1.nc'})
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'handler.pickle')
+            handler.save_snapshot(path)
+            self.assertListEqual(os.listdir(directory), ['handler.pickle'])
+            loaded_handler = handlers.MetadataHandler.load_snapshot(path)
+
+        self.assertTupleEqual(loaded_handler.ordering, handler.ordering)
+        self.assertEqual(loaded_handler.lookups_count, 1)
+        self.assertIn('ftp://foo/bar', loaded_handler.routing_cache)
+        self.assertDictEqual(
+            loaded_handler.get_parameters({'url': 'ftp://foo/bar/2.nc'}),
+            {'foo': 'url', 'bar': 'ftp://foo/bar/2.nc'})
+        self.assertEqual(loaded_handler.routing_cache_stats['hits'], 1)
+        self.assertDictEqual(
+            loaded_handler.get_parameters({'url': 'https://bar/marker/baz.nc'}),
+            {'foo': 'marker', 'bar': 'https://bar/marker/baz.nc'})
+
+    def test_snapshot_gcmd_search_cache(self):
+        """The cached GCMD searches should be saved in the snapshot and
+        added to the current cache when it is loaded
+        """
+        saved_cache = dispatch.LRUCache(10)
+        saved_cache.put(('platform', 'foo', ()), {'Short_Name': 'foo'})
+        loading_cache = dispatch.LRUCache(10)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'handler.pickle')
+            with mock.patch('metanorm.utils.GCMD_SEARCH_CACHE', saved_cache):
+                self.handler.save_snapshot(path)
+            with mock.patch('metanorm.utils.GCMD_SEARCH_CACHE', loading_cache):
+                handlers.MetadataHandler.load_snapshot(path)
+        self.assertListEqual(loading_cache.items(),
+                             [(('platform', 'foo', ()), {'Short_Name': 'foo'})])
+
+    def test_stale_snapshot(self):
+        """A snapshot made with another fingerprint should be rejected
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'handler.pickle')
+            with mock.patch('metanorm.handlers.snapshot_fingerprint', return_value={'a': 1}):
+                self.handler.save_snapshot(path)
+            with mock.patch('metanorm.handlers.snapshot_fingerprint', return_value={'a': 2}):
+                with self.assertRaises(errors.SnapshotError):
+                    handlers.MetadataHandler.load_snapshot(path)
+
+    def test_invalid_snapshot(self):
+        """Files which are not snapshots should be rejected"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'handler.pickle')
+            with self.assertRaises(errors.SnapshotError):
+                handlers.MetadataHandler.load_snapshot(path)
+            with open(path, 'wb') as snapshot_file:
+                snapshot_file.write(b'foo')
+            with self.assertRaises(errors.SnapshotError):
+                handlers.MetadataHandler.load_snapshot(path)
+
+    def test_snapshot_fingerprint(self):
+        """The fingerprint should contain the versions of metanorm and
+        of the vocabularies
+        """
+        with mock.patch('metanorm.utils.get_metanorm_version', return_value='1.0'), \
+                mock.patch('metanorm.utils.get_vocabulary_fingerprint',
+                           side_effect=lambda name: (name, None, None)):
+            fingerprint = handlers.snapshot_fingerprint()
+        self.assertEqual(fingerprint['metanorm'], '1.0')
+        self.assertIn(('gcmd_platform', None, None), fingerprint['vocabularies'])
+
+    def test_from_snapshot(self):
+        """from_snapshot() should load a valid snapshot made with the
+        same arguments, and build and save a handler otherwise
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'handler.pickle')
+            handler = handlers.MetadataHandler.from_snapshot(
+                path, self.TestBaseNormalizer, routing_cache_size=10)
+            self.assertTrue(os.path.exists(path))
+
+            with mock.patch('metanorm.utils.get_all_subclasses') as mock_get_all_subclasses:
+                loaded_handler = handlers.MetadataHandler.from_snapshot(
+                    path, self.TestBaseNormalizer, routing_cache_size=10)
+            mock_get_all_subclasses.assert_not_called()
+            self.assertTupleEqual(loaded_handler.ordering, handler.ordering)
+
+            other_handler = handlers.MetadataHandler.from_snapshot(
+                path, self.TestBaseNormalizer, routing_cache_size=20)
+            self.assertEqual(other_handler.routing_cache.maxsize, 20)
+            self.assertEqual(
+                handlers.MetadataHandler.load_snapshot(path).routing_cache.maxsize, 20)
+
+    def test_abstract_normalizers_not_instantiated(self):
+        """Abstract normalizers should not be instantiated"""
+        class LocalBaseNormalizer(normalizers.MetadataNormalizer):
+            """Local base class, to avoid adding subclasses to
+            TestBaseNormalizer
+            """
+
+        class AbstractNormalizer(LocalBaseNormalizer):
+            """Abstract test normalizer"""
+            abstract = True
+
+        class ConcreteNormalizer(AbstractNormalizer):
+            """Concrete test normalizer"""
+
+        handler = handlers.MetadataHandler(LocalBaseNormalizer)
+        classes = [n.__class__ for n in handler.normalizers]
+        self.assertNotIn(AbstractNormalizer, classes)
+        self.assertIn(ConcreteNormalizer, classes)
+
+    def test_routing_gate(self):
+        """The normalizers whose ancestor's routing gate fails should
+        not be checked, and each gate should be called once per lookup
+        """
+        gate_calls = []
+
+        class LocalBaseNormalizer(normalizers.MetadataNormalizer):
+            """Local base class, to avoid adding subclasses to
+            TestBaseNormalizer
+            """
+            def check(self, raw_metadata):
+                return 'foo' in raw_metadata
+
+        class GatedNormalizer(LocalBaseNormalizer):
+            """Test normalizer with a gate"""
+            abstract = True
+
+            @classmethod
+            def routing_gate(cls, raw_metadata):
+                gate_calls.append(raw_metadata)
+                return 'gate' in raw_metadata
+
+        class GatedChild1(GatedNormalizer):
+            """Test normalizer"""
+            def check(self, raw_metadata):
+                return raw_metadata.get('gate') == 1
+
+        class GatedChild2(GatedChild1):
+            """Test normalizer"""
+            def check(self, raw_metadata):
+                return raw_metadata.get('gate') == 2
+
+        class OtherNormalizer(LocalBaseNormalizer):
+            """Test normalizer without a gate"""
+
+        handler = handlers.MetadataHandler(LocalBaseNormalizer)
+        with mock.patch.object(GatedChild1, 'check') as mock_check1, \
+                mock.patch.object(GatedChild2, 'check') as mock_check2:
+            self.assertIsInstance(handler._find_normalizer({'foo': 'bar'}), OtherNormalizer)
+        mock_check1.assert_not_called()
+        mock_check2.assert_not_called()
+        self.assertEqual(len(gate_calls), 1)
+
+        gate_calls.clear()
+        normalizer = handler._find_normalizer({'gate': 2})
+        self.assertIsInstance(normalizer, GatedChild2)
+        self.assertEqual(len(gate_calls), 1)
+
+    def test_get_gates(self):
+        """_get_gates() should return the ancestors which define their
+        own routing gate, from the root of the tree
+        """
+        class Gate1(normalizers.MetadataNormalizer):
+            """Test normalizer with a gate"""
+            @classmethod
+            def routing_gate(cls, raw_metadata):
+                return True
+
+        class Child(Gate1):
+            """Test normalizer without a gate"""
+
+        class Gate2(Child):
+            """Test normalizer with a gate"""
+            @classmethod
+            def routing_gate(cls, raw_metadata):
+                return True
+
+        class Leaf(Gate2):
+            """Test normalizer"""
+
+        self.assertTupleEqual(handlers.MetadataHandler._get_gates(Leaf), (Gate1, Gate2))
+        self.assertTupleEqual(handlers.MetadataHandler._get_gates(Gate1), ())
+        self.assertTupleEqual(handlers.MetadataHandler._get_gates(self.TestNormalizer1), ())
+        self.assertTupleEqual(
+            handlers.MetadataHandler._get_gates(normalizers.geospaas.CMEMS008046MetadataNormalizer),
+            (normalizers.geospaas.CMEMSMetadataNormalizer,))
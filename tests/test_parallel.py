@@ -0,0 +1,402 @@
+"""Tests for the parallel module"""
+#pylint: disable=protected-access
+
+import asyncio
+import os
+import signal
+import time
+import unittest
+import unittest.mock as mock
+from datetime import datetime
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+import metanorm.errors as errors
+import metanorm.handlers as handlers
+import metanorm.normalizers as normalizers
+import metanorm.parallel as parallel
+
+
+class ParallelTestBaseNormalizer(normalizers.MetadataNormalizer):
+    """Base class for the normalizers used in the parallel tests. They
+    have to be defined at the module level to be usable in worker
+    processes
+    """
+
+    abstract = True
+
+
+class ParallelTestNormalizer(ParallelTestBaseNormalizer):
+    """Normalizer used in the parallel tests"""
+
+    input_fields = ('foo',)
+
+    def check(self, raw_metadata):
+        return 'foo' in raw_metadata
+
+    def normalize(self, raw_metadata):
+        if raw_metadata['foo'] == 'error':
+            raise errors.MetadataNormalizationError('error')
+        if raw_metadata['foo'] == 'unexpected':
+            raise KeyError('unexpected')
+        if raw_metadata['foo'] == 'exit':
+            os._exit(1)
+        if raw_metadata['foo'] == 'stuck':
+            # simulates an operation which can't be interrupted by the
+            # time budget, like a long GEOS call
+            signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+            time.sleep(60)
+        return {'foo': self.get_foo(raw_metadata)}
+
+    def get_foo(self, raw_metadata):
+        """Loops forever on 'slow' metadata"""
+        while raw_metadata['foo'] == 'slow':
+            pass
+        return raw_metadata['foo']
+
+
+class ParallelResultsTestCase(unittest.TestCase):
+    """Base class for the tests of the parallel normalization
+    functions
+    """
+
+    RECORDS = [{'foo': 1}, {'bar': 2}, {'foo': 'error'}, {'foo': 'unexpected'}, {'foo': 5}]
+
+    def check_results(self, results):
+        """Check the results of the normalization of RECORDS"""
+        self.assertListEqual([index for index, _ in results], list(range(5)))
+        self.assertDictEqual(results[0][1], {'foo': 1})
+        self.assertIsInstance(results[1][1], errors.NoNormalizerFound)
+        self.assertIsInstance(results[2][1], errors.MetadataNormalizationError)
+        self.assertIsInstance(results[3][1], errors.MetadataNormalizationError)
+        self.assertIn('KeyError', str(results[3][1]))
+        self.assertDictEqual(results[4][1], {'foo': 5})
+
+    STUCK_RECORDS = [{'foo': 1}, {'foo': 'stuck'}, {'foo': 3}, {'foo': 'stuck'}, {'foo': 5}]
+
+    def check_killed(self, results):
+        """Check the results of the normalization of STUCK_RECORDS"""
+        self.assertListEqual([index for index, _ in results], list(range(5)))
+        for index in (0, 2, 4):
+            self.assertDictEqual(results[index][1], {'foo': index + 1})
+        for index in (1, 3):
+            self.assertIsInstance(results[index][1], errors.NormalizationTimeout)
+            self.assertIsNone(results[index][1].field)
+
+    def check_timeout(self, results):
+        """Check the results of the normalization of a slow record
+        followed by a fast one
+        """
+        self.assertListEqual([index for index, _ in results], [0, 1])
+        self.assertIsInstance(results[0][1], errors.NormalizationTimeout)
+        self.assertEqual(results[0][1].normalizer, 'ParallelTestNormalizer')
+        self.assertEqual(results[0][1].field, 'foo')
+        self.assertDictEqual(results[1][1], {'foo': 2})
+
+
+class NormalizeParallelTestCase(ParallelResultsTestCase):
+    """Tests for the normalize_parallel() function"""
+
+    def test_normalize_parallel_ordered(self):
+        """Results should be yielded in input order"""
+        self.check_results(list(parallel.normalize_parallel(
+            iter(self.RECORDS), ParallelTestBaseNormalizer, workers=2, chunksize=2)))
+
+    def test_normalize_parallel_unordered(self):
+        """All results should be yielded with their index"""
+        results = sorted(parallel.normalize_parallel(
+            self.RECORDS, ParallelTestBaseNormalizer, workers=2, ordered=False))
+        self.check_results(results)
+
+    def test_normalize_parallel_projection(self):
+        """Results should be the same when the records are projected"""
+        self.check_results(list(parallel.normalize_parallel(
+            [dict(record, ignored='ignored') for record in self.RECORDS],
+            ParallelTestBaseNormalizer, workers=2, project=True)))
+
+    def test_normalize_parallel_time_budget(self):
+        """Records which exceed the time budget should be reported as
+        timeouts without stopping the others
+        """
+        self.check_timeout(list(parallel.normalize_parallel(
+            [{'foo': 'slow'}, {'foo': 2}], ParallelTestBaseNormalizer, workers=1, chunksize=2,
+            time_budget=0.1)))
+
+    @mock.patch('metanorm.parallel.WATCHDOG_GRACE', 0.2)
+    def test_normalize_parallel_watchdog(self):
+        """Workers which can't be interrupted by the time budget should
+        be killed and replaced, and the other records of their chunk
+        normalized by another worker
+        """
+        start = time.monotonic()
+        results = list(parallel.normalize_parallel(
+            self.STUCK_RECORDS, ParallelTestBaseNormalizer, workers=2, chunksize=3,
+            time_budget=0.1, project=True))
+        self.assertLess(time.monotonic() - start, 30)
+        self.check_killed(results)
+        self.assertEqual(results[1][1].normalizer, 'ParallelTestNormalizer')
+
+    @mock.patch('metanorm.parallel.WATCHDOG_GRACE', 0.2)
+    def test_normalize_parallel_watchdog_unordered(self):
+        """Killed workers should not prevent the unordered results"""
+        self.check_killed(sorted(
+            parallel.normalize_parallel(
+                self.STUCK_RECORDS, ParallelTestBaseNormalizer, workers=1, chunksize=5,
+                time_budget=0.1, ordered=False),
+            key=lambda result: result[0]))
+
+    def test_normalize_parallel_watchdog_worker_death(self):
+        """An error should be raised if a worker dies"""
+        with self.assertRaises(RuntimeError):
+            list(parallel.normalize_parallel(
+                [{'foo': 'exit'}], ParallelTestBaseNormalizer, workers=1, time_budget=1))
+
+    def test_in_order(self):
+        """Results should be yielded in index order"""
+        self.assertListEqual(list(parallel._in_order([(1, 'b'), (2, 'c'), (0, 'a')])),
+                             [(0, 'a'), (1, 'b'), (2, 'c')])
+
+    def test_projected_tasks(self):
+        """Routed records should be reduced to the input fields of
+        their normalizer, and the normalizer given as hint
+        """
+        router = handlers.MetadataHandler(ParallelTestBaseNormalizer)
+        self.assertListEqual(
+            list(parallel._projected_tasks([{'foo': 1, 'bar': 2}, {'bar': 3}], router, None)),
+            [(0, {'foo': 1}, ParallelTestNormalizer), (1, {'bar': 3}, None)])
+
+    def test_normalize_parallel_prewarm(self):
+        """The workers should inherit the handler built in the parent
+        process when the 'fork' start method is used
+        """
+        handler = handlers.MetadataHandler(ParallelTestBaseNormalizer)
+        with mock.patch('metanorm.parallel.prewarm', return_value=handler) as mock_prewarm, \
+                mock.patch('metanorm.handlers.MetadataHandler') as mock_handler_class:
+            results = list(parallel.normalize_parallel(
+                self.RECORDS, ParallelTestBaseNormalizer, workers=2, mp_context='fork',
+                prewarm_workers=True))
+        self.check_results(results)
+        mock_prewarm.assert_called_once_with(ParallelTestBaseNormalizer, {})
+        mock_handler_class.assert_not_called()
+
+    def test_normalize_parallel_prewarm_forkserver(self):
+        """The modules should be preloaded by the forkserver"""
+        mock_context = mock.Mock()
+        mock_context.get_start_method.return_value = 'forkserver'
+        mock_context.Pool.return_value.__enter__ = mock.Mock(return_value=mock.Mock(
+            imap=mock.Mock(return_value=iter(()))))
+        mock_context.Pool.return_value.__exit__ = mock.Mock(return_value=False)
+        with mock.patch('multiprocessing.get_context', return_value=mock_context), \
+                mock.patch('metanorm.parallel.prewarm') as mock_prewarm:
+            list(parallel.normalize_parallel(
+                self.RECORDS, ParallelTestBaseNormalizer, mp_context='forkserver',
+                prewarm_workers=True))
+        mock_context.set_forkserver_preload.assert_called_once_with(
+            list(parallel.PRELOAD_MODULES))
+        # the handler can't be sent to the forkserver's children, they
+        # warm up their own
+        self.assertTupleEqual(mock_context.Pool.call_args[1]['initargs'],
+                              (ParallelTestBaseNormalizer, {'warm_up': True}, None, None))
+        mock_prewarm.assert_not_called()
+
+    def test_normalize_parallel_prewarm_spawn(self):
+        """Workers started with the 'spawn' method should warm up their
+        own handler instead of the current process
+        """
+        with mock.patch('metanorm.parallel.prewarm') as mock_prewarm:
+            results = list(parallel.normalize_parallel(
+                self.RECORDS, ParallelTestBaseNormalizer, workers=1, mp_context='spawn',
+                prewarm_workers=True))
+        self.check_results(results)
+        mock_prewarm.assert_not_called()
+
+    def test_prewarm(self):
+        """prewarm() should read the vocabularies and return a handler
+        """
+        mock_vocabularies = {
+            name: mock.Mock(**{'get_filepath.return_value': '/nonexistent'})
+            for name in parallel.utils.PYTHESINT_VOCABULARIES}
+        mock_vocabularies['gcmd_platform'].get_list.side_effect = ValueError
+        # the GCMD indexes are built from the mock vocabularies
+        self.addCleanup(parallel.utils.clear_gcmd_search_cache)
+        with mock.patch('pythesint.vocabularies', mock_vocabularies), \
+                self.assertLogs(parallel.logger, level='WARNING'):
+            handler = parallel.prewarm(ParallelTestBaseNormalizer, {'routing_cache_size': 3})
+        for vocabulary in mock_vocabularies.values():
+            vocabulary.get_list.assert_called_once_with()
+        self.assertIsInstance(handler, handlers.MetadataHandler)
+        self.assertEqual(handler.routing_cache.maxsize, 3)
+        self.assertIsNotNone(handler.warm_up_timings)
+
+    def test_init_worker_inherited_handler(self):
+        """The worker initializer should use the given handler"""
+        handler = handlers.MetadataHandler(ParallelTestBaseNormalizer)
+        with mock.patch('metanorm.handlers.MetadataHandler') as mock_handler_class:
+            parallel._init_worker(ParallelTestBaseNormalizer, {}, handler)
+        mock_handler_class.assert_not_called()
+        self.assertIs(parallel._worker_handler, handler)
+
+    def test_handler_built_once_per_worker(self):
+        """The worker initializer should build the handler with the
+        given arguments
+        """
+        with mock.patch('metanorm.handlers.MetadataHandler') as mock_handler_class:
+            parallel._init_worker(ParallelTestNormalizer, {'routing_cache_size': 10})
+        mock_handler_class.assert_called_once_with(ParallelTestNormalizer, routing_cache_size=10)
+        self.assertIs(parallel._worker_handler, mock_handler_class.return_value)
+
+
+class ProcessExecutorTestCase(ParallelResultsTestCase):
+    """Tests for the process_executor() function"""
+
+    def test_anormalize_stream_process_executor(self):
+        """The asynchronous methods of the handlers should use the
+        handlers of the executor's workers
+        """
+        handler = handlers.MetadataHandler(ParallelTestBaseNormalizer)
+
+        async def run(executor):
+            results = [result async for result in handler.anormalize_stream(
+                self.RECORDS, executor=executor, max_concurrency=2)]
+            return results, await handler.aget_parameters({'foo': 1}, executor=executor)
+
+        with parallel.process_executor(2, ParallelTestBaseNormalizer) as executor, \
+                mock.patch.object(handlers.MetadataHandler, '__getstate__',
+                                  side_effect=AssertionError('the handler was pickled')):
+            results, result = asyncio.run(run(executor))
+        self.check_results(results)
+        self.assertDictEqual(result, {'foo': 1})
+
+
+class NormalizeThreadedTestCase(ParallelResultsTestCase):
+    """Tests for the normalize_threaded() function"""
+
+    def test_normalize_threaded_ordered(self):
+        """Results should be yielded in input order"""
+        self.check_results(list(parallel.normalize_threaded(
+            iter(self.RECORDS), ParallelTestBaseNormalizer, workers=2, max_pending=2)))
+
+    def test_normalize_threaded_unordered(self):
+        """All results should be yielded with their index"""
+        results = sorted(parallel.normalize_threaded(
+            self.RECORDS, ParallelTestBaseNormalizer, workers=2, ordered=False, max_pending=2),
+            key=lambda result: result[0])
+        self.check_results(results)
+
+    def test_shared_handler(self):
+        """The given handler should be shared by all threads"""
+        handler = handlers.MetadataHandler(ParallelTestBaseNormalizer)
+        with mock.patch.object(handler, 'get_parameters_or_error',
+                               wraps=handler.get_parameters_or_error) as mock_normalize, \
+                mock.patch('metanorm.handlers.MetadataHandler') as mock_handler_class:
+            results = list(parallel.normalize_threaded(
+                self.RECORDS, workers=3, handler=handler))
+        mock_handler_class.assert_not_called()
+        self.assertEqual(mock_normalize.call_count, 5)
+        self.check_results(results)
+
+    def test_shared_handler_consistency(self):
+        """Concurrent lookups with adaptive ordering and a routing
+        cache should give the same results as sequential ones
+        """
+        handler = handlers.MetadataHandler(
+            ParallelTestBaseNormalizer, adaptive_ordering=True, reordering_interval=7,
+            routing_cache_size=4, routing_key=lambda raw_metadata: str(raw_metadata.get('foo')))
+        records = [{'foo': i % 5} if i % 3 else {'bar': i} for i in range(500)]
+        results = list(parallel.normalize_threaded(records, workers=8, handler=handler))
+        for (index, result), record in zip(results, records):
+            if 'foo' in record:
+                self.assertDictEqual(result, {'foo': record['foo']})
+            else:
+                self.assertIsInstance(result, errors.NoNormalizerFound)
+        self.assertEqual(handler.lookups_count, 500)
+
+
+class NormalizeSharedMemoryTestCase(ParallelResultsTestCase):
+    """Tests for the normalize_shared_memory() function"""
+
+    def test_encode_decode_records(self):
+        """Records should be encoded as length-prefixed JSON"""
+        records = [{'foo': 'bar'}, {}, {'baz': [1, 2.5, None]}]
+        data = parallel._encode_records(records)
+        self.assertEqual(data[:4], (14).to_bytes(4, 'little'))
+        self.assertListEqual(parallel._decode_records(memoryview(data), 3), records)
+
+    def test_batches(self):
+        """Elements should be grouped in batches"""
+        self.assertListEqual(
+            list(parallel._batches(iter('abcde'), 2)),
+            [(0, ['a', 'b']), (2, ['c', 'd']), (4, ['e'])])
+        self.assertListEqual(list(parallel._batches([], 2)), [])
+
+    @unittest.skipIf(shared_memory is None, 'shared memory requires Python 3.8 or later')
+    def test_normalize_shared_memory_ordered(self):
+        """Results should be yielded in input order"""
+        self.check_results(list(parallel.normalize_shared_memory(
+            iter(self.RECORDS), ParallelTestBaseNormalizer, workers=2, batch_size=2)))
+
+    @unittest.skipIf(shared_memory is None, 'shared memory requires Python 3.8 or later')
+    def test_normalize_shared_memory_unordered(self):
+        """All results should be yielded with their index"""
+        results = sorted(parallel.normalize_shared_memory(
+            self.RECORDS, ParallelTestBaseNormalizer, workers=2, batch_size=1, slots=1,
+            ordered=False), key=lambda result: result[0])
+        self.check_results(results)
+
+    @unittest.skipIf(shared_memory is None, 'shared memory requires Python 3.8 or later')
+    def test_normalize_shared_memory_time_budget(self):
+        """Records which exceed the time budget should be reported as
+        timeouts without stopping the others
+        """
+        self.check_timeout(list(parallel.normalize_shared_memory(
+            [{'foo': 'slow'}, {'foo': 2}], ParallelTestBaseNormalizer, workers=1, batch_size=2,
+            time_budget=0.1)))
+
+    @unittest.skipIf(shared_memory is None, 'shared memory requires Python 3.8 or later')
+    @mock.patch('metanorm.parallel.WATCHDOG_GRACE', 0.2)
+    def test_normalize_shared_memory_watchdog(self):
+        """Workers which can't be interrupted by the time budget should
+        be killed and replaced, and the other records of their batches
+        sent again
+        """
+        for batch_size in (1, 5):
+            with self.subTest(batch_size=batch_size):
+                self.check_killed(list(parallel.normalize_shared_memory(
+                    self.STUCK_RECORDS, ParallelTestBaseNormalizer, workers=2,
+                    batch_size=batch_size, time_budget=0.1)))
+
+    @unittest.skipIf(shared_memory is None, 'shared memory requires Python 3.8 or later')
+    def test_normalize_shared_memory_fallback(self):
+        """Batches which don't fit in the slots and records which can't
+        be encoded in JSON should be passed through the pipes
+        """
+        records = [{'foo': 'a' * 100}, {'foo': datetime(2023, 1, 1)}, {'foo': 1}]
+        with mock.patch('metanorm.parallel._encode_records',
+                        wraps=parallel._encode_records) as mock_encode:
+            results = list(parallel.normalize_shared_memory(
+                records, ParallelTestBaseNormalizer, workers=1, batch_size=1, slot_size=64))
+        self.assertEqual(mock_encode.call_count, 3)
+        self.assertListEqual(
+            results, [(0, {'foo': 'a' * 100}), (1, {'foo': datetime(2023, 1, 1)}), (2, {'foo': 1})])
+
+    @unittest.skipIf(shared_memory is None, 'shared memory requires Python 3.8 or later')
+    def test_worker_death(self):
+        """An error should be raised if a worker dies"""
+        with self.assertRaises(RuntimeError):
+            list(parallel.normalize_shared_memory(
+                [{'foo': 'exit'}], ParallelTestBaseNormalizer, workers=1, poll_interval=0.1))
+
+    @unittest.skipIf(shared_memory is None, 'shared memory requires Python 3.8 or later')
+    def test_shared_memory_released(self):
+        """The shared memory should be released when the generator is
+        closed early
+        """
+        with mock.patch.object(shared_memory.SharedMemory, 'unlink', autospec=True,
+                               side_effect=shared_memory.SharedMemory.unlink) as mock_unlink:
+            results = parallel.normalize_shared_memory(
+                self.RECORDS * 10, ParallelTestBaseNormalizer, workers=2, batch_size=2)
+            next(results)
+            results.close()
+        self.assertEqual(mock_unlink.call_count, 4)
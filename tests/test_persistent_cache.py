@@ -0,0 +1,168 @@
+"""Tests for the persistent_cache module"""
+#pylint: disable=protected-access
+
+import multiprocessing
+import os.path
+import pickle
+import sqlite3
+import tempfile
+import threading
+import unittest
+import unittest.mock as mock
+from collections import OrderedDict
+
+import metanorm.persistent_cache as persistent_cache
+
+
+# cache inherited by the forked worker processes
+inherited_cache = None
+
+
+def read_in_process(cache, key):
+    """Read an entry of the cache from a worker process"""
+    return cache.get(key, 'fingerprint')
+
+
+def read_inherited(key):
+    """Read and write an entry of the inherited cache from a worker
+    process
+    """
+    inherited_cache.put(f"{key}-{os.getpid()}", 'fingerprint', 2)
+    return inherited_cache.get(key, 'fingerprint')
+
+
+class PersistentCacheTestCase(unittest.TestCase):
+    """Tests for the PersistentCache class"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'cache.sqlite')
+        self.cache = persistent_cache.PersistentCache(self.path)
+
+    def tearDown(self):
+        self.cache.close()
+        self.temp_dir.cleanup()
+
+    def test_get_put(self):
+        """Values should be retrieved with their type, and hits and
+        misses counted
+        """
+        self.assertIsNone(self.cache.get(['foo', 1], 'fingerprint'))
+        self.cache.put(['foo', 1], 'fingerprint', OrderedDict([('b', 1), ('a', [2])]))
+        self.cache.put(['bar'], 'fingerprint', None)
+        result = self.cache.get(['foo', 1], 'fingerprint')
+        self.assertIsInstance(result, OrderedDict)
+        self.assertListEqual(list(result.items()), [('b', 1), ('a', [2])])
+        self.assertIsNone(self.cache.get(['bar'], 'fingerprint', 'default'))
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+        self.assertEqual(len(self.cache), 2)
+
+    def test_fingerprint(self):
+        """Entries stored with another fingerprint should be missing,
+        and replaced when written again
+        """
+        self.cache.put('foo', ['gcmd_platform', '9.1.5'], 1)
+        self.assertEqual(self.cache.get('foo', ['gcmd_platform', '9.1.5']), 1)
+        self.assertIsNone(self.cache.get('foo', ['gcmd_platform', '9.1.6']))
+        self.cache.put('foo', ['gcmd_platform', '9.1.6'], 2)
+        self.assertEqual(self.cache.get('foo', ['gcmd_platform', '9.1.6']), 2)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_wal_mode(self):
+        """The database should be in WAL mode"""
+        self.cache.put('foo', 'fingerprint', 1)
+        connection = sqlite3.connect(self.path)
+        try:
+            self.assertEqual(connection.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        finally:
+            connection.close()
+
+    def test_value_not_serializable(self):
+        """Values which can't be serialized should not be cached"""
+        self.cache.put('foo', 'fingerprint', object())
+        self.assertEqual(len(self.cache), 0)
+
+    def test_key_not_serializable(self):
+        """Keys which can't be serialized should be treated as misses"""
+        self.assertEqual(self.cache.get(object(), 'fingerprint', 'default'), 'default')
+        self.assertEqual(self.cache.misses, 1)
+        self.cache.put(object(), 'fingerprint', 1)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_database_errors(self):
+        """Database errors should be logged and treated as misses"""
+        with mock.patch.object(self.cache, '_connection', side_effect=sqlite3.OperationalError):
+            with self.assertLogs(persistent_cache.logger, level='WARNING'):
+                self.cache.put('foo', 'fingerprint', 1)
+            with self.assertLogs(persistent_cache.logger, level='WARNING'):
+                self.assertIsNone(self.cache.get('foo', 'fingerprint'))
+
+    def test_clear(self):
+        """Clearing the cache should remove all entries"""
+        self.cache.put('foo', 'fingerprint', 1)
+        self.cache.get('foo', 'fingerprint')
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 0))
+
+    def test_threads(self):
+        """Each thread should use its own connection"""
+        self.cache.put('foo', 'fingerprint', 1)
+        results = []
+        thread = threading.Thread(
+            target=lambda: results.append(self.cache.get('foo', 'fingerprint')))
+        thread.start()
+        thread.join()
+        self.assertListEqual(results, [1])
+
+    def test_threads_counters(self):
+        """Hits and misses counted by several threads should not be
+        lost
+        """
+        self.cache.put('foo', 'fingerprint', 1)
+        def count():
+            for _ in range(100):
+                self.cache.get('foo', 'fingerprint')
+                self.cache.get('bar', 'fingerprint')
+        threads = [threading.Thread(target=count) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((self.cache.hits, self.cache.misses), (400, 400))
+
+    def test_processes(self):
+        """Entries should be readable by other processes, including
+        processes which inherited a connection
+        """
+        self.cache.put('foo', 'fingerprint', 1)
+        for start_method in ('fork', 'spawn'):
+            with self.subTest(start_method=start_method):
+                context = multiprocessing.get_context(start_method)
+                with context.Pool(2) as pool:
+                    self.assertListEqual(
+                        pool.starmap(read_in_process, [(self.cache, 'foo')] * 4), [1] * 4)
+        self.assertEqual(self.cache.get('foo', 'fingerprint'), 1)
+
+    def test_inherited_connection(self):
+        """Forked processes should open their own connection instead of
+        using the one of their parent
+        """
+        global inherited_cache  # pylint: disable=global-statement
+        inherited_cache = self.cache
+        try:
+            self.cache.put('foo', 'fingerprint', 1)
+            with multiprocessing.get_context('fork').Pool(2) as pool:
+                self.assertListEqual(pool.map(read_inherited, ['foo'] * 4), [1] * 4)
+        finally:
+            inherited_cache = None
+        self.assertEqual(self.cache.get('foo', 'fingerprint'), 1)
+        self.assertGreater(len(self.cache), 1)
+
+    def test_pickle(self):
+        """Only the configuration should be pickled"""
+        self.cache.put('foo', 'fingerprint', 1)
+        unpickled = pickle.loads(pickle.dumps(self.cache))
+        self.assertEqual(unpickled.path, self.path)
+        self.assertEqual(unpickled.get('foo', 'fingerprint'), 1)
+        unpickled.close()
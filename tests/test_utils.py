@@ -1,6 +1,11 @@
 """Tests for the utils module"""
 import importlib
+import os.path
 import re
+import signal
+import tempfile
+import threading
+import time
 import unittest
 import unittest.mock as mock
 from collections import OrderedDict
@@ -13,6 +18,54 @@ import shapely.geometry
 import metanorm.errors as errors
 import metanorm.utils as utils
 
+class ClassUtilsTestCase(unittest.TestCase):
+    """Tests for class manipulation utilities"""
+
+    def test_is_abstract(self):
+        """is_abstract() should only take into account the 'abstract'
+        attribute defined in the class' own body
+        """
+        class Abstract():
+            """Abstract test class"""
+            abstract = True
+
+        class Concrete(Abstract):
+            """Concrete test class"""
+
+        self.assertTrue(utils.is_abstract(Abstract))
+        self.assertFalse(utils.is_abstract(Concrete))
+
+    def test_get_metanorm_version_installed(self):
+        """The installed version should be returned if available"""
+        with mock.patch('metanorm.utils.importlib_metadata') as mock_metadata:
+            mock_metadata.version.return_value = '1.2.3'
+            self.assertEqual(utils.get_metanorm_version(), '1.2.3')
+        mock_metadata.version.assert_called_once_with('metanorm')
+
+    def test_get_metanorm_version_not_installed(self):
+        """A digest of the source files should be returned if metanorm
+        is not installed
+        """
+        with mock.patch('metanorm.utils.importlib_metadata') as mock_metadata:
+            mock_metadata.PackageNotFoundError = type('PackageNotFoundError', (Exception,), {})
+            mock_metadata.version.side_effect = mock_metadata.PackageNotFoundError
+            self.assertTrue(utils.get_metanorm_version().startswith('source-'))
+
+    def test_get_metanorm_version_source(self):
+        """A digest of the source files should be returned if
+        importlib.metadata is not available (Python < 3.8)
+        """
+        with mock.patch('metanorm.utils.importlib_metadata', None):
+            version = utils.get_metanorm_version()
+            self.assertTrue(version.startswith('source-'))
+            self.assertEqual(utils.get_metanorm_version(), version)
+            with mock.patch('os.stat') as mock_stat:
+                mock_stat.return_value.st_mtime_ns = 1
+                mock_stat.return_value.st_size = 2
+                self.assertNotEqual(utils.get_metanorm_version(), version)
+        self.assertFalse(utils.is_abstract(object))
+
+
 class TimeTestCase(unittest.TestCase):
     """Tests for utilities dealing with time"""
 
@@ -96,6 +149,11 @@ class TimeTestCase(unittest.TestCase):
 
 class UtilsTestCase(unittest.TestCase):
     """Test case for utils functions"""
+
+    def setUp(self):
+        # the GCMD searches depend on the mocked vocabularies
+        utils.clear_gcmd_search_cache()
+
     def test_dict_to_string(self):
         """dict_to_string() should return the proper representation"""
         self.assertEqual(
@@ -107,6 +165,66 @@ class UtilsTestCase(unittest.TestCase):
         """The representation of an empty dict is an empty string"""
         self.assertEqual(utils.dict_to_string({}), '')
 
+    def test_project_metadata(self):
+        """project_metadata() should only keep the values designated by
+        the paths
+        """
+        raw_metadata = {
+            'url': 'ftp://foo/bar.nc',
+            'umm': {
+                'TemporalExtent': {'RangeDateTime': {'BeginningDateTime': '2023-01-01'}},
+                'SpatialExtent': {'foo': 'bar'},
+                'RelatedUrls': ['https://foo'],
+            },
+            'meta': {'provider-id': 'POCLOUD', 'concept-id': 'G1'},
+            'list': [{'foo': 'bar'}],
+        }
+        self.assertDictEqual(
+            utils.project_metadata(
+                raw_metadata,
+                ('url', 'umm.TemporalExtent', 'umm.SpatialExtent.foo', 'meta.missing',
+                 'list.foo', 'missing', 'missing.foo')),
+            {
+                'url': 'ftp://foo/bar.nc',
+                'umm': {
+                    'TemporalExtent': {'RangeDateTime': {'BeginningDateTime': '2023-01-01'}},
+                    'SpatialExtent': {'foo': 'bar'},
+                },
+                'meta': {},
+                'list': [{'foo': 'bar'}],
+            })
+
+    def test_project_metadata_overlapping_paths(self):
+        """A path contained in another path should not modify the
+        original metadata
+        """
+        raw_metadata = {'umm': {'foo': {'bar': 1, 'baz': 2}, 'qux': 3}}
+        for paths in (('umm.foo', 'umm.foo.bar'), ('umm.foo.bar', 'umm.foo')):
+            with self.subTest(paths=paths):
+                self.assertDictEqual(
+                    utils.project_metadata(raw_metadata, paths),
+                    {'umm': {'foo': {'bar': 1, 'baz': 2}}})
+                self.assertDictEqual(
+                    raw_metadata, {'umm': {'foo': {'bar': 1, 'baz': 2}, 'qux': 3}})
+
+    def test_get_vocabulary_fingerprint(self):
+        """The fingerprint should contain the vocabulary's version and
+        the state of its file
+        """
+        mock_vocabulary = mock.Mock(version='9.1.5')
+        mock_vocabulary.get_filepath.return_value = '/foo/bar.json'
+        with mock.patch('pythesint.vocabularies', {'gcmd_platform': mock_vocabulary}), \
+                mock.patch('os.stat') as mock_stat:
+            mock_stat.return_value.st_mtime_ns = 1
+            mock_stat.return_value.st_size = 2
+            self.assertTupleEqual(
+                utils.get_vocabulary_fingerprint('gcmd_platform'),
+                ('gcmd_platform', '9.1.5', (1, 2)))
+            mock_stat.side_effect = FileNotFoundError
+            self.assertTupleEqual(
+                utils.get_vocabulary_fingerprint('gcmd_platform'),
+                ('gcmd_platform', '9.1.5', None))
+
     def test_translate_pythesint_keyword(self):
         """Should return the right keyword given an alias"""
         translation_dict = {
@@ -211,6 +329,61 @@ class UtilsTestCase(unittest.TestCase):
         with mock.patch("pythesint.json_vocabulary.JSONVocabulary.get_list", return_value=[]):
             self.assertIsNone(utils.gcmd_search('instrument', 'bar', ['qux']))
 
+    def test_gcmd_search_cache(self):
+        """The results of GCMD searches should be cached, including
+        empty results, and callers should receive copies
+        """
+        with mock.patch("pythesint.json_vocabulary.JSONVocabulary.get_list",
+                        return_value=[OrderedDict([('foo', 'bar'), ('baz', 'qux')])]
+                        ) as mock_get_list:
+            first_result = utils.gcmd_search('instrument', 'bar', ['quux'])
+            first_result['foo'] = 'modified'
+            self.assertEqual(utils.gcmd_search('instrument', 'bar', ['quux']),
+                             OrderedDict([('foo', 'bar'), ('baz', 'qux')]))
+            self.assertIsInstance(utils.gcmd_search('instrument', 'bar', ['quux']), OrderedDict)
+            calls_count = mock_get_list.call_count
+            # other additional keywords are another search
+            utils.gcmd_search('instrument', 'bar', ['corge'])
+            self.assertGreater(mock_get_list.call_count, calls_count)
+            mock_get_list.return_value = []
+            self.assertIsNone(utils.gcmd_search('platform', 'bar'))
+            calls_count = mock_get_list.call_count
+            self.assertIsNone(utils.gcmd_search('platform', 'bar'))
+            self.assertEqual(mock_get_list.call_count, calls_count)
+        self.assertEqual(utils.GCMD_SEARCH_CACHE.stats()['hits'], 3)
+        self.assertEqual(utils.GCMD_SEARCH_CACHE.stats()['misses'], 3)
+
+    def test_gcmd_search_cache_key(self):
+        """Searches should be cached by translated keyword"""
+        with mock.patch('metanorm.utils._gcmd_search', return_value=None) as mock_search:
+            utils.gcmd_search('platform', 'SENTINEL-1A', ['foo'])
+            utils.gcmd_search('platform', 'SENTINEL-1A', ('foo',))
+        mock_search.assert_called_once_with('platform', 'SENTINEL-1A', ['foo'])
+        self.assertIn(('platform', 'SENTINEL-1A', ('foo',)), utils.GCMD_SEARCH_CACHE)
+
+    def test_clear_gcmd_search_cache(self):
+        """Clearing the cache should remove the entries and reset the
+        counters
+        """
+        with mock.patch('metanorm.utils._gcmd_search', return_value=None):
+            utils.gcmd_search('platform', 'foo')
+        utils.clear_gcmd_search_cache()
+        self.assertDictEqual(utils.GCMD_SEARCH_CACHE.stats(), {
+            'hits': 0, 'misses': 0, 'hit_rate': 0., 'size': 0, 'maxsize': 1024})
+
+    def test_configure_gcmd_search_cache(self):
+        """The cache can be resized or disabled"""
+        original_cache = utils.GCMD_SEARCH_CACHE
+        try:
+            utils.configure_gcmd_search_cache(0)
+            with mock.patch('metanorm.utils._gcmd_search', return_value=None) as mock_search:
+                utils.gcmd_search('platform', 'foo')
+                utils.gcmd_search('platform', 'foo')
+            self.assertEqual(mock_search.call_count, 2)
+            self.assertEqual(len(utils.GCMD_SEARCH_CACHE), 0)
+        finally:
+            utils.GCMD_SEARCH_CACHE = original_cache
+
     def test_restrict_gcmd_search(self):
         """Test restricting the results of a GCMD search using
         additional keywords. The keyword which restricts the search
@@ -224,6 +397,71 @@ class UtilsTestCase(unittest.TestCase):
             utils.restrict_gcmd_search(search_results, ['qux', 'grault']),
             [{'foo': 'bar', 'baz': 'qux', 'corge': 'grault'}])
 
+    def test_restrict_gcmd_search_with_index(self):
+        """The index of the vocabulary should be used when the
+        vocabulary name is given, and give the same results
+        """
+        vocabulary = [
+            OrderedDict([('Short_Name', 'SENTINEL-1A'), ('Long_Name', 'Sentinel-1A')]),
+            OrderedDict([('Short_Name', 'SENTINEL-1B'), ('Long_Name', 'Sentinel-1B')]),
+            OrderedDict([('Short_Name', 'ENVISAT'), ('Long_Name', 'Environmental Satellite')]),
+        ]
+        # the search results are copies, like the ones returned by
+        # pythesint
+        search_results = [OrderedDict(item) for item in vocabulary[:2]]
+        with mock.patch("pythesint.json_vocabulary.JSONVocabulary.get_list",
+                        return_value=vocabulary) as mock_get_list:
+            for keywords in (['Sentinel-1B'], ['sentinel-1'], ['foo', '1a'], ["name', 'env"]):
+                with self.subTest(keywords=keywords):
+                    self.assertListEqual(
+                        utils.restrict_gcmd_search(search_results, keywords, 'platform'),
+                        utils.restrict_gcmd_search(search_results, keywords))
+            self.assertListEqual(
+                utils.restrict_gcmd_search(search_results, ['Sentinel-1B'], 'platform'),
+                [vocabulary[1]])
+        # the index is built once
+        mock_get_list.assert_called_once()
+
+    def test_restrict_gcmd_search_not_indexed(self):
+        """Objects which are not in the index of the vocabulary should
+        be searched directly
+        """
+        with mock.patch("pythesint.json_vocabulary.JSONVocabulary.get_list",
+                        return_value=[{'foo': 'bar'}]):
+            self.assertListEqual(
+                utils.restrict_gcmd_search([{'baz': 'qux'}, {'baz': 'quux'}], ['quux'],
+                                           'platform'),
+                [{'baz': 'quux'}])
+
+    def test_load_vocabulary(self):
+        """The index of GCMD vocabularies should be built, the other
+        vocabularies only loaded
+        """
+        with mock.patch('metanorm.utils.get_gcmd_index') as mock_get_gcmd_index:
+            utils.load_vocabulary('gcmd_platform')
+        mock_get_gcmd_index.assert_called_once_with('platform', revalidate=True)
+        mock_vocabulary = mock.Mock()
+        with mock.patch('pythesint.vocabularies', {'cf_standard_name': mock_vocabulary}):
+            utils.load_vocabulary('cf_standard_name')
+        mock_vocabulary.get_list.assert_called_once_with()
+
+    def test_get_gcmd_index_rebuilt(self):
+        """The index should be rebuilt when the vocabulary changes, which
+        is only checked when revalidation is requested
+        """
+        with mock.patch("pythesint.json_vocabulary.JSONVocabulary.get_list",
+                        return_value=[{'foo': 'bar'}]) as mock_get_list, \
+                mock.patch('metanorm.utils.get_vocabulary_fingerprint',
+                           return_value=('gcmd_platform', None, (1, 2))) as mock_fingerprint:
+            index = utils.get_gcmd_index('platform')
+            self.assertIs(utils.get_gcmd_index('platform', revalidate=True), index)
+            mock_fingerprint.return_value = ('gcmd_platform', None, (3, 4))
+            self.assertIs(utils.get_gcmd_index('platform'), index)
+            self.assertEqual(mock_fingerprint.call_count, 2)
+            self.assertIsNot(utils.get_gcmd_index('platform', revalidate=True), index)
+        self.assertEqual(mock_get_list.call_count, 2)
+        mock_fingerprint.assert_called_with('gcmd_platform')
+
     def test_get_cf_standard_name(self):
         """Test getting a standardized dataset parameter from the CF
         vocabulary
@@ -363,6 +601,94 @@ class UtilsTestCase(unittest.TestCase):
             utils.split_multipolygon_along_idl(multipolygon),
             multipolygon)
 
+    def test_time_budget(self):
+        """time_budget() should interrupt the code which exceeds the
+        budget, and restore the previous signal handler
+        """
+        previous_handler = signal.getsignal(signal.SIGALRM)
+        with self.assertRaises(utils.TimeBudgetExceeded):
+            with utils.time_budget(0.01):
+                while True:
+                    pass
+        self.assertEqual(signal.getsignal(signal.SIGALRM), previous_handler)
+        with utils.time_budget(1):
+            pass
+        self.assertEqual(signal.getitimer(signal.ITIMER_REAL), (0.0, 0.0))
+
+    def test_time_budget_outer_timer(self):
+        """time_budget() should re-arm the timer set by the calling
+        code when it exits
+        """
+        outer_alarms = []
+        previous_handler = signal.signal(signal.SIGALRM,
+                                         lambda *args: outer_alarms.append(args))
+        try:
+            signal.setitimer(signal.ITIMER_REAL, 10, 5)
+            with utils.time_budget(1):
+                pass
+            delay, interval = signal.getitimer(signal.ITIMER_REAL)
+            self.assertGreater(delay, 9)
+            self.assertLessEqual(delay, 10)
+            self.assertEqual(interval, 5)
+
+            # an outer timer which expired in the block fires when it exits
+            signal.setitimer(signal.ITIMER_REAL, 0.01)
+            with utils.time_budget(1):
+                time.sleep(0.05)
+            time.sleep(0.05)
+            self.assertEqual(len(outer_alarms), 1)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+
+    def test_time_budget_thread(self):
+        """A RuntimeError should be raised when a time budget is
+        requested outside of the main thread
+        """
+        errors_raised = []
+        def use_budget():
+            try:
+                with utils.time_budget(1):
+                    pass
+            except RuntimeError as error:
+                errors_raised.append(error)
+            utils.check_time_budget(None)
+        thread = threading.Thread(target=use_budget)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(errors_raised), 1)
+
+    def test_time_budget_no_limit(self):
+        """time_budget() should not set a timer if no budget is given"""
+        with mock.patch('signal.setitimer') as mock_setitimer:
+            with utils.time_budget(None):
+                pass
+        mock_setitimer.assert_not_called()
+
+    def test_record_independent(self):
+        """The decorator should mark the getters, including the ones
+        decorated with raises()
+        """
+        class Normalizer():
+            """Normalizer with marked and unmarked getters"""
+            @utils.record_independent
+            def get_foo(self, raw_metadata):
+                """Marked getter"""
+
+            @utils.record_independent
+            @utils.raises(KeyError)
+            def get_bar(self, raw_metadata):
+                """Marked getter with an exception declaration"""
+
+            def get_baz(self, raw_metadata):
+                """Unmarked getter"""
+
+        normalizer = Normalizer()
+        self.assertTrue(utils.is_record_independent(normalizer.get_foo))
+        self.assertTrue(utils.is_record_independent(normalizer.get_bar))
+        self.assertFalse(utils.is_record_independent(normalizer.get_baz))
+        self.assertFalse(utils.is_record_independent(mock.MagicMock()))
+
     def test_create_parameter_list(self):
         """Test creating a parameter list from a list of names"""
         def get_cf_or_wkv_standard_name_side_effect(name):
@@ -377,6 +703,103 @@ class UtilsTestCase(unittest.TestCase):
             )
 
 
+class PersistentCacheTestCase(unittest.TestCase):
+    """Tests for the persistent cache of the vocabulary lookups"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        utils.configure_persistent_cache(os.path.join(self.temp_dir.name, 'cache.sqlite'))
+        fingerprint_patcher = mock.patch('metanorm.utils.get_vocabulary_fingerprint',
+                                         side_effect=lambda name: (name, '1', None))
+        self.mock_fingerprint = fingerprint_patcher.start()
+        self.addCleanup(fingerprint_patcher.stop)
+
+    def tearDown(self):
+        utils.configure_persistent_cache(None)
+        self.temp_dir.cleanup()
+
+    def test_disabled(self):
+        """Lookups should not be cached when the persistent cache is
+        disabled
+        """
+        utils.configure_persistent_cache(None)
+        self.assertIsNone(utils.PERSISTENT_CACHE)
+        with mock.patch('metanorm.utils.gcmd_search', return_value=None) as mock_search:
+            utils.get_gcmd_platform('foo')
+            utils.get_gcmd_platform('foo')
+        self.assertEqual(mock_search.call_count, 2)
+        self.mock_fingerprint.assert_not_called()
+
+    def test_cached_lookup(self):
+        """Lookups should be done once with the same arguments,
+        whether they are given as positional or keyword arguments
+        """
+        with mock.patch('metanorm.utils.gcmd_search', return_value=None) as mock_search:
+            first_result = utils.get_gcmd_platform('foo', ['bar'])
+            second_result = utils.get_gcmd_platform('foo', additional_keywords=('bar',))
+            utils.get_gcmd_platform('foo')
+        self.assertEqual(mock_search.call_count, 2)
+        self.assertEqual(first_result, second_result)
+        self.assertIsNot(first_result, second_result)
+        self.mock_fingerprint.assert_called_with('gcmd_platform')
+
+    def test_vocabulary_change(self):
+        """Lookups should be done again when the vocabulary changes
+        and the caches are cleared
+        """
+        with mock.patch('metanorm.utils.gcmd_search', return_value={'a': 1}) as mock_search:
+            utils.get_gcmd_instrument('foo')
+            self.mock_fingerprint.side_effect = lambda name: (name, '2', None)
+            utils.clear_gcmd_search_cache()
+            utils.get_gcmd_instrument('foo')
+        self.assertEqual(mock_search.call_count, 2)
+
+    def test_memory_before_disk(self):
+        """Repeated lookups should be answered from memory, without
+        reading the persistent cache or computing the fingerprint again
+        """
+        with mock.patch('metanorm.utils.gcmd_search', return_value={'a': 1}) as mock_search:
+            first_result = utils.get_gcmd_instrument('foo')
+            first_result['a'] = 2
+            with mock.patch.object(utils.PERSISTENT_CACHE, 'get') as mock_get:
+                self.assertDictEqual(utils.get_gcmd_instrument('foo'), {'a': 1})
+            mock_get.assert_not_called()
+        mock_search.assert_called_once()
+        self.mock_fingerprint.assert_called_once_with('gcmd_instrument')
+
+    def test_disk_after_memory(self):
+        """Lookups missing from memory should be read from the
+        persistent cache
+        """
+        with mock.patch('metanorm.utils.gcmd_search', return_value={'a': 1}) as mock_search:
+            utils.get_gcmd_instrument('foo')
+            utils._PERSISTENT_LOOKUPS.clear()
+            self.assertDictEqual(utils.get_gcmd_instrument('foo'), {'a': 1})
+        mock_search.assert_called_once()
+        self.assertEqual(utils.PERSISTENT_CACHE.hits, 1)
+
+    def test_vocabulary_depends_on_arguments(self):
+        """The fingerprint of the vocabulary designated by the arguments
+        should be used
+        """
+        with mock.patch('pythesint.search_gcmd_provider_list', return_value=[{'a': 1}],
+                        create=True) as mock_search, \
+                mock.patch('pythesint.get_gcmd_provider', create=True):
+            self.assertDictEqual(utils._gcmd_search('provider', 'foo', None), {'a': 1})
+            self.assertDictEqual(utils._gcmd_search('provider', 'foo', None), {'a': 1})
+        mock_search.assert_called_once()
+        self.mock_fingerprint.assert_called_with('gcmd_provider')
+
+    def test_exceptions_not_cached(self):
+        """Exceptions should not be cached"""
+        with mock.patch('pythesint.get_cf_standard_name', side_effect=IndexError), \
+                mock.patch('pythesint.get_wkv_variable', side_effect=IndexError):
+            for _ in range(2):
+                with self.assertRaises(IndexError):
+                    utils.get_cf_or_wkv_standard_name('foo')
+        self.assertEqual(len(utils.PERSISTENT_CACHE), 0)
+
+
 class SubclassesTestCase(unittest.TestCase):
     """Tests for utility functions dealing with subclasses"""
 